@@ -0,0 +1,145 @@
+"""
+Compare query plans and timings for the main list/moderation queries with
+and without the indexes added in migration 0008.
+
+Seeds a throwaway SQLite database (never db.sqlite3) and prints, for each
+query, the EXPLAIN QUERY PLAN and median runtime before and after creating
+the indexes:
+
+    python benchmarks/explain_indexes.py --questions 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'skillsharespace.settings')
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+BATCH_SIZE = 5000
+
+
+def seed(questions, answers_per_question, users):
+    from django.contrib.auth.models import User
+    from django.contrib.contenttypes.models import ContentType
+    from django.utils import timezone
+    from skillsharespace_app.models import Question, Answer, Flag
+
+    rng = random.Random(1)
+    User.objects.bulk_create(
+        [User(username=f'user{i}', password='!') for i in range(users)], batch_size=BATCH_SIZE,
+    )
+    user_ids = list(User.objects.values_list('id', flat=True))
+    start = timezone.now() - timedelta(days=365)
+
+    for offset in range(0, questions, BATCH_SIZE):
+        Question.objects.bulk_create([
+            Question(
+                title=f'Question {i}', body='body ' * 20, author_id=rng.choice(user_ids),
+                created_at=start + timedelta(seconds=i * 30), approved=rng.random() < 0.9,
+            )
+            for i in range(offset, min(offset + BATCH_SIZE, questions))
+        ])
+    first_question = Question.objects.order_by('id').values_list('id', flat=True).first()
+
+    answer_ct = ContentType.objects.get_for_model(Answer)
+    total_answers = int(questions * answers_per_question)
+    for offset in range(0, total_answers, BATCH_SIZE):
+        batch = [
+            Answer(
+                question_id=first_question + rng.randrange(questions), body='answer ' * 10,
+                author_id=rng.choice(user_ids), created_at=start + timedelta(seconds=i * 15),
+                approved=rng.random() < 0.8,
+            )
+            for i in range(offset, min(offset + BATCH_SIZE, total_answers))
+        ]
+        Answer.objects.bulk_create(batch)
+        Flag.objects.bulk_create([
+            Flag(content_type=answer_ct, object_id=answer.pk, reason='spam', resolved=rng.random() < 0.95)
+            for answer in batch if rng.random() < 0.05
+        ])
+    return first_question
+
+
+def queries(sample_question):
+    from django.contrib.contenttypes.models import ContentType
+    from skillsharespace_app.models import Question, Answer, Flag
+
+    answer_ct = ContentType.objects.get_for_model(Answer)
+    return {
+        'public question list': Question.objects.filter(approved=True).order_by('-created_at', '-id')[:20],
+        'unapproved question queue': Question.objects.filter(approved=False).order_by('-created_at', '-id')[:20],
+        'approved answers of a question': Answer.objects.filter(
+            question_id=sample_question, approved=True,
+        ).order_by('created_at'),
+        'unapproved answer queue': Answer.objects.filter(approved=False).order_by('-created_at', '-id')[:20],
+        'open flag queue': Flag.objects.filter(resolved=False).order_by('-report_count', '-created_at', '-id')[:20],
+        'flags on an object': Flag.objects.filter(content_type=answer_ct, object_id=sample_question),
+    }
+
+
+def measure(qs, runs=5):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        list(qs._chain())
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def report(label, sample_question):
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    print(f'\n=== {label} ===')
+    for name, qs in queries(sample_question).items():
+        print(f'\n{name}: {measure(qs):.2f} ms')
+        for line in qs.explain().splitlines():
+            print(f'    {line}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=1_000_000)
+    parser.add_argument('--answers-per-question', type=float, default=2.0)
+    parser.add_argument('--users', type=int, default=5000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='skillshare-bench-')
+    settings.DATABASES['default']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from skillsharespace_app.models import Question, Answer, Flag
+
+    call_command('migrate', verbosity=0)
+    indexes = [(model, index) for model in (Question, Answer, Flag) for index in model._meta.indexes]
+
+    print(f'Seeding {args.questions:,} questions into {settings.DATABASES["default"]["NAME"]} ...')
+    start = time.perf_counter()
+    sample_question = seed(args.questions, args.answers_per_question, args.users)
+    print(f'Seeded in {time.perf_counter() - start:.1f}s')
+
+    with connection.schema_editor() as editor:
+        for model, index in indexes:
+            editor.remove_index(model, index)
+    report('without indexes', sample_question)
+
+    with connection.schema_editor() as editor:
+        for model, index in indexes:
+            editor.add_index(model, index)
+    report('with indexes', sample_question)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Drive the read-only pages with many concurrent keep-alive connections and
+report requests/sec and latency percentiles, to compare the WSGI deployment
+with the ASGI one (which serves the views in async_views.py).
+
+Start both servers against the same database, e.g.
+
+    gunicorn skillsharespace.wsgi -w 4 --threads 8 -b 127.0.0.1:8000
+    uvicorn skillsharespace.asgi:application --workers 4 --port 8001
+
+then run
+
+    python benchmarks/load_test.py --target wsgi=http://127.0.0.1:8000 \\
+        --target asgi=http://127.0.0.1:8001 --connections 500 --duration 30
+
+Only the standard library is used, so the client itself is one asyncio
+process speaking plain HTTP/1.1.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = ['/', '/question/1/']
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.errors = 0
+
+    def add(self, status, latency):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.latencies.append(latency)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return values[index]
+
+
+async def read_response(reader):
+    """Read one response; return ``(status, keep_alive)``."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    version, status = status_line.split()[:2]
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    else:
+        await reader.read()
+        return int(status), False
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection == 'keep-alive' or (version == b'HTTP/1.1' and connection != 'close')
+    return int(status), keep_alive
+
+
+async def worker(host, port, paths, offset, deadline, stats):
+    reader = writer = None
+    i = offset
+    while time.monotonic() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            request = f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: keep-alive\r\n\r\n'
+            start = time.perf_counter()
+            writer.write(request.encode())
+            await writer.drain()
+            status, keep_alive = await read_response(reader)
+            stats.add(status, time.perf_counter() - start)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            stats.errors += 1
+            keep_alive = False
+        if not keep_alive and writer is not None:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run(url, paths, connections, duration):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    stats = Stats()
+    start = time.monotonic()
+    deadline = start + duration
+    await asyncio.gather(*(
+        worker(host, port, paths, n, deadline, stats) for n in range(connections)
+    ))
+    return stats, time.monotonic() - start
+
+
+def report(name, stats, elapsed):
+    ms = [latency * 1000 for latency in stats.latencies]
+    print(f'\n=== {name} ===')
+    print(f'requests:   {len(ms)} in {elapsed:.1f}s ({len(ms) / elapsed:.1f} req/s)')
+    print(f'errors:     {stats.errors}')
+    print(f'statuses:   {dict(sorted(stats.statuses.items()))}')
+    if ms:
+        print(
+            f'latency ms: mean {statistics.fmean(ms):.1f}  p50 {percentile(ms, 50):.1f}  '
+            f'p95 {percentile(ms, 95):.1f}  p99 {percentile(ms, 99):.1f}  max {max(ms):.1f}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', required=True, metavar='NAME=URL',
+                        help='server to test; repeat to compare several')
+    parser.add_argument('--path', action='append', dest='paths',
+                        help=f'path to request, cycled per connection (default: {DEFAULT_PATHS})')
+    parser.add_argument('--connections', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds per target')
+    args = parser.parse_args()
+
+    for target in args.target:
+        name, _, url = target.rpartition('=')
+        stats, elapsed = asyncio.run(run(url, args.paths or DEFAULT_PATHS, args.connections, args.duration))
+        report(name or url, stats, elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Mixed read/write throughput of the SQLite database under concurrent
+processes, with the development profile (rollback journal, a connection per
+request) and the production profile (WAL, persistent connections,
+BEGIN IMMEDIATE, PRAGMA tuning; see SKILLSHARE_DB_PROFILE in settings.py).
+
+Each worker process drives the real views through the test client:
+question list and detail reads (every detail view writes its view count
+through) and, for ``--write-ratio`` of requests, posting an answer or
+flagging a question. Fragment caching is off so every request hits the
+database. Runs against throwaway database files, never db.sqlite3:
+
+    python benchmarks/sqlite_concurrency.py --workers 8 --duration 20
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PROFILES = ('development', 'production')
+
+
+def setup(path, profile):
+    sys.path.insert(0, str(ROOT))
+    os.environ['SKILLSHARE_DB_PROFILE'] = profile
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'skillsharespace.settings')
+
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = path
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.FRAGMENT_CACHE_TIMEOUT = 0
+    settings.VIEW_COUNT_FLUSH_INTERVAL = 0
+    settings.QUERY_BUDGET_ENABLED = False
+    django.setup()
+
+
+def prepare(path, profile, questions, users):
+    setup(path, profile)
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from skillsharespace_app.models import Question
+
+    call_command('migrate', verbosity=0)
+    User.objects.bulk_create([User(username=f'user{i}', password='!') for i in range(users)])
+    authors = list(User.objects.all())
+    Question.objects.bulk_create([
+        Question(title=f'Question {i}', body='body ' * 50, author=authors[i % users], approved=True)
+        for i in range(questions)
+    ])
+
+
+def work(path, profile, duration, write_ratio, seed, results):
+    setup(path, profile)
+    from django.contrib.auth.models import User
+    from django.db import close_old_connections
+    from django.test import Client
+    from skillsharespace_app.models import Question
+
+    rng = random.Random(seed)
+    question_ids = list(Question.objects.values_list('pk', flat=True))
+    client = Client()
+    client.force_login(rng.choice(list(User.objects.all())))
+    close_old_connections()
+
+    stats = {'read': [], 'write': [], 'errors': 0}
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        question_id = rng.choice(question_ids)
+        if rng.random() < write_ratio:
+            kind = 'write'
+            if rng.random() < 0.7:
+                request = lambda: client.post(f'/question/{question_id}/answer/', {'body': 'An answer ' * 10})
+            else:
+                request = lambda: client.post(f'/flag/question/{question_id}/')
+        else:
+            kind = 'read'
+            url = '/' if rng.random() < 0.3 else f'/question/{question_id}/'
+            request = lambda: client.get(url)
+        start = time.perf_counter()
+        try:
+            response = request()
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        if ok:
+            stats[kind].append(elapsed)
+        else:
+            stats['errors'] += 1
+    results.put(stats)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def run(profile, args, workdir):
+    path = os.path.join(workdir, f'{profile}.sqlite3')
+    context = multiprocessing.get_context('spawn')
+    seeder = context.Process(target=prepare, args=(path, profile, args.questions, args.workers))
+    seeder.start()
+    seeder.join()
+
+    results = context.Queue()
+    workers = [
+        context.Process(target=work, args=(path, profile, args.duration, args.write_ratio, n, results))
+        for n in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    collected = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    reads = [t for stats in collected for t in stats['read']]
+    writes = [t for stats in collected for t in stats['write']]
+    errors = sum(stats['errors'] for stats in collected)
+    print(f'\n=== {profile} ({args.workers} workers, {args.duration:.0f}s) ===')
+    print(f'throughput: {(len(reads) + len(writes)) / args.duration:.1f} req/s '
+          f'({len(reads) / args.duration:.1f} reads/s, {len(writes) / args.duration:.1f} writes/s)')
+    print(f'errors:     {errors}')
+    for name, timings in (('reads', reads), ('writes', writes)):
+        if timings:
+            ms = [t * 1000 for t in timings]
+            print(f'{name:<11} p50 {statistics.median(ms):.1f} ms  p99 {percentile(ms, 99):.1f} ms  '
+                  f'max {max(ms):.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--questions', type=int, default=2000)
+    parser.add_argument('--profile', choices=PROFILES, action='append', help='default: both')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='skillshare-concurrency-')
+    for profile in args.profile or PROFILES:
+        run(profile, args, workdir)
+
+
+if __name__ == '__main__':
+    main()
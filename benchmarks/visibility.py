@@ -0,0 +1,141 @@
+"""
+Compare the logged-in question list and question page queries written as
+one ``approved OR author = me`` filter with the branch forms from
+``VisibilityQuerySet``: per-branch keyset pages merged in Python
+(``paginate_keyset(branches=...)``) and a ``UNION ALL`` (``visible_union``).
+
+Seeds a throwaway SQLite database (never db.sqlite3) and prints, for the
+first and a deep list page and for a busy question's answers, the median
+runtime and EXPLAIN QUERY PLAN of each form:
+
+    python benchmarks/visibility.py --questions 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'skillsharespace.settings')
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+BATCH_SIZE = 5000
+ORDERING = ('-created_at', '-id')
+PAGE = 20
+
+
+def seed(questions, answers, users, pending):
+    from django.contrib.auth.models import User
+    from django.utils import timezone
+    from skillsharespace_app.models import Question, Answer
+
+    rng = random.Random(1)
+    User.objects.bulk_create(
+        [User(username=f'user{i}', password='!') for i in range(users)], batch_size=BATCH_SIZE,
+    )
+    user_ids = list(User.objects.values_list('id', flat=True))
+    start = timezone.now() - timedelta(days=365)
+
+    for offset in range(0, questions, BATCH_SIZE):
+        Question.objects.bulk_create([
+            Question(
+                title=f'Question {i}', body='body ' * 20, author_id=rng.choice(user_ids),
+                created_at=start + timedelta(seconds=i * 30), approved=rng.random() >= pending,
+            )
+            for i in range(offset, min(offset + BATCH_SIZE, questions))
+        ])
+    # The busiest question gets all the answers, a share of them pending.
+    busy = Question.objects.filter(approved=True).order_by('-created_at').values_list('id', flat=True).first()
+    for offset in range(0, answers, BATCH_SIZE):
+        Answer.objects.bulk_create([
+            Answer(
+                question_id=busy, body='answer ' * 10, author_id=rng.choice(user_ids),
+                created_at=start + timedelta(seconds=i * 15), approved=rng.random() >= pending,
+            )
+            for i in range(offset, min(offset + BATCH_SIZE, answers))
+        ])
+    return busy
+
+
+def measure(fetch, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fetch()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def show(name, fetch, querysets, runs):
+    print(f'\n{name}: {measure(fetch, runs):.2f} ms')
+    for qs in querysets:
+        for line in qs.explain().splitlines():
+            print(f'    {line}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--questions', type=int, default=1_000_000)
+    parser.add_argument('--answers', type=int, default=20_000, help='Answers on the busiest question.')
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--pending', type=float, default=0.1, help='Share of content awaiting approval.')
+    parser.add_argument('--runs', type=int, default=7)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='skillshare-bench-')
+    settings.DATABASES['default']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from django.db.models import Q
+    from skillsharespace_app.models import Question, Answer
+    from skillsharespace_app.pagination import encode_cursor, keyset_filter, paginate_keyset
+
+    call_command('migrate', verbosity=0)
+    print(f'Seeding {args.questions:,} questions into {settings.DATABASES["default"]["NAME"]} ...')
+    start = time.perf_counter()
+    busy = seed(args.questions, args.answers, args.users, args.pending)
+    print(f'Seeded in {time.perf_counter() - start:.1f}s')
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+    # A member with pending questions and answers of their own.
+    user = Question.objects.filter(approved=False).order_by('-created_at').first().author
+    questions = Question.objects.select_related('author').only(
+        'title', 'created_at', 'views', 'answer_count', 'author__username',
+    )
+    branches = Question.objects.visibility_filters(user)
+    ored = questions.visible_to(user)
+    deep = ored.order_by(*ORDERING)[args.questions // 2]
+    deep_cursor = encode_cursor(deep, ORDERING, 'next')
+    deep_filter = keyset_filter(ORDERING, [deep.created_at, deep.pk])
+
+    for label, cursor, extra in (('first page', None, Q()), ('deep page', deep_cursor, deep_filter)):
+        show(
+            f'question list, {label}, OR filter',
+            lambda: paginate_keyset(ored, ORDERING, PAGE, cursor),
+            [ored.filter(extra).order_by(*ORDERING)[:PAGE + 1]], args.runs,
+        )
+        show(
+            f'question list, {label}, merged branches',
+            lambda: paginate_keyset(ored, ORDERING, PAGE, cursor, branches),
+            [ored.filter(extra, branch).order_by(*ORDERING)[:PAGE + 1] for branch in branches], args.runs,
+        )
+
+    answers = Answer.objects.filter(question_id=busy).select_related('author')
+    ored_answers = answers.visible_to(user).order_by('created_at')
+    union_answers = answers.visible_union(user).order_by('created_at')
+    show('answers of the busiest question, OR filter', lambda: list(ored_answers._chain()), [ored_answers], args.runs)
+    show('answers of the busiest question, UNION ALL', lambda: list(union_answers._chain()), [union_answers], args.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,12 +43,16 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'skillsharespace_app.middleware.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'skillsharespace_app.middleware.CachedAuthenticationMiddleware',
+    'skillsharespace_app.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'skillsharespace_app.middleware.ReplicaReadMiddleware',
+    'skillsharespace_app.middleware.WriteTransactionMiddleware',
 ]
 
 ROOT_URLCONF = 'skillsharespace.urls'
@@ -73,6 +78,10 @@ WSGI_APPLICATION = 'skillsharespace.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SKILLSHARE_DB_PROFILE=production switches SQLite to settings fit for
+# concurrent traffic: WAL, persistent connections and the PRAGMAs below.
+DB_PROFILE = os.environ.get('SKILLSHARE_DB_PROFILE', 'development')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -80,6 +89,71 @@ DATABASES = {
     }
 }
 
+if DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Seconds to wait on a locked database before giving up.
+            'timeout': 20,
+            # Transactions take the write lock when they begin instead of
+            # failing to upgrade a read lock halfway through.
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+
+# Run each POST request in one transaction (WriteTransactionMiddleware).
+ATOMIC_WRITE_REQUESTS = DB_PROFILE == 'production'
+
+# SKILLSHARE_REPLICA_DBS=path[,path...] adds read replicas ('replica1', ...)
+# of the default database. Public pages read from them (routers.py); keep
+# them in step with the primary, e.g. `manage.py sync_replica` locally.
+DATABASE_REPLICAS = []
+for number, replica_path in enumerate(filter(None, os.environ.get('SKILLSHARE_REPLICA_DBS', '').split(',')), 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {**DATABASES['default'], 'NAME': replica_path, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['skillsharespace_app.routers.ReplicaRouter']
+
+# Seconds a session reads from the primary after it writes.
+REPLICA_STICKY_SECONDS = 10
+
+# Applied to every new SQLite connection by signals.configure_sqlite.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'cache_size': -64000,  # KiB, i.e. 64 MB of page cache
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+} if DB_PROFILE == 'production' else {}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Point 'default' at a shared cache (Redis, Memcached) when running more
+# than one process, so fragment invalidation reaches every worker.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# Rendered question list/detail fragments; a timeout of 0 disables them.
+FRAGMENT_CACHE_ALIAS = 'default'
+FRAGMENT_CACHE_TIMEOUT = 300
+
+# Sessions are read from the cache and written through to the database.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'default'
+
+# Logged-in users, cached per session auth hash (see usercache.py) and
+# dropped whenever the user is saved; a timeout of 0 disables the cache.
+USER_CACHE_ALIAS = 'default'
+USER_CACHE_TIMEOUT = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -127,6 +201,38 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# How long shared caches may serve question pages to anonymous visitors
+# before revalidating them (they always carry an ETag).
+PUBLIC_PAGE_MAX_AGE = 0
+
+# Seconds between write-behind flushes of question view counts; 0 writes
+# every hit through immediately.
+VIEW_COUNT_FLUSH_INTERVAL = 10
+
+# Page size for cursor-paginated lists, and the cap on ?limit=
+PAGINATION_DEFAULT_LIMIT = 20
+PAGINATION_MAX_LIMIT = 100
+
+# Seconds between an open moderator dashboard's polls for queue changes
+MODERATION_POLL_INTERVAL = 15
+
+# Items a moderator leases from a work queue at a time, and for how long
+MODERATION_CLAIM_BATCH = 10
+MODERATION_CLAIM_SECONDS = 600
+
+# Views declare a query_budget; in DEBUG, requests that run more queries
+# are logged (or raise, with QUERY_BUDGET_RAISE, to fail tests).
+QUERY_BUDGET_ENABLED = DEBUG
+QUERY_BUDGET_RAISE = False
+
+# Per-request timings, Server-Timing headers, stats at /moderator/profile/
+# and ?_profile=1 captures for staff (see ProfilingMiddleware). Opt-in.
+PROFILING_ENABLED = os.environ.get('SKILLSHARE_PROFILING') == '1'
+
+# Serve the read-only views from async_views.py; asgi.py switches this on.
+ASYNC_READ_VIEWS = os.environ.get('SKILLSHARE_ASYNC_VIEWS') == '1'
+
+
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/' 
 
@@ -0,0 +1,294 @@
+"""
+Read-only JSON API, mounted under ``/api/v1/``.
+
+Every endpoint applies the same visibility rules as the HTML views and uses
+the site's session login. Lists page with the opaque ``?cursor=`` tokens
+from pagination.py, ``?fields=a,b`` limits the fields returned (and the
+columns loaded), and responses carry an ``ETag`` so clients can revalidate
+with ``If-None-Match``. The ``export/`` endpoints stream NDJSON, one object
+per line, without holding the result set in memory.
+"""
+import hashlib
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views import View
+
+from .models import Question, Answer, Flag
+from .pagination import get_limit, paginate_keyset
+from .viewcounts import view_counts
+
+EXPORT_CHUNK_SIZE = 1000
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _author(obj):
+    return obj.author.username
+
+
+# name -> (columns to load, how to read it)
+QUESTION_FIELDS = {
+    'id': ((), lambda q: q.pk),
+    'title': (('title',), lambda q: q.title),
+    'body': (('body',), lambda q: q.body),
+    'body_html': (('body', 'body_html', 'body_html_version'), lambda q: q.rendered_body),
+    'author': (('author__username',), _author),
+    'approved': (('approved',), lambda q: q.approved),
+    'created_at': (('created_at',), lambda q: q.created_at),
+    'updated_at': (('updated_at',), lambda q: q.updated_at),
+    'views': (('views',), lambda q: q.views),
+    'answer_count': (('answer_count',), lambda q: q.answer_count),
+    'url': ((), lambda q: q.get_absolute_url()),
+}
+
+ANSWER_FIELDS = {
+    'id': ((), lambda a: a.pk),
+    'question': (('question_id',), lambda a: a.question_id),
+    'body': (('body',), lambda a: a.body),
+    'body_html': (('body', 'body_html', 'body_html_version'), lambda a: a.rendered_body),
+    'author': (('author__username',), _author),
+    'approved': (('approved',), lambda a: a.approved),
+    'created_at': (('created_at',), lambda a: a.created_at),
+}
+
+
+def _flag_question(flag):
+    target = flag.content_object
+    if target is None:
+        return None
+    return target.pk if isinstance(target, Question) else target.question_id
+
+
+FLAG_FIELDS = {
+    'id': ((), lambda f: f.pk),
+    'target_type': (('content_type__model',), lambda f: f.content_type.model),
+    'target_id': (('object_id',), lambda f: f.object_id),
+    'question': (('content_type__model', 'object_id'), _flag_question),
+    'reason': (('reason',), lambda f: f.reason),
+    'report_count': (('report_count',), lambda f: f.report_count),
+    'resolved': (('resolved',), lambda f: f.resolved),
+    'created_at': (('created_at',), lambda f: f.created_at),
+}
+
+
+class ApiView(View):
+    """
+    Base for the API endpoints: JSON errors, sparse fieldsets and
+    conditional GETs. Subclasses set ``fields`` (see ``QUESTION_FIELDS``)
+    and ``ordering``, which must end in a unique column.
+    """
+    http_method_names = ['get', 'head', 'options']
+    fields = {}
+    ordering = ('-created_at', '-id')
+    staff_only = False
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            if self.staff_only and not request.user.is_staff:
+                raise ApiError('Staff only.', status=403)
+            return super().dispatch(request, *args, **kwargs)
+        except ApiError as e:
+            return JsonResponse({'error': e.message}, status=e.status)
+        except Http404:
+            return JsonResponse({'error': 'Not found.'}, status=404)
+
+    def get_field_names(self):
+        requested = self.request.GET.get('fields')
+        if not requested:
+            return list(self.fields)
+        names = [name.strip() for name in requested.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ApiError(f'Unknown field(s): {", ".join(unknown)}.')
+        return names
+
+    def only(self, queryset, names, extra=()):
+        """Load just the columns ``names`` and the ordering need, plus ``extra``."""
+        columns = {column for name in names for column in self.fields[name][0]}
+        columns.update(field.lstrip('-') for field in self.ordering)
+        columns.update(extra)
+        if any('__' in column for column in columns):
+            queryset = queryset.select_related(*{column.split('__')[0] for column in columns if '__' in column})
+        return queryset.only(*columns)
+
+    def serialize(self, obj, names):
+        return {name: self.fields[name][1](obj) for name in names}
+
+    def page(self, queryset, branches=None):
+        """
+        One cursor page of ``queryset`` as ``{results, next, previous}``,
+        fetched per visibility branch if ``branches`` are given.
+        """
+        names = self.get_field_names()
+        page = paginate_keyset(
+            self.only(queryset, names), self.ordering, get_limit(self.request), self.request.GET.get('cursor'),
+            branches,
+        )
+        self.prepare(page.object_list, names)
+        return {
+            'results': [self.serialize(obj, names) for obj in page],
+            'next': self._page_url(page.next_cursor) if page.has_next() else None,
+            'previous': self._page_url(page.previous_cursor) if page.has_previous() else None,
+        }
+
+    def prepare(self, objects, names):
+        """Hook to adjust a batch of loaded objects before serializing ``names``."""
+
+    def _page_url(self, cursor):
+        query = self.request.GET.copy()
+        query['cursor'] = cursor
+        return self.request.build_absolute_uri(f'{self.request.path}?{query.urlencode()}')
+
+    def respond(self, data):
+        response = JsonResponse(data)
+        # Answers depend on who is asking, so shared caches must key on the session.
+        patch_vary_headers(response, ['Cookie'])
+        etag = f'"{hashlib.md5(response.content).hexdigest()}"'
+        response['ETag'] = etag
+        return get_conditional_response(self.request, etag=etag, response=response)
+
+    def stream(self, queryset):
+        """Stream every row of ``queryset`` as NDJSON."""
+        names = self.get_field_names()
+        queryset = self.only(queryset, names).order_by(*self.ordering)
+        # Under ASGI, Django collects a sync iterator into a list before
+        # sending anything, so there the rows are read with the async ORM.
+        if isinstance(self.request, ASGIRequest):
+            lines = self._alines(queryset, names)
+        else:
+            lines = self._lines(queryset, names)
+        return StreamingHttpResponse(lines, content_type='application/x-ndjson')
+
+    def _lines(self, queryset, names):
+        batch = []
+        for obj in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            batch.append(obj)
+            if len(batch) == EXPORT_CHUNK_SIZE:
+                yield self._serialize_batch(batch, names)
+                batch = []
+        yield self._serialize_batch(batch, names)
+
+    async def _alines(self, queryset, names):
+        batch = []
+        async for obj in queryset.aiterator(chunk_size=EXPORT_CHUNK_SIZE):
+            batch.append(obj)
+            if len(batch) == EXPORT_CHUNK_SIZE:
+                yield self._serialize_batch(batch, names)
+                batch = []
+        yield self._serialize_batch(batch, names)
+
+    def _serialize_batch(self, batch, names):
+        """One chunk of NDJSON for ``batch``; ``prepare`` must not query."""
+        self.prepare(batch, names)
+        return ''.join(json.dumps(self.serialize(obj, names), cls=DjangoJSONEncoder) + '\n' for obj in batch)
+
+
+class QuestionApiMixin:
+    fields = QUESTION_FIELDS
+
+    def get_queryset(self):
+        return Question.objects.visible_to(self.request.user)
+
+    def prepare(self, questions, names):
+        if 'views' in names:
+            view_counts.apply(questions)
+
+
+class QuestionListApiView(QuestionApiMixin, ApiView):
+    query_budget = 4
+
+    def get(self, request):
+        return self.respond(self.page(self.get_queryset(), Question.objects.visibility_filters(request.user)))
+
+
+class QuestionDetailApiView(QuestionApiMixin, ApiView):
+    query_budget = 5
+
+    def get(self, request, pk):
+        names = self.get_field_names()
+        try:
+            question = self.only(Question.objects.all(), names, extra=('approved', 'author')).get(pk=pk)
+        except Question.DoesNotExist:
+            raise Http404
+        if not question.is_visible_to(request.user):
+            raise Http404
+        self.prepare([question], names)
+        return self.respond(self.serialize(question, names))
+
+
+class QuestionExportApiView(QuestionApiMixin, ApiView):
+    query_budget = 4
+
+    def get(self, request):
+        return self.stream(self.get_queryset())
+
+
+class AnswerApiMixin:
+    fields = ANSWER_FIELDS
+
+    def get_queryset(self):
+        user = self.request.user
+        answers = Answer.objects.visible_to(user)
+        if user.is_staff:
+            return answers
+        on_visible = Q(question__in=Question.objects.visible_to(user))
+        if user.is_authenticated:
+            # Answering a question makes it visible to its answerer, as in
+            # Question.is_visible_to, with all the answers its page shows.
+            on_visible |= Q(question__in=Answer.objects.filter(author=user).values('question_id'))
+        return answers.filter(on_visible)
+
+
+class AnswerListApiView(AnswerApiMixin, ApiView):
+    ordering = ('created_at', 'id')
+    # One query per visibility branch for members (see paginate_keyset).
+    query_budget = 6
+
+    def get(self, request, pk):
+        question = Question.objects.only('approved', 'author_id').filter(pk=pk).first()
+        if question is None or not question.is_visible_to(request.user):
+            raise Http404
+        user = request.user
+        return self.respond(self.page(question.answers.visible_to(user), Answer.objects.visibility_filters(user)))
+
+
+class AnswerExportApiView(AnswerApiMixin, ApiView):
+    query_budget = 4
+
+    def get(self, request):
+        return self.stream(self.get_queryset())
+
+
+class FlagListApiView(ApiView):
+    fields = FLAG_FIELDS
+    ordering = ('-report_count', '-created_at', '-id')
+    staff_only = True
+    query_budget = 6
+
+    def get(self, request):
+        resolved = request.GET.get('resolved') in ('1', 'true')
+        flags = Flag.objects.filter(resolved=resolved)
+        if 'question' in self.get_field_names():
+            flags = flags.with_targets()
+        return self.respond(self.page(flags))
+
+
+def api_root(request):
+    return JsonResponse({
+        'version': 'v1',
+        'questions': request.build_absolute_uri(reverse('api-v1-question-list')),
+        'questions_export': request.build_absolute_uri(reverse('api-v1-question-export')),
+        'answers_export': request.build_absolute_uri(reverse('api-v1-answer-export')),
+        'flags': request.build_absolute_uri(reverse('api-v1-flag-list')),
+    })
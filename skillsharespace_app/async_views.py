@@ -0,0 +1,151 @@
+"""
+Async versions of the read-only views, served instead of the ones in
+views.py when ``ASYNC_READ_VIEWS`` is on (asgi.py enables it). Under ASGI
+a sync view costs a thread hop per request; these run on the event loop and
+only leave it for the ORM's own ``sync_to_async`` calls.
+
+Each view subclasses its sync counterpart so querysets, visibility rules,
+templates and query budgets stay shared. Everything a template touches is
+fetched before rendering, and ``request.user`` is resolved up front, so no
+lazy query can fire on the event loop.
+"""
+from django.http import Http404
+from django.template.response import TemplateResponse
+from django.views import View
+
+from . import conditional, fragments, routers, views
+from .viewcounts import view_counts
+
+
+async def resolve_user(request):
+    """Load the user with the async ORM and pin it on ``request.user``."""
+    request.user = await request.auser()
+    return request.user
+
+
+class AsyncListMixin:
+    """Async ``get`` for list views that use ``KeysetPaginationMixin``."""
+
+    async def get(self, request, *args, **kwargs):
+        self.object_list = self.get_queryset()
+        return self.render_to_response(await self.aget_context_data())
+
+    async def aget_context_data(self, **kwargs):
+        paginator, page, object_list, is_paginated = await self.apaginate_queryset(
+            self.object_list, self.get_paginate_by(self.object_list),
+        )
+        context = {
+            'view': self,
+            'paginator': paginator,
+            'page_obj': page,
+            'is_paginated': is_paginated,
+            'object_list': object_list,
+            **kwargs,
+        }
+        context_object_name = self.get_context_object_name(object_list)
+        if context_object_name is not None:
+            context[context_object_name] = object_list
+        return context
+
+
+class AsyncStaffRequiredMixin:
+    """
+    Async stand-in for ``LoginRequiredMixin`` + ``UserPassesTestMixin``,
+    whose ``dispatch`` would read the lazy ``request.user`` synchronously.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await resolve_user(request)
+        if not user.is_authenticated or not self.get_test_func()():
+            return self.handle_no_permission()
+        return await View.dispatch(self, request, *args, **kwargs)
+
+
+class QuestionListView(AsyncListMixin, views.QuestionListView):
+
+    async def get(self, request, *args, **kwargs):
+        await resolve_user(request)
+        key = await fragments.alist_key(request)
+        etag = conditional.make_etag(key)
+        not_modified = conditional.not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        fragment = await fragments.aget(key)
+        questions, from_replica = None, False
+        if fragment is None:
+            self.object_list = self.get_queryset()
+            context = await self.aget_context_data()
+            fragment = fragments.render(self.fragment_template_name, context, request)
+            await fragments.aset(key, fragment)
+            questions = context['object_list']
+            from_replica = routers.reading_replica()
+        response = TemplateResponse(request, self.template_name, {
+            'fragment': await fragments.afinish(fragment, request, questions),
+        })
+        if from_replica:
+            return response
+        return conditional.patch_response(response, request, etag)
+
+
+class QuestionDetailView(views.QuestionDetailView):
+
+    async def aget_object(self):
+        try:
+            obj = await self.get_queryset().aget(pk=self.kwargs['pk'])
+        except self.model.DoesNotExist:
+            raise Http404(f'No {self.model._meta.verbose_name} found matching the query')
+        if not await obj.ais_visible_to(self.request.user):
+            raise Http404("This question is not approved.")
+        return obj
+
+    async def get(self, request, *args, **kwargs):
+        await resolve_user(request)
+        key = await fragments.aquestion_key(request, kwargs['pk'])
+        cached = await fragments.aget(key)
+        if cached is None:
+            validator = await conditional.aquestion_validator(kwargs['pk'], request.user)
+        else:
+            validator = cached['validator']
+        if validator is not None:
+            await view_counts.arecord(kwargs['pk'])
+            not_modified = conditional.not_modified(request, *validator)
+            if not_modified is not None:
+                return not_modified
+
+        questions = None
+        if cached is None:
+            self.object = await self.aget_object()
+            if validator is None:
+                await view_counts.arecord(self.object.pk)
+            questions = [self.object]
+            context = {
+                'view': self,
+                'object': self.object,
+                'question': self.object,
+                'answers': [answer async for answer in self.get_answer_queryset()],
+            }
+            html = fragments.render(self.fragment_template_name, context, request)
+            cached = {'title': self.object.title, 'html': html, 'validator': validator}
+            await fragments.aset(key, cached)
+        elif validator is None:
+            await view_counts.arecord(kwargs['pk'])
+        response = TemplateResponse(request, self.template_name, {
+            'title': cached['title'],
+            'fragment': await fragments.afinish(cached['html'], request, questions),
+        })
+        if validator is not None:
+            conditional.patch_response(response, request, *validator)
+        return response
+
+
+class UnapprovedQuestionListView(AsyncStaffRequiredMixin, AsyncListMixin, views.UnapprovedQuestionListView):
+    pass
+
+
+class UnapprovedAnswerListView(AsyncStaffRequiredMixin, AsyncListMixin, views.UnapprovedAnswerListView):
+    pass
+
+
+class ModeratorFlagListView(AsyncStaffRequiredMixin, AsyncListMixin, views.ModeratorFlagListView):
+    pass
@@ -0,0 +1,82 @@
+"""
+HTTP validators for the question pages, so browsers and proxies can
+revalidate with ``If-None-Match``/``If-Modified-Since`` and get a 304
+instead of a re-rendered page.
+
+Validators never load bodies: a question page is described by one
+aggregate row, and a list page by its fragment cache key (which already
+encodes the list version, the visibility class and the query string). View
+counts are left out, so a 304 may show a count that is slightly behind,
+as the write-behind buffer already allows.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from . import markup
+from .fragments import visibility_class
+from .models import Question
+
+
+def make_etag(*parts):
+    return '"%s"' % hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _question_state(question_id):
+    return (
+        Question.objects.filter(pk=question_id)
+        .annotate(last_answer=Max('answers__updated_at'))
+        .values_list(
+            'updated_at', 'last_answer', 'answer_count', 'pending_answer_count', 'approved', 'author_id',
+        )
+    )
+
+
+def _question_validator(row, user):
+    if row is None:
+        return None
+    updated_at, last_answer, answer_count, pending_answer_count, approved, author_id = row
+    # Leave anything not cheaply known to be visible to the full view.
+    if not (approved or user.is_staff or (user.is_authenticated and author_id == user.pk)):
+        return None
+    last_modified = max(updated_at, last_answer) if last_answer else updated_at
+    etag = make_etag(
+        updated_at.isoformat(), last_answer, answer_count, pending_answer_count, visibility_class(user),
+        markup.RENDERER_VERSION,
+    )
+    return etag, last_modified
+
+
+def question_validator(question_id, user):
+    """``(etag, last_modified)`` for a question page, or ``None`` to skip revalidation."""
+    return _question_validator(_question_state(question_id).first(), user)
+
+
+async def aquestion_validator(question_id, user):
+    return _question_validator(await _question_state(question_id).afirst(), user)
+
+
+def not_modified(request, etag, last_modified=None):
+    """A 304 response if the client's copy is current, else ``None``."""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is not None:
+        patch_response(response, request, etag, last_modified)
+    return response
+
+
+def patch_response(response, request, etag, last_modified=None):
+    """Add the validators and let shared caches keep pages anonymous users get."""
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, max_age=0)
+    else:
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'PUBLIC_PAGE_MAX_AGE', 0))
+    patch_vary_headers(response, ['Cookie'])
+    return response
@@ -0,0 +1,100 @@
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Question, Answer, Flag, ModerationCounter
+
+
+def adjust(question_id, **deltas):
+    """Atomically add ``deltas`` to the counter columns of one question."""
+    changes = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if changes:
+        Question.objects.filter(pk=question_id).update(**changes)
+
+
+def add_deltas(model, field, deltas):
+    """
+    Apply a ``{pk: delta}`` mapping to ``field`` with one UPDATE per distinct
+    delta rather than one per row.
+    """
+    by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(pk)
+    for delta, pks in by_delta.items():
+        model.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+
+
+def answer_field(approved):
+    return 'answer_count' if approved else 'pending_answer_count'
+
+
+# ModerationCounter rows and the queues they count
+MODERATION_QUEUES = {
+    'pending_questions': lambda: Question.objects.filter(approved=False),
+    'pending_answers': lambda: Answer.objects.filter(approved=False),
+    'open_flags': lambda: Flag.objects.filter(resolved=False),
+}
+
+
+def pending_queue(model):
+    return 'pending_questions' if model is Question else 'pending_answers'
+
+
+def adjust_moderation(**deltas):
+    """Atomically add ``deltas`` to the named moderation queue counters."""
+    for name, delta in deltas.items():
+        if delta and not ModerationCounter.objects.filter(name=name).update(value=F('value') + delta):
+            # The row is missing (e.g. a flushed test database): count the
+            # queue, which already includes this change.
+            ModerationCounter.objects.get_or_create(name=name, defaults={'value': MODERATION_QUEUES[name]().count()})
+
+
+def moderation_counts():
+    """``{queue name: size}`` from the counter rows, in one query."""
+    counts = dict.fromkeys(MODERATION_QUEUES, 0)
+    counts.update(ModerationCounter.objects.filter(name__in=MODERATION_QUEUES).values_list('name', 'value'))
+    return counts
+
+
+def flag_question_id(content_type, object_id):
+    """The question a flag target belongs to (itself, or an answer's question)."""
+    if content_type.model_class() is Question:
+        return object_id
+    return Answer.objects.filter(pk=object_id).values_list('question_id', flat=True).first()
+
+
+def recount_moderation():
+    """Recompute the moderation queue counters from the source tables."""
+    for name, queue in MODERATION_QUEUES.items():
+        ModerationCounter.objects.update_or_create(name=name, defaults={'value': queue().count()})
+
+
+def recount(questions=None):
+    """Recompute every counter from the source tables, repairing any drift."""
+    if questions is None:
+        recount_moderation()
+        questions = Question.objects.all()
+    question_ct = ContentType.objects.get_for_model(Question)
+    answer_ct = ContentType.objects.get_for_model(Answer)
+
+    def count(queryset):
+        return Coalesce(Subquery(
+            queryset.order_by().annotate(n=Count('*')).values('n')[:1]
+        ), 0)
+
+    answers = Answer.objects.filter(question=OuterRef('pk')).values('question')
+    open_flags = Flag.objects.filter(resolved=False)
+    return questions.update(
+        answer_count=count(answers.filter(approved=True)),
+        pending_answer_count=count(answers.filter(approved=False)),
+        open_flag_count=(
+            count(open_flags.filter(content_type=question_ct, object_id=OuterRef('pk')).values('object_id'))
+            + count(open_flags.filter(
+                content_type=answer_ct,
+                object_id__in=Answer.objects.filter(question=OuterRef(OuterRef('pk'))).values('pk'),
+            ).values('content_type'))
+        ),
+    )
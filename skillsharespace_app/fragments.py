@@ -0,0 +1,208 @@
+import hashlib
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from . import markup, routers
+from .models import Question
+from .viewcounts import view_counts
+
+# Fragments are shared between users of a visibility class, so they are
+# rendered with this in place of the per-user CSRF token and the real token
+# is substituted on every response.
+CSRF_PLACEHOLDER = 'fragment-csrf-token-placeholder'
+
+LIST_VERSION_KEY = 'fragments:list:version'
+
+# View counts change on every visit, far more often than the fragments are
+# retired, so fragments carry this marker (see the ``view_count`` template
+# filter) and the current count is filled in on every response. Users
+# cannot produce it: titles are escaped and bodies sanitized of comments.
+VIEW_COUNT_MARKER = '<!--views:{}-->'
+VIEW_COUNT_PATTERN = re.compile(r'<!--views:(\d+)-->')
+
+
+def _cache():
+    return caches[getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 300)
+
+
+def _question_version_key(question_id):
+    return f'fragments:question:{question_id}:version'
+
+
+def _version(key):
+    cache = _cache()
+    version = cache.get(key)
+    if version is None:
+        # Start from a value no earlier (possibly evicted) version could have
+        # had, so stale fragments can never be picked up again.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+async def _aversion(key):
+    cache = _cache()
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def _bump(key):
+    cache = _cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def visibility_class(user):
+    """Anonymous users share one key space; staff and members get their own."""
+    if not user.is_authenticated:
+        return 'anon'
+    return f'{"staff" if user.is_staff else "user"}:{user.pk}'
+
+
+def _list_key(request, version):
+    query = hashlib.md5(request.GET.urlencode().encode()).hexdigest()
+    return f'fragments:list:{version}:{visibility_class(request.user)}:{query}'
+
+
+def _question_key(request, question_id, version):
+    # A new Markdown renderer retires every rendered page at once.
+    return (
+        f'fragments:question:{question_id}:{version}:r{markup.RENDERER_VERSION}:{visibility_class(request.user)}'
+    )
+
+
+def list_key(request):
+    return _list_key(request, _version(LIST_VERSION_KEY))
+
+
+def question_key(request, question_id):
+    return _question_key(request, question_id, _version(_question_version_key(question_id)))
+
+
+def get(key):
+    if not _timeout():
+        return None
+    return _cache().get(key)
+
+
+def _cacheable():
+    # A lagging replica can return rows older than the version in the key:
+    # caching them would serve the old page until the next change.
+    return _timeout() and not routers.reading_replica()
+
+
+def set(key, value):
+    """Cache ``value`` under ``key``, unless it was rendered from a replica."""
+    if _cacheable():
+        _cache().set(key, value, _timeout())
+
+
+# Async counterparts for the views in async_views.py.
+
+async def alist_key(request):
+    return _list_key(request, await _aversion(LIST_VERSION_KEY))
+
+
+async def aquestion_key(request, question_id):
+    return _question_key(request, question_id, await _aversion(_question_version_key(question_id)))
+
+
+async def aget(key):
+    if not _timeout():
+        return None
+    return await _cache().aget(key)
+
+
+async def aset(key, value):
+    if _cacheable():
+        await _cache().aset(key, value, _timeout())
+
+
+def render(template_name, context, request):
+    return render_to_string(template_name, {**context, 'csrf_token': CSRF_PLACEHOLDER}, request)
+
+
+def _view_count_ids(fragment):
+    return {int(pk) for pk in VIEW_COUNT_PATTERN.findall(fragment)}
+
+
+def _finish(fragment, request, views):
+    if views is not None:
+        fragment = VIEW_COUNT_PATTERN.sub(
+            lambda match: str(views.get(int(match[1]), 0) + view_counts.pending(int(match[1]))), fragment,
+        )
+    # Only touch the CSRF token when the fragment has a form: anonymous
+    # pages stay free of per-visitor tokens and cookies, so shared caches
+    # can keep them.
+    if CSRF_PLACEHOLDER not in fragment:
+        return mark_safe(fragment)
+    return mark_safe(fragment.replace(CSRF_PLACEHOLDER, get_token(request)))
+
+
+def finish(fragment, request, questions=None):
+    """
+    Make a cached fragment ready to send to ``request``. View counts come
+    from ``questions`` when the fragment was just rendered from them, and
+    otherwise from one query for the questions on the page.
+    """
+    if questions is not None:
+        views = {question.pk: question.views for question in questions}
+    elif ids := _view_count_ids(fragment):
+        views = dict(Question.objects.filter(pk__in=ids).values_list('pk', 'views'))
+    else:
+        views = None
+    return _finish(fragment, request, views)
+
+
+async def afinish(fragment, request, questions=None):
+    if questions is not None:
+        views = {question.pk: question.views for question in questions}
+    elif ids := _view_count_ids(fragment):
+        views = {pk: count async for pk, count in Question.objects.filter(pk__in=ids).values_list('pk', 'views')}
+    else:
+        views = None
+    return _finish(fragment, request, views)
+
+
+def invalidate_question(question_id):
+    """
+    Retire the cached detail page of a question and every list page. Runs
+    after commit so a concurrent request cannot re-cache the old state under
+    the new version.
+    """
+    def bump():
+        _bump(_question_version_key(question_id))
+        _bump(LIST_VERSION_KEY)
+    transaction.on_commit(bump)
+
+
+def invalidate_questions(question_ids):
+    """``invalidate_question`` for many questions, bumping the list version once."""
+    question_ids = list(question_ids)
+
+    def bump():
+        for question_id in question_ids:
+            _bump(_question_version_key(question_id))
+        _bump(LIST_VERSION_KEY)
+    transaction.on_commit(bump)
+
+
+def invalidate_lists():
+    """Retire every list page, after commit; for bulk writes to new questions."""
+    transaction.on_commit(lambda: _bump(LIST_VERSION_KEY))
@@ -0,0 +1,259 @@
+import json
+import random
+import statistics
+import time
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_databases, teardown_databases
+
+from skillsharespace_app import markup, moderation
+from skillsharespace_app.counters import recount
+from skillsharespace_app.models import Question, Answer, Flag, FlagReport
+from skillsharespace_app.search import get_backend as get_search_backend
+
+WORDS = (
+    'python django query index cache sqlite postgres template form view model migration signal '
+    'middleware session login deploy docker test fixture async thread queue worker celery redis '
+    'json api pagination search unicode timezone upload static admin permission transaction lock'
+).split()
+
+ENDPOINTS = ('list', 'search', 'detail', 'dashboard', 'flag', 'approve')
+
+
+def zipf_weights(n, s):
+    """Cumulative weights for picking rank ``i`` with probability ~ 1 / (i + 1) ** s."""
+    return list(accumulate(1 / (rank + 1) ** s for rank in range(n)))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database with Zipf-distributed questions, answers, views and flags, '
+        'drive the main pages through the test client and report query counts, latency '
+        'percentiles and throughput per endpoint as JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--questions', type=int, default=2000)
+        parser.add_argument('--answers', type=int, default=8000)
+        parser.add_argument('--zipf', type=float, default=1.1, help='Skew of answers, views and flags.')
+        parser.add_argument('--pending', type=float, default=0.1, help='Share of content awaiting approval.')
+        parser.add_argument('--flagged', type=float, default=0.02, help='Share of content flagged.')
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per endpoint.')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per endpoint.')
+        parser.add_argument('--endpoint', choices=ENDPOINTS, action='append', help='Default: all.')
+        parser.add_argument('--no-cache', action='store_true', help='Turn off the fragment cache.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the JSON report here instead of stdout.')
+        parser.add_argument(
+            '--baseline', help='A previous report; fail if any endpoint now runs more queries.',
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        old_config = setup_databases(verbosity=0, interactive=False, aliases=set(connections))
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=['testserver'],
+                VIEW_COUNT_FLUSH_INTERVAL=0,
+                QUERY_BUDGET_ENABLED=False,
+                FRAGMENT_CACHE_TIMEOUT=0 if options['no_cache'] else settings.FRAGMENT_CACHE_TIMEOUT,
+            ):
+                caches[settings.FRAGMENT_CACHE_ALIAS].clear()
+                self.rng = random.Random(options['seed'])
+                started = time.perf_counter()
+                self.seed(options)
+                seed_seconds = time.perf_counter() - started
+                report = {
+                    'config': {
+                        name: options[name] for name in (
+                            'users', 'questions', 'answers', 'zipf', 'pending', 'flagged',
+                            'requests', 'warmup', 'no_cache', 'seed',
+                        )
+                    },
+                    'database': connection.vendor,
+                    'seed_seconds': round(seed_seconds, 2),
+                    'endpoints': {
+                        name: self.measure(name, options['requests'], options['warmup'])
+                        for name in options['endpoint'] or ENDPOINTS
+                    },
+                }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+        if baseline is not None:
+            self.compare(baseline, report)
+
+    def seed(self, options):
+        rng, s = self.rng, options['zipf']
+        User.objects.bulk_create([
+            User(username=f'user{i}', password='!') for i in range(options['users'])
+        ], batch_size=500)
+        self.users = list(User.objects.order_by('pk'))
+        self.staff = User.objects.create(username='bench-staff', password='!', is_staff=True)
+        user_weights = zipf_weights(len(self.users), s)
+
+        def text(words):
+            return ' '.join(rng.choices(WORDS, k=words))
+
+        questions = Question.objects.bulk_create([
+            Question(
+                title=text(6).capitalize(),
+                body=text(80),
+                author=rng.choices(self.users, cum_weights=user_weights)[0],
+                approved=rng.random() >= options['pending'],
+            )
+            for _ in range(options['questions'])
+        ], batch_size=500)
+        # Popular questions get most answers, views and flags.
+        self.question_weights = zipf_weights(len(questions), s)
+        # Pages are requested anonymously, so only approved questions, same skew.
+        public = [(question.pk, rank) for rank, question in enumerate(questions) if question.approved]
+        self.public_ids = [pk for pk, _ in public]
+        self.public_weights = list(accumulate(1 / (rank + 1) ** s for _, rank in public))
+        self.pending_ids = [question.pk for question in questions if not question.approved]
+
+        answers = Answer.objects.bulk_create([
+            Answer(
+                question=rng.choices(questions, cum_weights=self.question_weights)[0],
+                body=text(40),
+                author=rng.choices(self.users, cum_weights=user_weights)[0],
+                approved=rng.random() >= options['pending'],
+            )
+            for _ in range(options['answers'])
+        ], batch_size=500)
+
+        total_views = options['questions'] * 50
+        weights = [b - a for a, b in zip([0, *self.question_weights], self.question_weights)]
+        for question, weight in zip(questions, weights):
+            question.views = int(total_views * weight / self.question_weights[-1])
+        Question.objects.bulk_update(questions, ['views'], batch_size=500)
+
+        question_ct = ContentType.objects.get_for_model(Question)
+        answer_ct = ContentType.objects.get_for_model(Answer)
+        targets = {}
+        for model_ct, objects in ((question_ct, questions), (answer_ct, answers)):
+            wanted = int(len(objects) * options['flagged'])
+            object_weights = zipf_weights(len(objects), s)
+            reports = {}
+            while len(reports) < wanted:
+                target = rng.choices(objects, cum_weights=object_weights)[0]
+                reports[target.pk] = reports.get(target.pk, 0) + 1
+            targets.update({(model_ct, object_id): count for object_id, count in reports.items()})
+        flags = Flag.objects.bulk_create([
+            Flag(
+                content_type=model_ct, object_id=object_id, reason='Flagged by bench',
+                report_count=min(reports, len(self.users)),
+            )
+            for (model_ct, object_id), reports in targets.items()
+        ], batch_size=500)
+        FlagReport.objects.bulk_create([
+            FlagReport(flag=flag, user=user)
+            for flag in flags for user in rng.sample(self.users, flag.report_count)
+        ], batch_size=500)
+
+        # bulk_create bypasses the signals that keep these in step.
+        recount()
+        get_search_backend().rebuild()
+        for model in (Question, Answer):
+            markup.rerender(model.objects.all())
+
+    def pick_question(self):
+        return self.rng.choices(self.public_ids, cum_weights=self.public_weights)[0]
+
+    def measure(self, name, requests, warmup):
+        anonymous = Client()
+        staff = Client()
+        staff.force_login(self.staff)
+        members = []
+        for user in self.rng.sample(self.users, min(10, len(self.users))):
+            client = Client()
+            client.force_login(user)
+            members.append(client)
+        pending = iter(self.pending_ids * (1 + (requests + warmup) // max(1, len(self.pending_ids))))
+        approved = []
+
+        def request():
+            if name == 'list':
+                return anonymous.get('/')
+            if name == 'search':
+                return anonymous.get('/', {'q': ' '.join(self.rng.sample(WORDS, 2))})
+            if name == 'detail':
+                return anonymous.get(f'/question/{self.pick_question()}/')
+            if name == 'dashboard':
+                return staff.get('/moderator/')
+            if name == 'flag':
+                return self.rng.choice(members).post(f'/flag/question/{self.pick_question()}/')
+            approved.append(next(pending))
+            return staff.post(f'/moderator/question/{approved[-1]}/approve/')
+
+        def reset():
+            # Put approved questions back in the queue, outside the timing.
+            while approved:
+                moderation.set_approved(Question.objects.get(pk=approved.pop()), False)
+
+        for _ in range(warmup):
+            request()
+            reset()
+
+        latencies, queries, errors = [], [], 0
+        total = 0.0
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = request()
+                elapsed = time.perf_counter() - start
+            total += elapsed
+            if response.status_code >= 400:
+                errors += 1
+            latencies.append(elapsed * 1000)
+            queries.append(len(captured))
+            reset()
+
+        return {
+            'requests': requests,
+            'errors': errors,
+            'queries': {'median': statistics.median(queries), 'max': max(queries)} if queries else None,
+            'latency_ms': {
+                f'p{pct}': round(percentile(latencies, pct), 3) for pct in (50, 95, 99)
+            },
+            'throughput_rps': round(requests / total, 1) if total else None,
+        }
+
+    def compare(self, baseline, report):
+        regressions = []
+        for name, current in report['endpoints'].items():
+            previous = baseline.get('endpoints', {}).get(name)
+            if not previous or not previous.get('queries') or not current['queries']:
+                continue
+            before, after = previous['queries']['max'], current['queries']['max']
+            p95_before, p95_after = previous['latency_ms']['p95'], current['latency_ms']['p95']
+            self.stderr.write(
+                f'{name:<10} queries {before} -> {after}   p95 {p95_before:.1f} -> {p95_after:.1f} ms'
+            )
+            if after > before:
+                regressions.append(f'{name} ({before} -> {after})')
+        if regressions:
+            raise CommandError(f'More queries than the baseline: {", ".join(regressions)}.')
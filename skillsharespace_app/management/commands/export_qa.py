@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from skillsharespace_app.models import Question, Answer
+
+# Record type -> (model, {key: column}). Authors go by username, so the
+# archive can be imported into a database with different user ids.
+RECORDS = {
+    'question': (Question, {
+        'id': 'id', 'title': 'title', 'body': 'body', 'author': 'author__username',
+        'approved': 'approved', 'created_at': 'created_at', 'views': 'views',
+    }),
+    'answer': (Answer, {
+        'id': 'id', 'question': 'question_id', 'body': 'body', 'author': 'author__username',
+        'approved': 'approved', 'created_at': 'created_at',
+    }),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream every question and then every answer as NDJSON, one record per line, for import_qa. '
+        'Rows are read in chunks, so memory use does not grow with the archive.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', help='File to write; standard output if omitted.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched from the database at a time.')
+
+    def handle(self, *args, output, chunk_size, **options):
+        out = open(output, 'w', encoding='utf-8') if output else self.stdout
+        counts = {}
+        try:
+            for kind, (model, columns) in RECORDS.items():
+                counts[kind] = 0
+                rows = model.objects.order_by('pk').values_list(*columns.values()).iterator(chunk_size=chunk_size)
+                for row in rows:
+                    out.write(json.dumps({'type': kind, **dict(zip(columns, row))}, cls=DjangoJSONEncoder) + '\n')
+                    counts[kind] += 1
+        finally:
+            if output:
+                out.close()
+        # Keep standard output clean for the records themselves.
+        (self.stdout if output else self.stderr).write(self.style.SUCCESS(
+            f'Exported {counts["question"]} questions and {counts["answer"]} answers.'
+        ))
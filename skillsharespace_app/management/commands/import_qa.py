@@ -0,0 +1,209 @@
+import json
+import os
+import uuid
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from skillsharespace_app import counters, fragments, markup
+from skillsharespace_app.models import Question, Answer, ImportedRecord
+from skillsharespace_app.search import get_backend as get_search_backend
+
+
+class Command(BaseCommand):
+    help = (
+        'Import an NDJSON archive written by export_qa. Records are inserted with bulk_create in batches, '
+        'one transaction each, so no save signals fire; counters and the search index are rebuilt once at '
+        'the end. Authors are matched by username and missing ones are created with unusable passwords. '
+        'Progress is checkpointed after every batch, and running the command again resumes from there.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='NDJSON file written by export_qa.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Records inserted per transaction.')
+        parser.add_argument('--checkpoint', help='Progress file; defaults to <input>.checkpoint.')
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint and start over.')
+
+    def handle(self, *args, input, batch_size, checkpoint, restart, verbosity, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError('import_qa needs a database that returns the ids of bulk-inserted rows.')
+        self.checkpoint_path = checkpoint or f'{input}.checkpoint'
+        state = None if restart else self.load_checkpoint(input)
+        if state is None:
+            state = {
+                'input': os.path.abspath(input),
+                # Keys this run's ImportedRecord rows.
+                'run': uuid.uuid4().hex,
+                'offset': 0,
+                'line': 0,
+                'questions': 0,
+                'answers': 0,
+                'users': 0,
+            }
+            self.save_checkpoint(state)
+            self.unconfirmed = False
+        else:
+            self.stdout.write(f'Resuming at line {state["line"] + 1}.')
+            # The batch after the checkpoint may have been committed before
+            # the checkpoint was written.
+            self.unconfirmed = True
+
+        self.authors = {}
+        with open(input, 'rb') as archive:
+            archive.seek(state['offset'])
+            batch, offset = [], state['offset']
+            for line in archive:
+                offset += len(line)
+                if line.strip():
+                    batch.append(line)
+                if len(batch) == batch_size:
+                    self.import_batch(batch, state, offset)
+                    batch = []
+                    if verbosity > 1:
+                        self.stdout.write(f'{state["questions"]} questions, {state["answers"]} answers imported.')
+            self.import_batch(batch, state, offset)
+
+        self.finish(state)
+        os.remove(self.checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {state["questions"]} questions and {state["answers"]} answers; '
+            f'created {state["users"]} users.'
+        ))
+
+    def load_checkpoint(self, input):
+        try:
+            with open(self.checkpoint_path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        if state['input'] != os.path.abspath(input):
+            raise CommandError(
+                f'{self.checkpoint_path} belongs to an import of {state["input"]}; pass --restart to start over.'
+            )
+        return state
+
+    def save_checkpoint(self, state):
+        # Replace the file in one step, so an interruption leaves either the
+        # old checkpoint or the new one.
+        temporary = f'{self.checkpoint_path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(state, f)
+        os.replace(temporary, self.checkpoint_path)
+
+    def import_batch(self, lines, state, offset):
+        """Insert ``lines`` in one transaction, then checkpoint ``offset``, the end of the batch."""
+        records = []
+        for number, line in enumerate(lines, state['line'] + 1):
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                raise CommandError(f'Record {number}: {e}')
+            if record.get('type') not in ('question', 'answer'):
+                raise CommandError(f'Record {number}: unknown type {record.get("type")!r}.')
+            records.append(record)
+        with transaction.atomic():
+            authors = self.resolve_authors({record['author'] for record in records}, state)
+            questions = [record for record in records if record['type'] == 'question']
+            answers = [record for record in records if record['type'] == 'answer']
+            created_questions = self.insert(
+                Question, 'question', questions, state, lambda record: self.question(record, authors),
+            )
+            question_ids = self.mapping(state, 'question', {record['question'] for record in answers})
+            created_answers = self.insert(
+                Answer, 'answer', answers, state, lambda record: self.answer(record, authors, question_ids),
+            )
+        self.unconfirmed = False
+        state['line'] += len(lines)
+        state['offset'] = offset
+        state['questions'] += created_questions
+        state['answers'] += created_answers
+        self.save_checkpoint(state)
+
+    def mapping(self, state, kind, source_ids):
+        """``{archive id: new id}`` for the ``kind`` records of ``source_ids`` this run has imported."""
+        return dict(
+            ImportedRecord.objects.filter(run=state['run'], kind=kind, source_id__in=source_ids)
+            .values_list('source_id', 'target_id')
+        )
+
+    def insert(self, model, kind, records, state, build):
+        """
+        Create a ``model`` row with ``build`` for each of ``records`` and map
+        its archive id to the new row. Returns how many records were imported.
+        """
+        source_ids = [record['id'] for record in records]
+        repeated = [source_id for source_id, count in Counter(source_ids).items() if count > 1]
+        imported = self.mapping(state, kind, source_ids)
+        if imported and not repeated:
+            # Only a batch committed just before an interruption can come
+            # round again, and then whole, since it was one transaction. Its
+            # rows were never counted in a checkpoint, so count them now.
+            if self.unconfirmed and len(imported) == len(records):
+                return len(records)
+            repeated = sorted(imported)
+        if repeated:
+            raise CommandError(f'{kind.capitalize()} {repeated[0]} appears in the archive more than once.')
+        rows = [build(record) for record in records]
+        model.objects.bulk_create(rows)
+        ImportedRecord.objects.bulk_create([
+            ImportedRecord(run=state['run'], kind=kind, source_id=record['id'], target_id=row.pk)
+            for record, row in zip(records, rows)
+        ])
+        return len(rows)
+
+    def resolve_authors(self, usernames, state):
+        """``{username: user id}`` for ``usernames``, creating the users that do not exist yet."""
+        missing = usernames - self.authors.keys()
+        if missing:
+            self.authors.update(User.objects.filter(username__in=missing).values_list('username', 'pk'))
+            new = missing - self.authors.keys()
+            if new:
+                User.objects.bulk_create([User(username=username, password=make_password(None)) for username in new])
+                self.authors.update(User.objects.filter(username__in=new).values_list('username', 'pk'))
+                state['users'] += len(new)
+        return self.authors
+
+    def question(self, record, authors):
+        question = Question(
+            title=record['title'],
+            body=record['body'],
+            author_id=authors[record['author']],
+            approved=record.get('approved', False),
+            views=record.get('views', 0),
+        )
+        if record.get('created_at'):
+            question.created_at = record['created_at']
+        markup.render_body(question)
+        return question
+
+    def answer(self, record, authors, question_ids):
+        try:
+            question_id = question_ids[record['question']]
+        except KeyError:
+            raise CommandError(
+                f'Answer {record["id"]} belongs to question {record["question"]}, which the archive has not listed.'
+            )
+        answer = Answer(
+            question_id=question_id,
+            body=record['body'],
+            author_id=authors[record['author']],
+            approved=record.get('approved', False),
+        )
+        if record.get('created_at'):
+            answer.created_at = record['created_at']
+        markup.render_body(answer)
+        return answer
+
+    def finish(self, state):
+        """What the skipped signals would have done, once for the whole import."""
+        self.stdout.write('Rebuilding counters and the search index.')
+        imported = ImportedRecord.objects.filter(run=state['run'])
+        counters.recount(Question.objects.filter(pk__in=imported.filter(kind='question').values('target_id')))
+        counters.recount_moderation()
+        get_search_backend().rebuild()
+        fragments.invalidate_lists()
+        # The map is only needed to resume.
+        imported.delete()
@@ -0,0 +1,68 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from skillsharespace_app import moderation
+from skillsharespace_app.models import Question, Answer
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-delete spam: questions and answers by author, id or age. Deletes go through the '
+        'ORM, so flags, counters and the search index are cleaned up in batches by the delete signals.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--author', action='append', default=[], help='Username; repeatable.')
+        parser.add_argument('--question', action='append', type=int, default=[], help='Question id; repeatable.')
+        parser.add_argument('--answer', action='append', type=int, default=[], help='Answer id; repeatable.')
+        parser.add_argument('--unapproved', action='store_true', help='Only content still awaiting approval.')
+        parser.add_argument('--older-than', type=int, metavar='DAYS', help='Only content created this many days ago or earlier.')
+        parser.add_argument('--orphans', action='store_true', help='Also delete flags whose content no longer exists.')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting.')
+
+    def handle(self, *args, author, question, answer, unapproved, older_than, orphans, dry_run, **options):
+        if not (author or question or answer or orphans):
+            raise CommandError('Give at least one of --author, --question, --answer or --orphans.')
+
+        questions = Question.objects.none()
+        answers = Answer.objects.none()
+        if author or question:
+            questions = Question.objects.all()
+            if author:
+                questions = questions.filter(author__username__in=author)
+            if question:
+                questions = questions.filter(pk__in=question)
+        if author or answer:
+            answers = Answer.objects.all()
+            if author:
+                answers = answers.filter(author__username__in=author)
+            if answer:
+                answers = answers.filter(pk__in=answer)
+        if unapproved:
+            questions = questions.filter(approved=False)
+            answers = answers.filter(approved=False)
+        if older_than is not None:
+            cutoff = timezone.now() - timedelta(days=older_than)
+            questions = questions.filter(created_at__lte=cutoff)
+            answers = answers.filter(created_at__lte=cutoff)
+
+        if dry_run:
+            self.stdout.write(
+                f'Would delete {questions.count()} questions and {answers.exclude(question__in=questions).count()} '
+                f'other answers.'
+            )
+            return
+
+        with transaction.atomic():
+            # Questions first, so their answers go in the same cascade.
+            _, deleted_questions = questions.delete()
+            _, deleted_answers = answers.delete()
+            orphaned = moderation.delete_orphaned_flags() if orphans else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted_questions.get(Question._meta.label, 0)} questions, '
+            f'{deleted_questions.get(Answer._meta.label, 0) + deleted_answers.get(Answer._meta.label, 0)} answers '
+            f'and {orphaned} orphaned flags.'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from skillsharespace_app.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the question search index from the database.'
+
+    def handle(self, *args, **options):
+        get_backend().rebuild()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
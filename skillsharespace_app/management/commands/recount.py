@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from skillsharespace_app.counters import recount
+from skillsharespace_app.models import Question
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-question answer and flag counters, and the moderation queue counters, from the source tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('question_ids', nargs='*', type=int, help='Only recount these questions (skips the queue counters).')
+
+    def handle(self, *args, question_ids, **options):
+        questions = Question.objects.filter(pk__in=question_ids) if question_ids else None
+        updated = recount(questions)
+        self.stdout.write(self.style.SUCCESS(f'Recounted {updated} questions.'))
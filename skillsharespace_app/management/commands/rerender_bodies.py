@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from skillsharespace_app import markup
+from skillsharespace_app.models import Question, Answer
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-render the stored HTML of question and answer bodies made by an older Markdown renderer. '
+        'Run it after changing markup.RENDERER_VERSION; pages render stale bodies on the fly until then.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows loaded and updated at a time.')
+
+    def handle(self, *args, batch_size, **options):
+        for model in (Question, Answer):
+            updated = markup.rerender(model.objects.all(), batch_size)
+            self.stdout.write(self.style.SUCCESS(
+                f'Re-rendered {updated} {model._meta.verbose_name_plural} (renderer version {markup.RENDERER_VERSION}).'
+            ))
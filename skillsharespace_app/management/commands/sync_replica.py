@@ -0,0 +1,32 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Copy the default SQLite database over each replica in DATABASE_REPLICAS, '
+        'for trying out replica routing locally.'
+    )
+
+    def handle(self, *args, **options):
+        primary = connections['default']
+        if primary.vendor != 'sqlite':
+            raise CommandError('sync_replica only copies SQLite databases; use real replication elsewhere.')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas configured; set SKILLSHARE_REPLICA_DBS.')
+
+        source = sqlite3.connect(primary.settings_dict['NAME'])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                connections[alias].close()
+                target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(self.style.SUCCESS(f'Copied default to {alias}.'))
+        finally:
+            source.close()
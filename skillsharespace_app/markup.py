@@ -0,0 +1,62 @@
+"""
+Markdown bodies for questions and answers, rendered and sanitized once when
+they are saved (see ``Question.save``/``Answer.save``) and stored in
+``body_html``, so pages emit stored HTML instead of parsing on every view.
+
+``RENDERER_VERSION`` is stored alongside; bump it whenever the output of
+``render`` changes and run ``manage.py rerender_bodies`` to bring stored
+bodies up to date.
+"""
+import markdown
+import nh3
+
+RENDERER_VERSION = 1
+
+MARKDOWN_EXTENSIONS = ['fenced_code', 'sane_lists']
+
+ALLOWED_TAGS = {
+    'a', 'blockquote', 'br', 'code', 'em', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'hr', 'li', 'ol', 'p', 'pre', 'strong', 'ul',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    # fenced_code marks the language as ``class="language-x"``.
+    'code': {'class'},
+}
+URL_SCHEMES = {'http', 'https', 'mailto'}
+
+
+def render(text):
+    """Markdown to HTML that is safe to emit as is."""
+    html = markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS, output_format='html')
+    return nh3.clean(
+        html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, url_schemes=URL_SCHEMES,
+        link_rel='nofollow noopener noreferrer',
+    )
+
+
+def render_body(instance):
+    """Fill ``instance.body_html`` from its ``body`` with the current renderer."""
+    instance.body_html = render(instance.body)
+    instance.body_html_version = RENDERER_VERSION
+
+
+def rerender(queryset, batch_size=500):
+    """
+    Bring the stored bodies in ``queryset`` up to the current renderer, in
+    batches by primary key, one ``bulk_update`` each. Rows are loaded with
+    their body only, and saves (and their signals) are skipped: pages already
+    render out-of-date rows on the fly, so nothing else changes. Returns the
+    number of rows re-rendered.
+    """
+    stale = queryset.exclude(body_html_version=RENDERER_VERSION).only('body').order_by('pk')
+    last_pk, total = None, 0
+    while True:
+        batch = list((stale if last_pk is None else stale.filter(pk__gt=last_pk))[:batch_size])
+        if not batch:
+            return total
+        for instance in batch:
+            render_body(instance)
+        queryset.model.objects.bulk_update(batch, ['body_html', 'body_html_version'])
+        total += len(batch)
+        last_pk = batch[-1].pk
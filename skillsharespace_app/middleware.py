@@ -0,0 +1,315 @@
+import logging
+import time
+from contextlib import ExitStack
+from functools import partial
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.utils.functional import SimpleLazyObject
+
+from . import profiling, routers, usercache
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    """``execute_wrapper`` that counts the queries run on a connection."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def wrap_connections(wrapper):
+    """Install ``wrapper`` on every connection until the returned stack is closed."""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+    return stack
+
+
+def query_budget(budget):
+    """Declare the query budget of a function-based view."""
+    def decorator(view_func):
+        view_func.query_budget = budget
+        return view_func
+    return decorator
+
+
+class QueryBudgetMiddleware:
+    """
+    Count every query a request runs and complain when the view exceeds the
+    ``query_budget`` it declares (a class attribute on class-based views, or
+    the ``query_budget`` decorator on functions).
+
+    Active when ``QUERY_BUDGET_ENABLED`` is true, which defaults to ``DEBUG``.
+    Overruns are logged, or raised as ``QueryBudgetExceeded`` when
+    ``QUERY_BUDGET_RAISE`` is set so tests fail on them.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        counter = QueryCounter()
+        with wrap_connections(counter):
+            response = self.get_response(request)
+        self._check(request, counter)
+        return response
+
+    async def __acall__(self, request):
+        # The async ORM runs queries on the request's sync_to_async thread,
+        # whose connections are not the event loop's, so wrap those.
+        counter = QueryCounter()
+        stack = await sync_to_async(wrap_connections)(counter)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self._check(request, counter)
+        return response
+
+    def _check(self, request, counter):
+        budget = getattr(request, 'query_budget', None)
+        if budget is not None and counter.count > budget:
+            message = (
+                f'{request.method} {request.path} ran {counter.count} queries, '
+                f'over its budget of {budget}'
+            )
+            if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        request.query_budget = getattr(view, 'query_budget', None)
+
+
+class ProfilingMiddleware:
+    """
+    Time every request, its SQL (count, time and repeated statements) and
+    its template rendering, add the totals as a ``Server-Timing`` header and
+    aggregate them per URL name for the staff-only ``profile-stats`` view.
+
+    Staff can add ``?_profile=1`` (cProfile) or ``?_profile=pyinstrument``
+    (if installed) to any page to get the profile instead of the page.
+
+    Opt-in with ``PROFILING_ENABLED``; otherwise it is removed from the
+    stack at startup and costs nothing. Must come after the authentication
+    middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        profiling.install_template_timer()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        kind = profiling.Capture.requested(request)
+        capture = profiling.Capture(kind) if kind and request.user.is_staff else None
+        profile = profiling.RequestProfile()
+        token = profiling.activate(profile)
+        try:
+            with wrap_connections(profile):
+                if capture:
+                    capture.start()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if capture:
+                        capture.stop()
+        finally:
+            profiling.deactivate(token)
+        return self._finish(request, response, profile, capture)
+
+    async def __acall__(self, request):
+        kind = profiling.Capture.requested(request)
+        capture = profiling.Capture(kind, async_mode=True) if kind and (await request.auser()).is_staff else None
+        profile = profiling.RequestProfile()
+        token = profiling.activate(profile)
+        try:
+            stack = await sync_to_async(wrap_connections)(profile)
+            if capture:
+                capture.start()
+            try:
+                response = await self.get_response(request)
+            finally:
+                if capture:
+                    capture.stop()
+                await sync_to_async(stack.close)()
+        finally:
+            profiling.deactivate(token)
+        return self._finish(request, response, profile, capture)
+
+    def _finish(self, request, response, profile, capture):
+        profile.finish()
+        if capture:
+            content, content_type = capture.report()
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            # Profiled requests are skewed by the profiler, so leave them out.
+            match = request.resolver_match
+            name = (match.url_name or match.view_name) if match else '<unresolved>'
+            profiling.profile_stats.add(name, profile)
+        response['Server-Timing'] = profile.server_timing()
+        return response
+
+
+class WriteTransactionMiddleware:
+    """
+    Run each unsafe-method (POST, ...) request in one transaction, so a
+    write request commits or rolls back as a whole and, with the production
+    database profile, takes the SQLite write lock up front
+    (``BEGIN IMMEDIATE``) instead of hitting "database is locked" midway.
+    Reads stay in autocommit and never queue behind writers.
+
+    The transaction wraps the rest of the middleware chain rather than the
+    view alone, so the other middleware still see the view's exceptions in
+    ``process_exception``; an exception marks the transaction for rollback.
+
+    Active when ``ATOMIC_WRITE_REQUESTS`` is true, which settings.py ties to
+    the production database profile. Must come last, after the CSRF and
+    authentication middleware.
+    """
+    sync_capable = True
+    async_capable = True
+    safe_methods = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'ATOMIC_WRITE_REQUESTS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.method in self.safe_methods:
+            return self.get_response(request)
+        with transaction.atomic():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.method in self.safe_methods:
+            return await self.get_response(request)
+        # The transaction belongs to the thread that runs sync views and
+        # ORM calls, so open it there and run the chain from inside it.
+        return await sync_to_async(self._atomic_call, thread_sensitive=True)(request)
+
+    def _atomic_call(self, request):
+        with transaction.atomic():
+            return async_to_sync(self.get_response)(request)
+
+    def process_exception(self, request, exception):
+        if request.method not in self.safe_methods:
+            transaction.set_rollback(True)
+        return None
+
+
+class ReplicaReadMiddleware:
+    """
+    Let GET requests to views marked ``replica_reads = True`` read from the
+    replica databases, unless the session wrote something in the last
+    ``REPLICA_STICKY_SECONDS``: a POST pins the session to the primary for
+    that long, so authors see their own posts and moderators their own
+    approvals before the replicas catch up.
+
+    Unused unless ``DATABASE_REPLICAS`` names at least one alias. Must come
+    after the session middleware.
+    """
+    sync_capable = True
+    async_capable = True
+    session_key = '_primary_until'
+    safe_methods = ('GET', 'HEAD')
+
+    def __init__(self, get_response):
+        if not routers.replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.use_replica(False)
+        self._stick(request, response)
+        return response
+
+    async def __acall__(self, request):
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.use_replica(False)
+        await sync_to_async(self._stick)(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        if request.method not in self.safe_methods or not getattr(view, 'replica_reads', False):
+            return None
+        if request.session.get(self.session_key, 0) > time.time():
+            return None
+        routers.use_replica()
+        return None
+
+    def _stick(self, request, response):
+        if request.method not in self.safe_methods and response.status_code < 500:
+            request.session[self.session_key] = time.time() + getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+
+
+def _get_cached_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = usercache.get_user(request)
+    return request._cached_user
+
+
+async def _aget_cached_user(request):
+    if not hasattr(request, '_acached_user'):
+        request._acached_user = await usercache.aget_user(request)
+    return request._acached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """
+    ``AuthenticationMiddleware`` that takes ``request.user`` from the user
+    cache (``usercache.py``) instead of loading it on every request. Pair it
+    with a cached session engine and a logged-in page costs no auth queries
+    once both caches are warm.
+    """
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _get_cached_user(request))
+        request.auser = partial(_aget_cached_user, request)
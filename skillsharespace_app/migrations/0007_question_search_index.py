@@ -0,0 +1,36 @@
+from django.db import migrations
+
+FTS_TABLE = 'skillsharespace_app_question_fts'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+        f"USING fts5(title, body, answers, tokenize='porter unicode61')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {FTS_TABLE} (rowid, title, body, answers) "
+        f"SELECT q.id, q.title, q.body, COALESCE(("
+        f"  SELECT group_concat(a.body, char(10)) FROM skillsharespace_app_answer a "
+        f"  WHERE a.question_id = q.id AND a.approved"
+        f"), '') FROM skillsharespace_app_question q"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillsharespace_app', '0006_alter_flag_content_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
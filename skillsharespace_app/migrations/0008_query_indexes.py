@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('skillsharespace_app', '0007_question_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(condition=models.Q(('approved', True)), fields=['question', 'created_at'], name='answer_public_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(condition=models.Q(('approved', False)), fields=['created_at', 'id'], name='answer_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flag',
+            index=models.Index(condition=models.Q(('resolved', False)), fields=['created_at', 'id'], name='flag_open_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flag',
+            index=models.Index(fields=['content_type', 'object_id'], name='flag_target_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('approved', True)), fields=['created_at', 'id'], name='question_public_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(condition=models.Q(('approved', False)), fields=['created_at', 'id'], name='question_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:37
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Question = apps.get_model('skillsharespace_app', 'Question')
+    Answer = apps.get_model('skillsharespace_app', 'Answer')
+    Flag = apps.get_model('skillsharespace_app', 'Flag')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    def count(queryset):
+        return Coalesce(Subquery(queryset.order_by().annotate(n=Count('*')).values('n')[:1]), 0)
+
+    question_ct = ContentType.objects.filter(app_label='skillsharespace_app', model='question').first()
+    answer_ct = ContentType.objects.filter(app_label='skillsharespace_app', model='answer').first()
+    answers = Answer.objects.filter(question=OuterRef('pk')).values('question')
+    open_flags = Flag.objects.filter(resolved=False)
+    Question.objects.update(
+        answer_count=count(answers.filter(approved=True)),
+        pending_answer_count=count(answers.filter(approved=False)),
+        open_flag_count=(
+            count(open_flags.filter(content_type=question_ct, object_id=OuterRef('pk')).values('object_id'))
+            + count(open_flags.filter(
+                content_type=answer_ct,
+                object_id__in=Answer.objects.filter(question=OuterRef(OuterRef('pk'))).values('pk'),
+            ).values('content_type'))
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillsharespace_app', '0008_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='answer_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='open_flag_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='pending_answer_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
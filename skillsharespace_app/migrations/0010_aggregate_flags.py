@@ -0,0 +1,90 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:41
+
+import re
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+REPORTER_RE = re.compile(r'^Flagged by (?P<username>.+)$')
+
+
+def merge_duplicate_flags(apps, schema_editor):
+    """
+    Collapse the one-row-per-click flags into one flag per object. Reporters
+    are recovered from the old "Flagged by <username>" reasons where possible.
+    """
+    Flag = apps.get_model('skillsharespace_app', 'Flag')
+    FlagReport = apps.get_model('skillsharespace_app', 'FlagReport')
+    Question = apps.get_model('skillsharespace_app', 'Question')
+    Answer = apps.get_model('skillsharespace_app', 'Answer')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    groups = {}
+    for flag in Flag.objects.order_by('created_at', 'id').iterator():
+        groups.setdefault((flag.content_type_id, flag.object_id), []).append(flag)
+
+    for flags in groups.values():
+        keep, duplicates = flags[0], flags[1:]
+        reporters = {}
+        for flag in flags:
+            match = REPORTER_RE.match(flag.reason)
+            if match:
+                reporters.setdefault(match['username'], flag)
+        users = {user.username: user for user in User.objects.filter(username__in=reporters)}
+        FlagReport.objects.bulk_create([
+            FlagReport(flag=keep, user=users[username], reason=flag.reason, created_at=flag.created_at)
+            for username, flag in reporters.items() if username in users
+        ])
+        keep.report_count = max(len(users), 1)
+        keep.resolved = all(flag.resolved for flag in flags)
+        keep.save(update_fields=['report_count', 'resolved'])
+        if duplicates:
+            Flag.objects.filter(pk__in=[flag.pk for flag in duplicates]).delete()
+
+    # open_flag_count now counts flagged objects rather than clicks.
+    def count(queryset):
+        return Coalesce(Subquery(queryset.order_by().annotate(n=Count('*')).values('n')[:1]), 0)
+
+    question_ct = ContentType.objects.filter(app_label='skillsharespace_app', model='question').first()
+    answer_ct = ContentType.objects.filter(app_label='skillsharespace_app', model='answer').first()
+    open_flags = Flag.objects.filter(resolved=False)
+    Question.objects.update(open_flag_count=(
+        count(open_flags.filter(content_type=question_ct, object_id=OuterRef('pk')).values('object_id'))
+        + count(open_flags.filter(
+            content_type=answer_ct,
+            object_id__in=Answer.objects.filter(question=OuterRef(OuterRef('pk'))).values('pk'),
+        ).values('content_type'))
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('skillsharespace_app', '0009_question_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlagReport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reason', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('flag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reports', to='skillsharespace_app.flag')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='flag',
+            name='report_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.RunPython(merge_duplicate_flags, migrations.RunPython.noop),
+    ]
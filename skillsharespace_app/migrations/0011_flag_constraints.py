@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillsharespace_app', '0010_aggregate_flags'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='flag',
+            name='flag_open_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='flag',
+            name='flag_target_idx',
+        ),
+        migrations.AddIndex(
+            model_name='flag',
+            index=models.Index(condition=models.Q(('resolved', False)), fields=['report_count', 'created_at', 'id'], name='flag_open_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='flag',
+            constraint=models.UniqueConstraint(fields=('content_type', 'object_id'), name='unique_flag_target'),
+        ),
+        migrations.AddConstraint(
+            model_name='flagreport',
+            constraint=models.UniqueConstraint(fields=('flag', 'user'), name='unique_flag_reporter'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    Question = apps.get_model('skillsharespace_app', 'Question')
+    Answer = apps.get_model('skillsharespace_app', 'Answer')
+    Flag = apps.get_model('skillsharespace_app', 'Flag')
+    ModerationCounter = apps.get_model('skillsharespace_app', 'ModerationCounter')
+    ModerationCounter.objects.bulk_create([
+        ModerationCounter(name='pending_questions', value=Question.objects.filter(approved=False).count()),
+        ModerationCounter(name='pending_answers', value=Answer.objects.filter(approved=False).count()),
+        ModerationCounter(name='open_flags', value=Flag.objects.filter(resolved=False).count()),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('skillsharespace_app', '0012_answer_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModerationCounter',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('value', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='flag',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['updated_at'], name='answer_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='flag',
+            index=models.Index(condition=models.Q(('resolved', True)), fields=['resolved_at'], name='flag_resolved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['updated_at'], name='question_updated_idx'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillsharespace_app', '0014_moderation_claims'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='body_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='answer',
+            name='body_html_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='body_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='body_html_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
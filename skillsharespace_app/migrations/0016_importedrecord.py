@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('skillsharespace_app', '0015_rendered_bodies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportedRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run', models.CharField(max_length=32)),
+                ('kind', models.CharField(max_length=10)),
+                ('source_id', models.BigIntegerField()),
+                ('target_id', models.BigIntegerField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('run', 'kind', 'source_id'), name='unique_imported_record')],
+            },
+        ),
+    ]
@@ -1,9 +1,120 @@
+from functools import reduce
+from operator import or_
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from . import markup
+
+
+class ClaimableQuerySet(models.QuerySet):
+    def unclaimed(self, now=None):
+        """Items no moderator holds a live lease on."""
+        now = now or timezone.now()
+        return self.filter(models.Q(claimed_until__isnull=True) | models.Q(claimed_until__lte=now))
+
+    def claimable_by(self, user, now=None):
+        """Items not leased to another moderator right now (see ``moderation.claim``)."""
+        now = now or timezone.now()
+        return self.filter(
+            models.Q(claimed_until__isnull=True) | models.Q(claimed_until__lte=now) | models.Q(claimed_by=user)
+        )
+
+
+class VisibilityQuerySet(ClaimableQuerySet):
+    """
+    What a user may see: approved rows and their own; staff see all.
+
+    ``approved OR author = me`` cannot be served by any one index, so an
+    ordered, limited page of it means scanning and sorting every approved
+    row. The rule is therefore kept as disjoint branches that each have an
+    index: approved rows (the partial ``*_public_idx`` indexes) and the
+    user's own pending rows (the author index).
+    """
+
+    @staticmethod
+    def visibility_filters(user):
+        """The rule as disjoint ``Q`` branches, for ``paginate_keyset(branches=...)``."""
+        if user.is_staff:
+            return [models.Q()]
+        if user.is_authenticated:
+            return [models.Q(approved=True), models.Q(approved=False, author=user)]
+        return [models.Q(approved=True)]
+
+    def visible_to(self, user):
+        """
+        The rule as one filter, for querysets that are filtered further,
+        searched, counted or used as subqueries. Pages should be fetched
+        with ``paginate_keyset(branches=...)`` or ``visible_union``.
+        """
+        return self.filter(reduce(or_, self.visibility_filters(user)))
+
+    def visible_union(self, user):
+        """
+        The rule as a ``UNION ALL`` of its branches, one query whose parts
+        each use their own index. Only ordering and slicing can follow.
+        """
+        first, *rest = [self.filter(branch) for branch in self.visibility_filters(user)]
+        return first.union(*rest, all=True) if rest else first
+
+
+class PreservedFieldsMixin:
+    """
+    Leave ``preserved_fields`` out of a plain ``save()`` of an existing row.
+    They are written with ``F()`` or conditional UPDATEs (counters,
+    moderation leases), so an instance loaded earlier, e.g. by an edit form,
+    must never write its stale copy back over them. Deferred fields are left
+    out too. Pass ``update_fields`` to write them deliberately.
+    """
+    preserved_fields = ()
 
-class Question(models.Model):
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and kwargs.get('update_fields') is None:
+            skip = set(self.preserved_fields) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skip and field.attname not in skip
+            ]
+        super().save(*args, **kwargs)
+
+
+# Set by conditional UPDATEs in moderation.claim and release.
+LEASE_FIELDS = ('claimed_by', 'claimed_until')
+
+
+class RenderedBody(models.Model):
+    """
+    A Markdown ``body`` whose sanitized HTML is rendered on save and stored
+    with the version of the renderer that produced it (see ``markup.py``).
+    """
+    body_html = models.TextField(blank=True, editable=False)
+    body_html_version = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def rendered_body(self):
+        """The body as HTML, rendered now only if the stored copy is out of date."""
+        if self.body_html_version != markup.RENDERER_VERSION:
+            return mark_safe(markup.render(self.body))
+        return mark_safe(self.body_html)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            if 'body' not in self.get_deferred_fields():
+                markup.render_body(self)
+        elif 'body' in update_fields:
+            markup.render_body(self)
+            kwargs['update_fields'] = {*update_fields, 'body_html', 'body_html_version'}
+        super().save(*args, **kwargs)
+
+
+class Question(PreservedFieldsMixin, RenderedBody):
     title = models.CharField(max_length=255)
     body = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
@@ -11,18 +122,75 @@ class Question(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     approved = models.BooleanField(default=False)
     views = models.PositiveIntegerField(default=0)
+    answer_count = models.IntegerField(default=0)
+    pending_answer_count = models.IntegerField(default=0)
+    open_flag_count = models.IntegerField(default=0)
+    # Moderation lease: who is reviewing this, and until when.
+    claimed_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    objects = VisibilityQuerySet.as_manager()
+
+    # Maintained with F() updates (see counters.py and viewcounts.py).
+    counter_fields = ('views', 'answer_count', 'pending_answer_count', 'open_flag_count')
+    preserved_fields = counter_fields + LEASE_FIELDS
+
+    class Meta:
+        # Boolean filters compile to a bare ``WHERE "approved"``, which only a
+        # partial index can serve; (created_at, id) matches the list keyset.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], condition=models.Q(approved=True), name='question_public_idx'),
+            models.Index(fields=['created_at', 'id'], condition=models.Q(approved=False), name='question_pending_idx'),
+            # What changed since a moderator dashboard last polled.
+            models.Index(fields=['updated_at'], name='question_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
     def get_absolute_url(self):
         return reverse('question-detail', kwargs={'pk': self.pk})
 
-class Answer(models.Model):
+    def is_visible_to(self, user):
+        """
+        Whether ``user`` may open this question: the list rule, plus anyone
+        who has answered it.
+        """
+        if self.approved or user.is_staff:
+            return True
+        if not user.is_authenticated:
+            return False
+        return self.author_id == user.pk or self.answers.filter(author=user).exists()
+
+    async def ais_visible_to(self, user):
+        if self.approved or user.is_staff:
+            return True
+        if not user.is_authenticated:
+            return False
+        return self.author_id == user.pk or await self.answers.filter(author=user).aexists()
+
+
+class Answer(PreservedFieldsMixin, RenderedBody):
     question = models.ForeignKey(Question, related_name='answers', on_delete=models.CASCADE)
     body = models.TextField()
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
     approved = models.BooleanField(default=False)
+    claimed_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    objects = VisibilityQuerySet.as_manager()
+
+    preserved_fields = LEASE_FIELDS
+
+    class Meta:
+        indexes = [
+            # Approved answers on a question page, already in display order
+            models.Index(fields=['question', 'created_at'], condition=models.Q(approved=True), name='answer_public_idx'),
+            # Moderator answer queue
+            models.Index(fields=['created_at', 'id'], condition=models.Q(approved=False), name='answer_pending_idx'),
+            models.Index(fields=['updated_at'], name='answer_updated_idx'),
+        ]
 
     def __str__(self):
         return f'Answer by {self.author}'
@@ -31,8 +199,27 @@ class Answer(models.Model):
 
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+
 
-class Flag(models.Model):
+class FlagQuerySet(ClaimableQuerySet):
+    def with_targets(self):
+        """
+        Resolve ``content_object`` for all flags at once: one query per
+        content type, with answers fetched together with their question and
+        author, instead of one query per flag in the template.
+        """
+        return self.select_related('content_type').prefetch_related(
+            GenericPrefetch('content_object', [
+                Question.objects.only('title'),
+                Answer.objects.select_related('question', 'author').only(
+                    'question__title', 'author__username',
+                ),
+            ])
+        )
+
+
+class Flag(PreservedFieldsMixin, models.Model):
     CONTENT_CHOICES = [
         ('question', 'Question'),
         ('answer', 'Answer'),
@@ -44,7 +231,77 @@ class Flag(models.Model):
     reason = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
     resolved = models.BooleanField(default=False)
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    # One flag per flagged object; each distinct reporter adds a FlagReport.
+    report_count = models.PositiveIntegerField(default=1)
+    claimed_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    claimed_until = models.DateTimeField(null=True, blank=True)
+
+    objects = FlagQuerySet.as_manager()
+
+    # report_count is raised with F() updates as reports come in.
+    preserved_fields = ('report_count',) + LEASE_FIELDS
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id'], name='unique_flag_target'),
+        ]
+        indexes = [
+            # The moderator queue: open flags only, most reported first.
+            models.Index(
+                fields=['report_count', 'created_at', 'id'], condition=models.Q(resolved=False), name='flag_open_idx',
+            ),
+            models.Index(fields=['resolved_at'], condition=models.Q(resolved=True), name='flag_resolved_idx'),
+        ]
 
     def __str__(self):
         return f"Flag on {self.content_object}"
 
+
+class FlagReport(models.Model):
+    flag = models.ForeignKey(Flag, related_name='reports', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    reason = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['flag', 'user'], name='unique_flag_reporter'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} reported {self.flag}'
+
+
+class ModerationCounter(models.Model):
+    """
+    The size of one moderation queue (see ``counters.MODERATION_QUEUES``),
+    kept in step with every write that moves content in or out of it so the
+    dashboard never counts the queues.
+    """
+    name = models.CharField(max_length=32, primary_key=True)
+    value = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
+
+
+class ImportedRecord(models.Model):
+    """
+    The row an ``import_qa`` run created for one archive record. Imported
+    rows get new ids, so answers find their question through this map, and
+    a resumed run recognises the records it already inserted. A run's
+    records are deleted when it finishes.
+    """
+    run = models.CharField(max_length=32)
+    kind = models.CharField(max_length=10)
+    source_id = models.BigIntegerField()
+    target_id = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['run', 'kind', 'source_id'], name='unique_imported_record'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.source_id} -> {self.target_id}'
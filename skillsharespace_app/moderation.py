@@ -0,0 +1,356 @@
+from datetime import timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef, Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from . import counters
+from .models import Question, Answer, Flag, FlagReport
+
+# Sent with the ``question_ids`` a moderation write touched when it
+# bypasses ``save()``; once per write, however many questions it touched.
+content_changed = Signal()
+
+
+def set_approved(obj, approved):
+    """
+    Move a question or answer into or out of the approved state with a
+    single conditional UPDATE, keeping the question counters in step.
+    Returns ``False`` if the object was already in that state.
+    """
+    model = type(obj)
+    with transaction.atomic():
+        changed = model.objects.filter(pk=obj.pk, approved=not approved).update(
+            approved=approved, updated_at=timezone.now(),
+        )
+        if changed:
+            counters.adjust_moderation(**{counters.pending_queue(model): -1 if approved else 1})
+        if changed and model is Answer:
+            counters.adjust(obj.question_id, **{
+                counters.answer_field(approved): 1,
+                counters.answer_field(not approved): -1,
+            })
+    obj.approved = approved
+    if changed:
+        question_id = obj.pk if model is Question else obj.question_id
+        content_changed.send(sender=model, question_ids=[question_id])
+    return bool(changed)
+
+
+def report_content(obj, user, reason=''):
+    """
+    Record ``user``'s report against a question or answer. All reports on
+    an object share one Flag; a repeat report by the same user changes
+    nothing, and a new reporter reopens a resolved flag. Returns the flag.
+    """
+    question_id = obj.pk if isinstance(obj, Question) else obj.question_id
+    with transaction.atomic():
+        flag, created = Flag.objects.get_or_create(
+            content_type=ContentType.objects.get_for_model(obj),
+            object_id=obj.pk,
+            defaults={'reason': reason},
+        )
+        _, new_report = FlagReport.objects.get_or_create(flag=flag, user=user, defaults={'reason': reason})
+        if created:
+            counters.adjust(question_id, open_flag_count=1)
+            counters.adjust_moderation(open_flags=1)
+        elif new_report:
+            Flag.objects.filter(pk=flag.pk).update(report_count=F('report_count') + 1)
+            if Flag.objects.filter(pk=flag.pk, resolved=True).update(resolved=False, resolved_at=None):
+                counters.adjust(question_id, open_flag_count=1)
+                counters.adjust_moderation(open_flags=1)
+    return flag
+
+
+def resolve_flag(flag):
+    """Mark a flag resolved. Returns ``False`` if it already was."""
+    with transaction.atomic():
+        resolved_at = timezone.now()
+        changed = Flag.objects.filter(pk=flag.pk, resolved=False).update(resolved=True, resolved_at=resolved_at)
+        if changed:
+            question_id = counters.flag_question_id(flag.content_type, flag.object_id)
+            counters.adjust(question_id, open_flag_count=-1)
+            counters.adjust_moderation(open_flags=-1)
+            flag.resolved_at = resolved_at
+    flag.resolved = True
+    return bool(changed)
+
+
+
+def clean_up_deleted_questions(questions):
+    """
+    Before ``questions`` are deleted: delete their flags and take them off
+    the moderation counters, in a fixed number of queries however many
+    there are. Their answers are cleaned up by ``clean_up_deleted_answers``.
+    """
+    flags = Flag.objects.filter(
+        content_type=ContentType.objects.get_for_model(Question), object_id__in=questions.values('pk'),
+    )
+    open_flags = flags.filter(resolved=False).count()
+    flags.delete()
+    counters.adjust_moderation(
+        pending_questions=-questions.filter(approved=False).count(), open_flags=-open_flags,
+    )
+
+
+def clean_up_deleted_answers(answers, with_questions=False):
+    """
+    Before ``answers`` are deleted: delete their flags and take them off
+    the moderation and per-question counters, in a fixed number of queries.
+    With ``with_questions`` their questions are being deleted too, so the
+    per-question counters are left alone.
+    """
+    flags = Flag.objects.filter(
+        content_type=ContentType.objects.get_for_model(Answer), object_id__in=answers.values('pk'),
+    )
+    if with_questions:
+        open_flags = flags.filter(resolved=False).count()
+        flags.delete()
+        counters.adjust_moderation(
+            pending_answers=-answers.filter(approved=False).count(), open_flags=-open_flags,
+        )
+        return
+
+    rows = list(answers.values_list('pk', 'question_id', 'approved'))
+    flagged = list(flags.filter(resolved=False).values_list('object_id', flat=True))
+    flags.delete()
+    question_of = {pk: question_id for pk, question_id, _ in rows}
+    answer_deltas, pending_deltas, flag_deltas = {}, {}, {}
+    for _, question_id, approved in rows:
+        deltas = answer_deltas if approved else pending_deltas
+        deltas[question_id] = deltas.get(question_id, 0) - 1
+    for answer_id in flagged:
+        question_id = question_of[answer_id]
+        flag_deltas[question_id] = flag_deltas.get(question_id, 0) - 1
+    counters.add_deltas(Question, 'answer_count', answer_deltas)
+    counters.add_deltas(Question, 'pending_answer_count', pending_deltas)
+    counters.add_deltas(Question, 'open_flag_count', flag_deltas)
+    # A removed answer must move its question's Last-Modified.
+    Question.objects.filter(pk__in=set(question_of.values())).update(updated_at=timezone.now())
+    counters.adjust_moderation(pending_answers=sum(pending_deltas.values()), open_flags=-len(flagged))
+
+
+def delete_orphaned_flags():
+    """
+    Delete flags whose question or answer no longer exists (removed without
+    the delete signals, e.g. by raw SQL). Returns how many were deleted.
+    """
+    question_ct = ContentType.objects.get_for_model(Question)
+    answer_ct = ContentType.objects.get_for_model(Answer)
+    orphans = Flag.objects.filter(
+        (Q(content_type=question_ct) & ~Exists(Question.objects.filter(pk=OuterRef('object_id'))))
+        | (Q(content_type=answer_ct) & ~Exists(Answer.objects.filter(pk=OuterRef('object_id'))))
+    )
+    open_flags = orphans.filter(resolved=False).count()
+    _, deleted = orphans.delete()
+    counters.adjust_moderation(open_flags=-open_flags)
+    return deleted.get(Flag._meta.label, 0)
+
+
+BULK_BATCH_SIZE = 500
+
+CHANGED = 'changed'
+UNCHANGED = 'unchanged'
+MISSING = 'missing'
+
+
+def _batches(ids):
+    ids = list(dict.fromkeys(ids))
+    for start in range(0, len(ids), BULK_BATCH_SIZE):
+        yield ids[start:start + BULK_BATCH_SIZE]
+
+
+def _answer_question_ids(answer_ids):
+    return dict(Answer.objects.filter(pk__in=answer_ids).values_list('pk', 'question_id'))
+
+
+def bulk_set_approved(model, ids, approved):
+    """
+    Approve or unapprove many questions or answers in one transaction, with
+    one UPDATE per batch of ids. Returns ``{id: 'changed' | 'unchanged' |
+    'missing'}``.
+    """
+    results = {}
+    touched_questions = set()
+    with transaction.atomic():
+        for batch in _batches(ids):
+            current = dict(
+                model.objects.select_for_update().filter(pk__in=batch).values_list('pk', 'approved')
+            )
+            to_change = [pk for pk, state in current.items() if state != approved]
+            results.update({pk: MISSING for pk in batch if pk not in current})
+            results.update({pk: UNCHANGED for pk in current})
+            if not to_change:
+                continue
+
+            model.objects.filter(pk__in=to_change).update(approved=approved, updated_at=timezone.now())
+            results.update({pk: CHANGED for pk in to_change})
+            counters.adjust_moderation(**{
+                counters.pending_queue(model): -len(to_change) if approved else len(to_change),
+            })
+
+            if model is Question:
+                touched_questions.update(to_change)
+                continue
+            per_question = {}
+            for question_id in _answer_question_ids(to_change).values():
+                per_question[question_id] = per_question.get(question_id, 0) + 1
+            counters.add_deltas(Question, counters.answer_field(approved), per_question)
+            counters.add_deltas(
+                Question, counters.answer_field(not approved),
+                {question_id: -n for question_id, n in per_question.items()},
+            )
+            touched_questions.update(per_question)
+
+    if touched_questions:
+        content_changed.send(sender=model, question_ids=sorted(touched_questions))
+    return results
+
+
+def bulk_resolve_flags(ids):
+    """Resolve many flags in one transaction. Returns per-id results like ``bulk_set_approved``."""
+    results = {}
+    question_ct = ContentType.objects.get_for_model(Question)
+    with transaction.atomic():
+        for batch in _batches(ids):
+            rows = list(
+                Flag.objects.select_for_update().filter(pk__in=batch)
+                .values_list('pk', 'resolved', 'content_type_id', 'object_id')
+            )
+            found = {pk for pk, *_ in rows}
+            results.update({pk: MISSING for pk in batch if pk not in found})
+            open_flags = [row for row in rows if not row[1]]
+            results.update({pk: UNCHANGED for pk in found})
+            if not open_flags:
+                continue
+
+            Flag.objects.filter(pk__in=[row[0] for row in open_flags]).update(resolved=True, resolved_at=timezone.now())
+            results.update({row[0]: CHANGED for row in open_flags})
+            counters.adjust_moderation(open_flags=-len(open_flags))
+
+            answer_questions = _answer_question_ids(
+                [object_id for _, _, ct_id, object_id in open_flags if ct_id != question_ct.pk]
+            )
+            per_question = {}
+            for _, _, ct_id, object_id in open_flags:
+                question_id = object_id if ct_id == question_ct.pk else answer_questions.get(object_id)
+                if question_id is not None:
+                    per_question[question_id] = per_question.get(question_id, 0) - 1
+            counters.add_deltas(Question, 'open_flag_count', per_question)
+    return results
+
+
+# A write can commit after a later one and still carry the earlier
+# timestamp, so polls look back this far past the previous cursor.
+POLL_OVERLAP = timedelta(seconds=5)
+
+
+def changes_since(since, limit=50):
+    """
+    What entered or left the moderation queues after ``since``, for a
+    dashboard that is already showing everything up to then::
+
+        {'questions': {'pending': [...], 'removed': [ids]},
+         'answers': {'pending': [...], 'removed': [ids]},
+         'flags': {'open': [...], 'resolved': [ids]},
+         'truncated': bool, 'cursor': datetime}
+
+    ``pending`` and ``open`` hold model instances (new, edited or sent back
+    to the queue); ``removed`` also lists approved items that were merely
+    edited, which a dashboard can ignore; deletions only show in the
+    counters. Each lookup reads at most
+    ``limit`` rows off an index; ``truncated`` says there was more and the
+    dashboard should reload instead. Pass ``cursor`` as the next ``since``.
+    """
+    cursor = timezone.now() - POLL_OVERLAP
+    questions = list(
+        Question.objects.filter(updated_at__gt=since).select_related('author')
+        .only('title', 'created_at', 'updated_at', 'approved', 'author__username')
+        .order_by('updated_at')[:limit + 1]
+    )
+    answers = list(
+        Answer.objects.filter(updated_at__gt=since).select_related('author', 'question')
+        .only('body', 'created_at', 'updated_at', 'approved', 'author__username', 'question__title')
+        .order_by('updated_at')[:limit + 1]
+    )
+    opened = list(
+        Flag.objects.filter(resolved=False, created_at__gt=since).with_targets()
+        .order_by('created_at')[:limit + 1]
+    )
+    resolved = list(
+        Flag.objects.filter(resolved=True, resolved_at__gt=since).order_by('resolved_at')
+        .values_list('pk', flat=True)[:limit + 1]
+    )
+    return {
+        'questions': {
+            'pending': [question for question in questions[:limit] if not question.approved],
+            'removed': [question.pk for question in questions[:limit] if question.approved],
+        },
+        'answers': {
+            'pending': [answer for answer in answers[:limit] if not answer.approved],
+            'removed': [answer.pk for answer in answers[:limit] if answer.approved],
+        },
+        'flags': {'open': opened[:limit], 'resolved': resolved[:limit]},
+        'truncated': any(len(rows) > limit for rows in (questions, answers, opened, resolved)),
+        'cursor': cursor,
+    }
+
+
+# Claimable work queues: model, what is still waiting, and the order items are handed out in.
+CLAIM_QUEUES = {
+    'questions': (Question, Q(approved=False), ('created_at', 'id')),
+    'answers': (Answer, Q(approved=False), ('created_at', 'id')),
+    'flags': (Flag, Q(resolved=False), ('-report_count', 'created_at', 'id')),
+}
+
+
+def claim(kind, user, limit, seconds):
+    """
+    Lease the next ``limit`` waiting items of queue ``kind`` that nobody
+    holds to ``user`` for ``seconds``, and return their ids. The leases the
+    user already holds are renewed for as long, but not handed out again.
+
+    Where the database can ``SELECT ... FOR UPDATE SKIP LOCKED``, concurrent
+    claims pass over each other's rows without waiting. SQLite has no row
+    locks but runs one writer at a time, so there a single conditional
+    UPDATE over the head of the queue is atomic on its own.
+    """
+    model, waiting, ordering = CLAIM_QUEUES[kind]
+    now = timezone.now()
+    until = now + timedelta(seconds=seconds)
+    queue = model.objects.filter(waiting).unclaimed(now).order_by(*ordering)
+    held = model.objects.filter(waiting, claimed_by=user, claimed_until__gt=now)
+    with transaction.atomic():
+        if connection.features.has_select_for_update_skip_locked:
+            ids = list(queue.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            held.update(claimed_until=until)
+            model.objects.filter(pk__in=ids).update(claimed_by=user, claimed_until=until)
+            return ids
+        # The subquery re-reads the queue inside the UPDATE, so nothing
+        # claimed in between can be taken twice.
+        model.objects.filter(pk__in=queue.values('pk')[:limit]).update(claimed_by=user, claimed_until=until)
+        # Only the new batch runs to exactly ``until`` yet, so read it back
+        # before renewing the older leases to the same time.
+        ids = list(
+            model.objects.filter(waiting, claimed_by=user, claimed_until=until)
+            .order_by(*ordering).values_list('pk', flat=True)
+        )
+        held.update(claimed_until=until)
+        return ids
+
+
+def release(kind, user, ids=None):
+    """Hand ``user``'s leases in queue ``kind`` (or just ``ids``) back. Returns how many."""
+    model = CLAIM_QUEUES[kind][0]
+    leases = model.objects.filter(claimed_by=user)
+    if ids is not None:
+        leases = leases.filter(pk__in=ids)
+    return leases.update(claimed_by=None, claimed_until=None)
+
+
+def claimed(kind, user):
+    """``user``'s live leases that are still waiting in queue ``kind``, in queue order."""
+    model, waiting, ordering = CLAIM_QUEUES[kind]
+    return model.objects.filter(waiting, claimed_by=user, claimed_until__gt=timezone.now()).order_by(*ordering)
@@ -0,0 +1,270 @@
+import heapq
+from functools import cmp_to_key
+from itertools import islice
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.http import Http404
+
+CURSOR_SALT = 'skillsharespace.pagination.cursor'
+
+
+class CursorPage:
+    """A page of keyset-paginated results, shaped like Django's ``Page``."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.next_url = None
+        self.previous_url = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _encode_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def encode_cursor(obj, ordering, direction):
+    values = [_encode_value(getattr(obj, field.lstrip('-'))) for field in ordering]
+    return signing.dumps([direction, values], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token, queryset, ordering):
+    """Return ``(direction, values)`` for a cursor token, or ``None`` if it is not usable."""
+    try:
+        direction, values = signing.loads(token, salt=CURSOR_SALT)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+    if direction not in ('next', 'previous') or len(values) != len(ordering):
+        return None
+
+    decoded = []
+    for field, value in zip(ordering, values):
+        try:
+            model_field = queryset.model._meta.get_field(field.lstrip('-'))
+        except FieldDoesNotExist:
+            decoded.append(value)
+            continue
+        try:
+            decoded.append(model_field.to_python(value))
+        except Exception:
+            return None
+    return direction, decoded
+
+
+def keyset_filter(ordering, values):
+    """
+    Rows strictly after ``values`` in ``ordering``, i.e. the row-value
+    comparison ``(a, b, c) > (x, y, z)`` spelled out so every database can
+    seek on an index: ``a >= x AND (a > x OR (a = x AND b > y) OR ...)``.
+    The redundant ``a >= x`` is the range the index seek starts from; SQLite
+    cannot derive one from the OR alone.
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        branch = Q(**{f'{name}__{lookup}': values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            branch &= Q(**{prev_field.lstrip('-'): prev_value})
+        condition |= branch
+    if len(ordering) > 1:
+        first = ordering[0]
+        condition &= Q(**{f'{first.lstrip("-")}__{"lte" if first.startswith("-") else "gte"}': values[0]})
+    return condition
+
+
+def _keyset_query(queryset, ordering, limit, cursor, branches=None):
+    """``(direction, values, order, querysets)``: one LIMITed query per branch."""
+    decoded = decode_cursor(cursor, queryset, ordering) if cursor else None
+    if decoded is None:
+        direction, values = 'next', None
+    else:
+        direction, values = decoded
+
+    order = ordering if direction == 'next' else [_flip(field) for field in ordering]
+    page_qs = queryset
+    if values is not None:
+        page_qs = page_qs.filter(keyset_filter(order, values))
+    page_qs = page_qs.order_by(*order)
+    return direction, values, order, [page_qs.filter(branch)[:limit + 1] for branch in branches or [Q()]]
+
+
+def _row_key(order):
+    fields = [(field.lstrip('-'), field.startswith('-')) for field in order]
+
+    def compare(a, b):
+        for name, descending in fields:
+            x, y = getattr(a, name), getattr(b, name)
+            if x != y:
+                return (1 if x > y else -1) * (-1 if descending else 1)
+        return 0
+
+    return cmp_to_key(compare)
+
+
+def _merge(results, order, limit):
+    """The first ``limit + 1`` rows of branch results that are each already in ``order``."""
+    if len(results) == 1:
+        return results[0]
+    return list(islice(heapq.merge(*results, key=_row_key(order)), limit + 1))
+
+
+def _keyset_page(rows, ordering, limit, direction, values):
+    """The page for the fetched ``rows``, or ``None`` if a previous page ran off the start."""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if direction == 'previous':
+        if not has_more:
+            return None
+        rows.reverse()
+        has_next, has_previous = True, True
+    else:
+        has_next, has_previous = has_more, values is not None
+
+    return CursorPage(
+        rows,
+        next_cursor=encode_cursor(rows[-1], ordering, 'next') if has_next and rows else None,
+        previous_cursor=encode_cursor(rows[0], ordering, 'previous') if has_previous and rows else None,
+    )
+
+
+def paginate_keyset(queryset, ordering, limit, cursor=None, branches=None):
+    """
+    Fetch one page of ``queryset`` ordered by ``ordering`` (which must end in
+    a unique column) starting after ``cursor``. Each page is a single
+    ``WHERE <keyset> ORDER BY ... LIMIT n + 1`` query, so deep pages cost the
+    same as the first one and concurrent inserts never shift page boundaries.
+
+    ``branches`` are disjoint ``Q`` filters that together cover ``queryset``
+    (e.g. ``visibility_filters``). Each gets its own LIMITed query, which an
+    index can serve where the ORed whole could not, and their rows are
+    merged in Python.
+    """
+    direction, values, order, page_qss = _keyset_query(queryset, ordering, limit, cursor, branches)
+    rows = _merge([list(page_qs) for page_qs in page_qss], order, limit)
+    page = _keyset_page(rows, ordering, limit, direction, values)
+    if page is None:
+        # Walked back to the start; serve a full first page instead.
+        return paginate_keyset(queryset, ordering, limit, branches=branches)
+    return page
+
+
+async def apaginate_keyset(queryset, ordering, limit, cursor=None, branches=None):
+    """``paginate_keyset`` through the async ORM."""
+    direction, values, order, page_qss = _keyset_query(queryset, ordering, limit, cursor, branches)
+    rows = _merge([[obj async for obj in page_qs] for page_qs in page_qss], order, limit)
+    page = _keyset_page(rows, ordering, limit, direction, values)
+    if page is None:
+        return await apaginate_keyset(queryset, ordering, limit, branches=branches)
+    return page
+
+
+def get_limit(request):
+    """The ``?limit=`` page size, capped by ``PAGINATION_MAX_LIMIT``."""
+    default = getattr(settings, 'PAGINATION_DEFAULT_LIMIT', 20)
+    maximum = getattr(settings, 'PAGINATION_MAX_LIMIT', 100)
+    try:
+        limit = int(request.GET.get('limit', default))
+    except ValueError:
+        limit = default
+    return max(1, min(limit, maximum))
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin that pages with opaque ``?cursor=`` tokens instead of
+    ``?page=`` offsets. A view can fall back to page numbers for a request
+    (e.g. relevance-ranked search) by returning ``None`` from
+    ``get_keyset_ordering``.
+    """
+    keyset_ordering = ('-created_at', '-id')
+    cursor_param = 'cursor'
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def get_keyset_branches(self):
+        """Disjoint filters to fetch the page in (see ``paginate_keyset``), or ``None``."""
+        return None
+
+    def get_paginate_by(self, queryset):
+        return get_limit(self.request)
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = self.get_keyset_ordering()
+        if ordering is None:
+            paginator, page, object_list, is_paginated = super().paginate_queryset(queryset, page_size)
+            self._link_numbered_page(page)
+            return paginator, page, object_list, is_paginated
+
+        page = paginate_keyset(
+            queryset, ordering, page_size, self.request.GET.get(self.cursor_param), self.get_keyset_branches(),
+        )
+        self._link_cursor_page(page)
+        return None, page, page.object_list, page.has_other_pages()
+
+    async def apaginate_queryset(self, queryset, page_size):
+        """``paginate_queryset`` for async views; the page is fully fetched."""
+        ordering = self.get_keyset_ordering()
+        if ordering is None:
+            paginator = self.get_paginator(
+                queryset, page_size, orphans=self.get_paginate_orphans(),
+                allow_empty_first_page=self.get_allow_empty(),
+            )
+            # Count up front so the paginator never queries synchronously.
+            paginator.count = await queryset.acount()
+            page_number = self.kwargs.get(self.page_kwarg) or self.request.GET.get(self.page_kwarg) or 1
+            try:
+                page = paginator.page(paginator.num_pages if page_number == 'last' else page_number)
+            except InvalidPage as e:
+                raise Http404(str(e))
+            page.object_list = [obj async for obj in page.object_list]
+            self._link_numbered_page(page)
+            return paginator, page, page.object_list, page.has_other_pages()
+
+        page = await apaginate_keyset(
+            queryset, ordering, page_size, self.request.GET.get(self.cursor_param), self.get_keyset_branches(),
+        )
+        self._link_cursor_page(page)
+        return None, page, page.object_list, page.has_other_pages()
+
+    def _link_numbered_page(self, page):
+        page.next_url = self._page_url(page=page.next_page_number()) if page.has_next() else None
+        page.previous_url = self._page_url(page=page.previous_page_number()) if page.has_previous() else None
+
+    def _link_cursor_page(self, page):
+        if page.has_next():
+            page.next_url = self._page_url(**{self.cursor_param: page.next_cursor})
+        if page.has_previous():
+            page.previous_url = self._page_url(**{self.cursor_param: page.previous_cursor})
+
+    def _page_url(self, **params):
+        query = self.request.GET.copy()
+        query.pop(self.cursor_param, None)
+        query.pop(self.page_kwarg, None)
+        query.update(params)
+        return f'?{query.urlencode()}'
@@ -0,0 +1,239 @@
+"""
+Request profiling for ``ProfilingMiddleware``: per-request SQL and template
+timings, their aggregation per URL name, and on-demand cProfile or
+pyinstrument captures.
+
+Everything here is per process and in memory, like the view count buffer;
+nothing is installed unless ``PROFILING_ENABLED`` is set.
+"""
+import cProfile
+import io
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+
+from django.template.backends.django import Template
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+# Upper bounds of the histogram buckets; the last bucket is unbounded.
+DURATION_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# The profile of the request being served, for the template timer.
+_current = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """
+    What one request spent, filled in by the middleware. It is also an
+    ``execute_wrapper``, timing every query and remembering its SQL so
+    repeated statements can be reported.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+        self.executions = Counter()
+        self._template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.statements[sql] += 1
+            try:
+                self.executions[sql, repr(params)] += 1
+            except Exception:
+                pass
+
+    @property
+    def query_count(self):
+        return sum(self.statements.values())
+
+    @property
+    def duplicates(self):
+        """Queries that repeated an earlier one exactly, parameters included."""
+        return sum(count - 1 for count in self.executions.values())
+
+    @property
+    def similar(self):
+        """Statements run more than once with different parameters (N+1 suspects)."""
+        return {sql: count for sql, count in self.statements.items() if count > 1}
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def server_timing(self):
+        return ', '.join([
+            f'total;dur={self.duration * 1000:.1f}',
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.query_count} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+        ])
+
+
+def activate(profile):
+    return _current.set(profile)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+_template_timer_installed = False
+
+
+def install_template_timer():
+    """
+    Time every top-level template render (``render_to_string``,
+    ``TemplateResponse``, cached fragments) into the current request's
+    profile. Nested renders are not counted twice.
+    """
+    global _template_timer_installed
+    if _template_timer_installed:
+        return
+    _template_timer_installed = True
+    render = Template.render
+
+    def timed_render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return render(self, context, request)
+        profile._template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context, request)
+        finally:
+            profile._template_depth -= 1
+            if not profile._template_depth:
+                profile.template_time += time.perf_counter() - start
+
+    Template.render = timed_render
+
+
+def _histogram(bounds):
+    return [0] * (len(bounds) + 1)
+
+
+class ProfileStats:
+    """Aggregated request profiles, keyed by URL name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def add(self, name, profile):
+        duration_ms = profile.duration * 1000
+        with self._lock:
+            stats = self._views.get(name)
+            if stats is None:
+                stats = self._views[name] = {
+                    'requests': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'sql_ms': 0.0,
+                    'template_ms': 0.0,
+                    'queries': 0,
+                    'max_queries': 0,
+                    'duplicate_queries': 0,
+                    'duration_histogram': _histogram(DURATION_BUCKETS_MS),
+                    'query_histogram': _histogram(QUERY_BUCKETS),
+                    'similar_queries': Counter(),
+                }
+            stats['requests'] += 1
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+            stats['sql_ms'] += profile.sql_time * 1000
+            stats['template_ms'] += profile.template_time * 1000
+            stats['queries'] += profile.query_count
+            stats['max_queries'] = max(stats['max_queries'], profile.query_count)
+            stats['duplicate_queries'] += profile.duplicates
+            stats['duration_histogram'][bisect_left(DURATION_BUCKETS_MS, duration_ms)] += 1
+            stats['query_histogram'][bisect_left(QUERY_BUCKETS, profile.query_count)] += 1
+            stats['similar_queries'].update(profile.similar)
+
+    def snapshot(self, top=5):
+        """A JSON-ready copy, with per-request averages and the most repeated statements."""
+        with self._lock:
+            views = {}
+            for name, stats in self._views.items():
+                requests = stats['requests']
+                views[name] = {
+                    'requests': requests,
+                    'avg_ms': round(stats['total_ms'] / requests, 3),
+                    'max_ms': round(stats['max_ms'], 3),
+                    'avg_sql_ms': round(stats['sql_ms'] / requests, 3),
+                    'avg_template_ms': round(stats['template_ms'] / requests, 3),
+                    'avg_queries': round(stats['queries'] / requests, 2),
+                    'max_queries': stats['max_queries'],
+                    'duplicate_queries': stats['duplicate_queries'],
+                    'duration_histogram': dict(zip(_labels(DURATION_BUCKETS_MS, 'ms'), stats['duration_histogram'])),
+                    'query_histogram': dict(zip(_labels(QUERY_BUCKETS), stats['query_histogram'])),
+                    'similar_queries': [
+                        {'sql': sql, 'count': count} for sql, count in stats['similar_queries'].most_common(top)
+                    ],
+                }
+        return {'views': views}
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+def _labels(bounds, unit=''):
+    return [f'<={bound}{unit}' for bound in bounds] + [f'>{bounds[-1]}{unit}']
+
+
+profile_stats = ProfileStats()
+
+
+class Capture:
+    """A cProfile or pyinstrument run around one request, reported as text or HTML."""
+
+    def __init__(self, kind, async_mode=False):
+        self.kind = kind
+        if kind == 'pyinstrument':
+            self.profiler = pyinstrument.Profiler(async_mode='enabled' if async_mode else 'disabled')
+        else:
+            self.profiler = cProfile.Profile()
+
+    @classmethod
+    def requested(cls, request):
+        """The capture ``?_profile=`` asks for (``1``/``cprofile`` or ``pyinstrument``), if any."""
+        kind = request.GET.get('_profile')
+        if kind in ('1', 'cprofile'):
+            return 'cprofile'
+        if kind == 'pyinstrument' and pyinstrument is not None:
+            return 'pyinstrument'
+        return None
+
+    def start(self):
+        if self.kind == 'pyinstrument':
+            self.profiler.start()
+        else:
+            self.profiler.enable()
+
+    def stop(self):
+        if self.kind == 'pyinstrument':
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def report(self, limit=60):
+        """``(content, content_type)`` of the captured profile."""
+        if self.kind == 'pyinstrument':
+            return self.profiler.output_html(), 'text/html'
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+        return out.getvalue(), 'text/plain'
@@ -0,0 +1,59 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+# Set by ReplicaReadMiddleware for the requests that may read from a replica.
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+def use_replica(enabled=True):
+    _replica_reads.set(enabled)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def _distinct_replicas():
+    # A replica pointing at the primary's own database (a TEST MIRROR) is
+    # best read through the primary's connection, inside its transaction.
+    primary = connections['default'].settings_dict['NAME']
+    return [alias for alias in replicas() if connections[alias].settings_dict['NAME'] != primary]
+
+
+def reading_replica():
+    """Whether this app's reads in the current request go to a replica."""
+    return _replica_reads.get() and bool(_distinct_replicas())
+
+
+class ReplicaRouter:
+    """
+    Send this app's reads to a replica while the current request allows it
+    (see ``ReplicaReadMiddleware``); everything else, including sessions,
+    users and all writes, stays on ``default``.
+    """
+    app_label = 'skillsharespace_app'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label or not _replica_reads.get():
+            return None
+        aliases = _distinct_replicas()
+        return random.choice(aliases) if aliases else None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        databases = {'default', *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary, never migrated on their own.
+        if db in replicas():
+            return False
+        return None
@@ -0,0 +1,143 @@
+import re
+from functools import cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Question, Answer
+
+# Snippets are built by the database from raw user text, so matches are
+# delimited with control characters and only turned into markup after the
+# surrounding text has been escaped (see the ``highlight`` template filter).
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+
+class BaseSearchBackend:
+    """
+    Interface for question search.
+
+    ``search`` receives a queryset that already has the caller's visibility
+    rules applied and must only ever narrow it. Results are ordered by
+    relevance and carry a ``search_snippet`` attribute.
+    """
+
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def index_question(self, question_id):
+        pass
+
+    def index_questions(self, question_ids):
+        for question_id in question_ids:
+            self.index_question(question_id)
+
+    def remove_question(self, question_id):
+        pass
+
+    def rebuild(self):
+        pass
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Substring matching for databases without a full-text index."""
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(title__icontains=query) | Q(body__icontains=query)
+        ).order_by('-created_at')
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """
+    FTS5 index holding one row per question: its title, body and the bodies
+    of its approved answers. The rowid is the question id.
+    """
+
+    table = 'skillsharespace_app_question_fts'
+    # bm25 column weights: title, body, answers
+    weights = (10.0, 1.0, 0.5)
+    snippet_tokens = 16
+    # Questions reindexed per statement by ``index_questions``.
+    batch_size = 500
+
+    def match_expression(self, query):
+        # Quote every term so user input can never be parsed as FTS5 syntax,
+        # and allow prefix matches on each of them.
+        terms = re.findall(r'\w+', query)
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+
+        outer_pk = f'{Question._meta.db_table}.{Question._meta.pk.column}'
+        weights = ', '.join(str(w) for w in self.weights)
+        rank = RawSQL(
+            f'SELECT bm25({self.table}, {weights}) FROM {self.table} '
+            f'WHERE {self.table} MATCH %s AND rowid = {outer_pk}',
+            (match,),
+        )
+        snippet = RawSQL(
+            f"SELECT snippet({self.table}, -1, char(2), char(3), '…', {self.snippet_tokens}) "
+            f'FROM {self.table} WHERE {self.table} MATCH %s AND rowid = {outer_pk}',
+            (match,),
+        )
+        return (
+            queryset
+            .filter(pk__in=RawSQL(f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s', (match,)))
+            .annotate(search_rank=rank, search_snippet=snippet)
+            .order_by('search_rank', '-created_at')
+        )
+
+    def _populate(self, cursor, where='', params=()):
+        cursor.execute(
+            f'INSERT INTO {self.table} (rowid, title, body, answers) '
+            f'SELECT q.id, q.title, q.body, COALESCE(('
+            f'  SELECT group_concat(a.body, char(10)) FROM {Answer._meta.db_table} a '
+            f'  WHERE a.question_id = q.id AND a.approved'
+            f"), '') FROM {Question._meta.db_table} q {where}",
+            params,
+        )
+
+    def index_question(self, question_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [question_id])
+            self._populate(cursor, 'WHERE q.id = %s', [question_id])
+
+    def index_questions(self, question_ids):
+        question_ids = list(question_ids)
+        with connection.cursor() as cursor:
+            for start in range(0, len(question_ids), self.batch_size):
+                batch = question_ids[start:start + self.batch_size]
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', batch)
+                self._populate(cursor, f'WHERE q.id IN ({placeholders})', batch)
+
+    def remove_question(self, question_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [question_id])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            self._populate(cursor)
+
+
+@cache
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_backend():
+    path = getattr(settings, 'SEARCH_BACKEND', None)
+    if path is None:
+        if connection.vendor == 'sqlite':
+            path = 'skillsharespace_app.search.SQLiteFTSBackend'
+        else:
+            path = 'skillsharespace_app.search.SimpleSearchBackend'
+    return _load_backend(path)
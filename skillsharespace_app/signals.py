@@ -1,22 +1,159 @@
 # skillsharespace_app/signals.py
 
-from django.db.models.signals import post_delete
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_in
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
-from django.contrib.contenttypes.models import ContentType
-from .models import Question, Answer, Flag
+from .models import Question, Answer
+from . import counters, fragments, moderation, usercache
+from .moderation import content_changed
+from .search import get_backend
+
+# Deletion cleanup. A delete sends pre_delete and post_delete once per row,
+# cascaded rows included, each with the ``origin`` .delete() was called on;
+# the cleanup runs once per origin for all the rows it takes with it, so a
+# question with thousands of answers costs a fixed number of queries.
+
+def _deletes(origin, model):
+    return isinstance(origin, model) or (isinstance(origin, QuerySet) and origin.model is model)
+
+
+def _origin_pks(origin):
+    return origin.values('pk') if isinstance(origin, QuerySet) else [origin.pk]
+
+
+def _deletion_batch(origin, instance):
+    """
+    The rows of ``instance``'s model that deleting ``origin`` removes, the
+    first time one of them comes through, or ``None`` once they have been
+    handled. Deletes that start elsewhere (a user, say) go row by row.
+    """
+    model = type(instance)
+    if _deletes(origin, model):
+        rows = model.objects.filter(pk__in=_origin_pks(origin))
+    elif model is Answer and _deletes(origin, Question):
+        rows = Answer.objects.filter(question__in=_origin_pks(origin))
+    else:
+        return model.objects.filter(pk=instance.pk)
+    done = origin.__dict__.setdefault(f'_cleaned_up_{model._meta.model_name}', set())
+    if instance.pk in done:
+        return None
+    if done:
+        # The same queryset deleted again: take its new rows one by one.
+        done.add(instance.pk)
+        return model.objects.filter(pk=instance.pk)
+    done.update(rows.values_list('pk', flat=True))
+    done.add(instance.pk)
+    return rows
+
+
+def _first_for_question(origin, question_id, purpose):
+    """Whether this deletion has not yet done ``purpose`` for ``question_id``."""
+    if origin is None:
+        return True
+    done = origin.__dict__.setdefault(f'_{purpose}_questions', set())
+    if question_id in done:
+        return False
+    done.add(question_id)
+    return True
+
+
+@receiver(pre_delete, sender=Question)
+def clean_up_deleted_questions(sender, instance, origin=None, **kwargs):
+    questions = _deletion_batch(origin, instance)
+    if questions is not None:
+        moderation.clean_up_deleted_questions(questions)
+
+@receiver(pre_delete, sender=Answer)
+def clean_up_deleted_answers(sender, instance, origin=None, **kwargs):
+    answers = _deletion_batch(origin, instance)
+    if answers is not None:
+        moderation.clean_up_deleted_answers(answers, with_questions=_deletes(origin, Question))
+
+
+# Per-question answer counters
+@receiver(post_save, sender=Answer)
+def count_new_answer(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust(instance.question_id, **{counters.answer_field(instance.approved): 1})
+
+
+
+# Moderation queue counters
+@receiver(post_save, sender=Question)
+@receiver(post_save, sender=Answer)
+def count_new_pending(sender, instance, created, **kwargs):
+    if created and not instance.approved:
+        counters.adjust_moderation(**{counters.pending_queue(sender): 1})
+
+
+# Keep the search index in step with question and answer writes
+@receiver(post_save, sender=Question)
+def index_question(sender, instance, **kwargs):
+    get_backend().index_question(instance.pk)
 
 @receiver(post_delete, sender=Question)
-def delete_flags_for_question(sender, instance, **kwargs):
-    content_type = ContentType.objects.get_for_model(Question)
-    # Delete flags on the question itself
-    Flag.objects.filter(content_type=content_type, object_id=instance.id).delete()
+def unindex_question(sender, instance, **kwargs):
+    get_backend().remove_question(instance.pk)
 
-    # Also delete flags on answers of this question
-    answer_ct = ContentType.objects.get_for_model(Answer)
-    answer_ids = instance.answers.values_list('id', flat=True)
-    Flag.objects.filter(content_type=answer_ct, object_id__in=answer_ids).delete()
+@receiver(post_save, sender=Answer)
+def reindex_answer_question(sender, instance, **kwargs):
+    get_backend().index_question(instance.question_id)
 
 @receiver(post_delete, sender=Answer)
-def delete_flags_for_answer(sender, instance, **kwargs):
-    content_type = ContentType.objects.get_for_model(Answer)
-    Flag.objects.filter(content_type=content_type, object_id=instance.id).delete()
+def reindex_deleted_answer_question(sender, instance, origin=None, **kwargs):
+    # Answers going with their question leave nothing to reindex.
+    if not _deletes(origin, Question) and _first_for_question(origin, instance.question_id, 'reindexed'):
+        get_backend().index_question(instance.question_id)
+
+@receiver(content_changed)
+def reindex_moderated_questions(sender, question_ids, **kwargs):
+    # Only approved answers are indexed; question approval changes nothing.
+    if sender is Answer:
+        get_backend().index_questions(question_ids)
+
+
+# Retire cached page fragments whenever what they show changes
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_fragments(sender, instance, **kwargs):
+    fragments.invalidate_question(instance.pk)
+
+@receiver(post_save, sender=Answer)
+def invalidate_answer_fragments(sender, instance, **kwargs):
+    fragments.invalidate_question(instance.question_id)
+
+@receiver(post_delete, sender=Answer)
+def invalidate_deleted_answer_fragments(sender, instance, origin=None, **kwargs):
+    if not _deletes(origin, Question) and _first_for_question(origin, instance.question_id, 'invalidated'):
+        fragments.invalidate_question(instance.question_id)
+
+@receiver(content_changed)
+def invalidate_moderated_fragments(sender, question_ids, **kwargs):
+    fragments.invalidate_questions(question_ids)
+
+
+# Cached users: warm on login, drop on any change (is_staff, password, ...)
+@receiver(user_logged_in)
+def cache_logged_in_user(sender, request, user, **kwargs):
+    usercache.remember(user, request.session[BACKEND_SESSION_KEY])
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    usercache.invalidate(instance.pk)
+
+
+# SQLite tuning for the production database profile
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', None)
+    if connection.vendor != 'sqlite' or not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
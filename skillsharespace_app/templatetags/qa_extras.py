@@ -0,0 +1,23 @@
+from django import template
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from ..fragments import VIEW_COUNT_MARKER
+from ..search import HIGHLIGHT_START, HIGHLIGHT_END
+
+register = template.Library()
+
+
+@register.filter
+def highlight(snippet):
+    """Escape a search snippet and wrap the matched terms in <mark>."""
+    if not snippet:
+        return ''
+    html = escape(snippet)
+    return mark_safe(html.replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>'))
+
+
+@register.filter
+def view_count(question):
+    """Where ``fragments.finish`` puts the question's current view count."""
+    return mark_safe(VIEW_COUNT_MARKER.format(int(question.pk)))
@@ -1,3 +1,1395 @@
-from django.test import TestCase
+import json
+import os
+import sqlite3
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.contenttypes.models import ContentType
+from django.core import signing
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import QuerySet
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+
+from skillsharespace import urls as project_urls
+
+from . import async_views, counters, fragments, markup, moderation, routers, usercache
+from .management.commands import import_qa
+from .models import Question, Answer, Flag, ImportedRecord
+from .pagination import CURSOR_SALT, get_limit, paginate_keyset
+from .profiling import profile_stats
+from .search import HIGHLIGHT_END, HIGHLIGHT_START, get_backend as get_search_backend
+from .templatetags.qa_extras import highlight
+from .viewcounts import ViewCountBuffer
+
+
+@override_settings(FRAGMENT_CACHE_TIMEOUT=0, VIEW_COUNT_FLUSH_INTERVAL=0, ATOMIC_WRITE_REQUESTS=True)
+class SingleObjectQueryTests(TestCase):
+    """
+    Each single-object view loads its object once per request. Sessions and
+    users come from the cache, warmed by the login; POSTs add the savepoint
+    pair of WriteTransactionMiddleware, as in the production profile. Counts
+    are for the default single-database setup: with replicas, a POST also saves the session's
+    sticky marker.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass')
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        cls.question = Question.objects.create(title='Title', body='Body', author=cls.author, approved=True)
+        cls.answer = Answer.objects.create(question=cls.question, body='Answer', author=cls.author, approved=True)
+        cls.pending = Question.objects.create(title='Pending', body='Body', author=cls.staff)
+        cls.pending_answer = Answer.objects.create(question=cls.pending, body='Answer', author=cls.author)
+
+    def setUp(self):
+        # Content types are cached per process, as on a running site.
+        ContentType.objects.get_for_models(Question, Answer)
+        self.client.force_login(self.author)
+
+    def test_question_detail(self):
+        # Validator, view count, question, answers.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('question-detail', args=[self.question.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_question_detail_for_answerer(self):
+        # As above, plus the check that the user answered the pending question.
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('question-detail', args=[self.pending.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(FRAGMENT_CACHE_TIMEOUT=300)
+    def test_question_detail_cached(self):
+        caches['default'].clear()
+        self.client.force_login(self.author)
+        url = reverse('question-detail', args=[self.question.pk])
+        response = self.client.get(url)
+        # A cached page carries its validator: only the view count is written,
+        # and read back into the page.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_question_update_get(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('question-update', args=[self.question.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_question_update_post(self):
+        # Question, update, search reindex (2), savepoints (2).
+        with self.assertNumQueries(6):
+            response = self.client.post(
+                reverse('question-update', args=[self.question.pk]), {'title': 'New title', 'body': 'New body'},
+            )
+        self.assertEqual(response.status_code, 302)
+
+    def test_question_update_denied(self):
+        self.client.force_login(self.staff)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('question-update', args=[self.question.pk]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_question_delete_get(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('question-delete', args=[self.question.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_question_delete_post(self):
+        with self.assertNumQueries(15):
+            response = self.client.post(reverse('question-delete', args=[self.question.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Question.objects.filter(pk=self.question.pk).exists())
+
+    def test_answer_update_get(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('answer-update', args=[self.answer.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_answer_update_post(self):
+        # The success URL reuses the answer and its question from the permission check.
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse('answer-update', args=[self.answer.pk]), {'body': 'Edited'})
+        self.assertRedirects(
+            response, reverse('question-detail', args=[self.question.pk]), fetch_redirect_response=False,
+        )
+
+    def test_answer_update_post_on_pending_question(self):
+        # Checking the question's author needs its id, not the author row.
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse('answer-update', args=[self.pending_answer.pk]), {'body': 'Edited'})
+        self.assertRedirects(response, reverse('question-list'), fetch_redirect_response=False)
+
+    def test_answer_delete_get(self):
+        # The cancel link's question comes with the answer.
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('answer-delete', args=[self.answer.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_answer_delete_post(self):
+        with self.assertNumQueries(13):
+            response = self.client.post(reverse('answer-delete', args=[self.pending_answer.pk]))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Answer.objects.filter(pk=self.pending_answer.pk).exists())
+
+
+class UserCacheTests(TestCase):
+    """Cached users follow changes to the user row."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def test_cached_user(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('signup'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.user, self.staff)
+
+    def test_password_hash_not_cached(self):
+        user = usercache.get_user(self.client.get(reverse('signup')).wsgi_request)
+        self.assertEqual((user.username, user.is_staff, user.is_active), ('staff', True, True))
+        self.assertIn('password', user.get_deferred_fields())
+        self.assertNotIn(self.staff.password, str(caches['default'].get(f'auth:user:{self.staff.pk}')))
+        # Deferred fields still load on demand.
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('pass'))
+
+    def test_demotion(self):
+        self.assertEqual(self.client.get(reverse('mod-dashboard')).status_code, 200)
+        self.staff.is_staff = False
+        self.staff.save()
+        self.assertEqual(self.client.get(reverse('mod-dashboard')).status_code, 403)
+
+    def test_password_change_ends_session(self):
+        self.client.get(reverse('mod-dashboard'))
+        self.staff.set_password('new password')
+        self.staff.save()
+        response = self.client.get(reverse('mod-dashboard'))
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+
+class RenderedBodyTests(TestCase):
+    """Markdown bodies are rendered and sanitized on save, not per view."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass')
+
+    def test_rendered_on_save(self):
+        question = Question.objects.create(
+            title='Title', body='Use `map`:\n\n```python\nlist(map(f, xs))\n```', author=self.author,
+        )
+        self.assertEqual(question.body_html_version, markup.RENDERER_VERSION)
+        self.assertIn('<code>map</code>', question.body_html)
+        self.assertIn('<pre><code class="language-python">', question.body_html)
+
+        question.body = 'Edited *body*'
+        question.save()
+        question.refresh_from_db()
+        self.assertEqual(question.body_html, '<p>Edited <em>body</em></p>')
+
+    def test_sanitized(self):
+        answer = Answer.objects.create(
+            question=Question.objects.create(title='Title', body='Body', author=self.author),
+            body='<script>alert(1)</script>[link](javascript:alert(1)) <b onclick="x()">bold</b>',
+            author=self.author,
+        )
+        self.assertNotIn('script', answer.body_html)
+        self.assertNotIn('javascript', answer.body_html)
+        self.assertNotIn('onclick', answer.body_html)
+
+    def test_rerender(self):
+        question = Question.objects.create(title='Title', body='*old*', author=self.author)
+        Question.objects.filter(pk=question.pk).update(body_html='stale', body_html_version=0)
+        question.refresh_from_db()
+        self.assertEqual(question.rendered_body, '<p><em>old</em></p>')
+
+        self.assertEqual(markup.rerender(Question.objects.all()), 1)
+        question.refresh_from_db()
+        self.assertEqual(question.body_html, '<p><em>old</em></p>')
+        self.assertEqual(markup.rerender(Question.objects.all()), 0)
+
+
+class ImportExportTests(TestCase):
+    """An archive written by export_qa imports in batches and resumes after a failure."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass')
+        for number in range(3):
+            question = Question.objects.create(title=f'Question {number}', body='*Body*', author=cls.author, approved=True)
+            Answer.objects.create(question=question, body='Answer', author=cls.author, approved=number > 0)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.archive = os.path.join(directory.name, 'archive.ndjson')
+        call_command('export_qa', self.archive, stdout=StringIO())
+
+    def records(self):
+        with open(self.archive) as f:
+            return [json.loads(line) for line in f]
+
+    def test_export(self):
+        records = self.records()
+        self.assertEqual([record['type'] for record in records], ['question'] * 3 + ['answer'] * 3)
+        self.assertEqual(records[0]['author'], 'author')
+        self.assertEqual(records[3]['question'], records[0]['id'])
+
+    def test_import(self):
+        newcomer = self.records()[-1]
+        newcomer.update(id=newcomer['id'] + 1, author='newcomer')
+        with open(self.archive, 'a') as f:
+            f.write(json.dumps(newcomer) + '\n')
+
+        call_command('import_qa', self.archive, batch_size=2, stdout=StringIO())
+        self.assertEqual(Question.objects.count(), 6)
+        self.assertEqual(Answer.objects.count(), 7)
+        imported = Question.objects.order_by('-pk').first()
+        self.assertEqual(imported.title, 'Question 2')
+        self.assertEqual(imported.answer_count, 2)
+        self.assertEqual(imported.body_html, '<p><em>Body</em></p>')
+        self.assertTrue(User.objects.filter(username='newcomer').exists())
+        self.assertFalse(os.path.exists(f'{self.archive}.checkpoint'))
+
+    def test_resume(self):
+        with open(self.archive) as f:
+            lines = f.readlines()
+        with open(self.archive, 'w') as f:
+            f.writelines(lines[:4] + ['{"type": "comment"}\n'] + lines[5:])
+        with self.assertRaises(CommandError):
+            call_command('import_qa', self.archive, batch_size=2, stdout=StringIO())
+        # The first two batches were committed and checkpointed.
+        self.assertEqual(Question.objects.count(), 6)
+        self.assertEqual(Answer.objects.count(), 4)
+
+        with open(self.archive, 'w') as f:
+            f.writelines(lines)
+        call_command('import_qa', self.archive, batch_size=2, stdout=StringIO())
+        self.assertEqual(Answer.objects.count(), 6)
+        self.assertEqual(Question.objects.order_by('-pk').first().answer_count, 1)
+
+    def test_resume_after_uncheckpointed_batch(self):
+        save_checkpoint = import_qa.Command.save_checkpoint
+
+        def interrupted(command, state):
+            # The second batch commits, then the process dies before its checkpoint.
+            if state['line'] == 4:
+                raise RuntimeError
+            save_checkpoint(command, state)
+
+        with mock.patch.object(import_qa.Command, 'save_checkpoint', interrupted):
+            with self.assertRaises(RuntimeError):
+                call_command('import_qa', self.archive, batch_size=2, stdout=StringIO())
+        # The live site takes the next ids in the meantime.
+        live = Question.objects.create(title='Live', body='Body', author=self.author, approved=True)
+
+        out = StringIO()
+        call_command('import_qa', self.archive, batch_size=2, stdout=out)
+        self.assertIn('Imported 3 questions and 3 answers', out.getvalue())
+        self.assertEqual(Question.objects.count(), 7)
+        self.assertEqual(Answer.objects.count(), 6)
+        for number in range(3):
+            self.assertEqual(Answer.objects.filter(question__title=f'Question {number}').count(), 2)
+        self.assertFalse(live.answers.exists())
+        self.assertFalse(ImportedRecord.objects.exists())
+
+    def test_repeated_record(self):
+        with open(self.archive) as f:
+            lines = f.readlines()
+        with open(self.archive, 'w') as f:
+            f.writelines(lines[:3] + lines[:1] + lines[3:])
+        with self.assertRaisesMessage(CommandError, 'appears in the archive more than once'):
+            call_command('import_qa', self.archive, batch_size=2, stdout=StringIO())
+
+
+@override_settings(
+    QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_RAISE=True, FRAGMENT_CACHE_TIMEOUT=0, VIEW_COUNT_FLUSH_INTERVAL=0,
+)
+class QueryBudgetTests(TestCase):
+    """Every page stays within its declared query budget, whatever is on it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = User.objects.create_user('member', password='pass')
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        for number in range(5):
+            author = cls.member if number % 2 else cls.staff
+            question = Question.objects.create(title=f'Question {number}', body='Body', author=author, approved=number > 0)
+            for answer_number in range(3):
+                answer = Answer.objects.create(
+                    question=question, body='Answer', author=author, approved=answer_number > 0,
+                )
+                moderation.report_content(answer, cls.member)
+            moderation.report_content(question, cls.staff)
+        cls.question = question
+
+    def get(self, user, name, *args, **params):
+        if user is not None:
+            self.client.force_login(user)
+        response = self.client.get(reverse(name, args=args), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_question_list(self):
+        for user in (None, self.member, self.staff):
+            with self.subTest(user=user):
+                self.get(user, 'question-list')
+                self.get(user, 'question-list', q='question')
+
+    def test_question_detail(self):
+        for user in (None, self.member, self.staff):
+            with self.subTest(user=user):
+                self.get(user, 'question-detail', self.question.pk)
+
+    def test_dashboard(self):
+        self.get(self.staff, 'mod-dashboard')
+
+    def test_moderation_updates(self):
+        self.get(self.staff, 'moderation-updates', since='2000-01-01T00:00:00+00:00')
+
+    def test_flag_views(self):
+        self.get(self.staff, 'moderator-flag-list')
+        flag = Flag.objects.filter(resolved=False).first()
+        self.client.post(reverse('resolve-flag', args=[flag.pk]))
+        self.assertTrue(Flag.objects.get(pk=flag.pk).resolved)
+
+    def test_flag_create(self):
+        self.client.force_login(self.staff)
+        answer = Answer.objects.create(question=self.question, body='New', author=self.member)
+        flag = Flag.objects.get(object_id=self.question.answers.first().pk, content_type__model='answer')
+        moderation.resolve_flag(flag)
+        # A first report, a repeat, and a new reporter reopening a flag.
+        for model, pk in (('answer', answer.pk), ('answer', answer.pk), ('answer', flag.object_id)):
+            response = self.client.post(reverse('flag', args=[model, pk]))
+            self.assertRedirects(
+                response, reverse('question-detail', args=[self.question.pk]), fetch_redirect_response=False,
+            )
+
+
+@override_settings(FRAGMENT_CACHE_TIMEOUT=0)
+class BulkModerationTests(TestCase):
+    """Bulk moderation keeps counters in step in a fixed number of statements."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        cls.questions = [
+            Question.objects.create(title=f'Question {number}', body='Body', author=cls.staff, approved=True)
+            for number in range(6)
+        ]
+        cls.answers = [
+            Answer.objects.create(question=question, body='Answer', author=cls.staff)
+            for question in cls.questions for _ in range(2)
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def bulk(self, target, action, ids):
+        response = self.client.post(reverse('moderator-bulk'), {
+            'target': target, 'action': action, 'ids': ','.join(str(pk) for pk in ids),
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_approve_and_unapprove(self):
+        answers = self.answers[:3]
+        result = self.bulk('answer', 'approve', [answer.pk for answer in answers] + [0])
+        self.assertEqual(result['changed'], 3)
+        self.assertEqual(result['results']['0'], moderation.MISSING)
+        first = Question.objects.get(pk=self.questions[0].pk)
+        self.assertEqual((first.answer_count, first.pending_answer_count), (2, 0))
+        self.assertEqual(counters.moderation_counts()['pending_answers'], 9)
+
+        result = self.bulk('answer', 'unapprove', [answers[0].pk, self.answers[-1].pk])
+        self.assertEqual(result['results'], {
+            str(answers[0].pk): moderation.CHANGED, str(self.answers[-1].pk): moderation.UNCHANGED,
+        })
+        first.refresh_from_db()
+        self.assertEqual((first.answer_count, first.pending_answer_count), (1, 1))
+        self.assertEqual(counters.moderation_counts()['pending_answers'], 10)
+
+        result = self.bulk('question', 'unapprove', [question.pk for question in self.questions[:2]])
+        self.assertEqual(result['changed'], 2)
+        self.assertEqual(counters.moderation_counts()['pending_questions'], 2)
+
+    def test_resolve(self):
+        flags = [moderation.report_content(answer, self.staff) for answer in self.answers[:4]]
+        result = self.bulk('flag', 'resolve', [flag.pk for flag in flags[:3]])
+        self.assertEqual(result['changed'], 3)
+        self.assertEqual(counters.moderation_counts()['open_flags'], 1)
+        self.assertEqual(
+            list(Question.objects.filter(pk__in=[self.questions[0].pk, self.questions[1].pk])
+                 .order_by('pk').values_list('open_flag_count', flat=True)),
+            [0, 1],
+        )
+
+    def test_constant_statements(self):
+        # Answers on two questions, then on all six: the same statements.
+        with CaptureQueriesContext(connection) as few:
+            moderation.bulk_set_approved(Answer, [answer.pk for answer in self.answers[:4]], True)
+        with CaptureQueriesContext(connection) as many:
+            moderation.bulk_set_approved(Answer, [answer.pk for answer in self.answers[4:]], True)
+        self.assertEqual(len(few), len(many))
+
+
+class ReportContentTests(TestCase):
+    """All reports on an object share one flag, counted once per reporter."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice', password='pass')
+        cls.bob = User.objects.create_user('bob', password='pass')
+        cls.question = Question.objects.create(title='Title', body='Body', author=cls.alice, approved=True)
+        cls.answer = Answer.objects.create(question=cls.question, body='Answer', author=cls.alice, approved=True)
+
+    def state(self, flag):
+        flag.refresh_from_db()
+        question = Question.objects.get(pk=self.question.pk)
+        return (
+            flag.report_count, flag.resolved, flag.reports.count(),
+            question.open_flag_count, counters.moderation_counts()['open_flags'],
+        )
+
+    def test_first_report(self):
+        flag = moderation.report_content(self.answer, self.alice, 'Spam')
+        self.assertEqual(flag.content_object, self.answer)
+        self.assertEqual(self.state(flag), (1, False, 1, 1, 1))
+
+    def test_repeat_report_changes_nothing(self):
+        flag = moderation.report_content(self.answer, self.alice)
+        self.assertEqual(moderation.report_content(self.answer, self.alice), flag)
+        self.assertEqual(self.state(flag), (1, False, 1, 1, 1))
+
+    def test_new_reporter_on_open_flag(self):
+        flag = moderation.report_content(self.question, self.alice)
+        moderation.report_content(self.question, self.bob)
+        self.assertEqual(Flag.objects.count(), 1)
+        self.assertEqual(self.state(flag), (2, False, 2, 1, 1))
+
+    def test_new_reporter_reopens_resolved_flag(self):
+        flag = moderation.report_content(self.answer, self.alice)
+        moderation.resolve_flag(flag)
+        self.assertEqual(self.state(flag), (1, True, 1, 0, 0))
+
+        moderation.report_content(self.answer, self.alice)
+        self.assertEqual(self.state(flag), (1, True, 1, 0, 0))
+
+        moderation.report_content(self.answer, self.bob)
+        self.assertEqual(self.state(flag), (2, False, 2, 1, 1))
+        self.assertIsNone(flag.resolved_at)
+
+
+class FlagMergeMigrationTests(TransactionTestCase):
+    """0010_aggregate_flags merges the old one-flag-per-click rows."""
+
+    before = [('skillsharespace_app', '0009_question_counters')]
+    after = [('skillsharespace_app', '0010_aggregate_flags')]
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_merge(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        apps = executor.loader.project_state(self.before).apps
+        User = apps.get_model('auth', 'User')
+        ContentType = apps.get_model('contenttypes', 'ContentType')
+        Question = apps.get_model('skillsharespace_app', 'Question')
+        Answer = apps.get_model('skillsharespace_app', 'Answer')
+        Flag = apps.get_model('skillsharespace_app', 'Flag')
+
+        alice = User.objects.create(username='alice')
+        User.objects.create(username='bob')
+        question = Question.objects.create(title='Title', body='Body', author=alice, approved=True, open_flag_count=3)
+        answer = Answer.objects.create(question=question, body='Answer', author=alice, approved=True)
+        question_ct, _ = ContentType.objects.get_or_create(app_label='skillsharespace_app', model='question')
+        answer_ct, _ = ContentType.objects.get_or_create(app_label='skillsharespace_app', model='answer')
+        for reason, resolved in (('Flagged by alice', True), ('Flagged by bob', False), ('Flagged by alice', False)):
+            Flag.objects.create(content_type=question_ct, object_id=question.pk, reason=reason, resolved=resolved)
+        for reason in ('Flagged by ghost', 'Flagged by ghost'):
+            Flag.objects.create(content_type=answer_ct, object_id=answer.pk, reason=reason, resolved=True)
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        Flag = apps.get_model('skillsharespace_app', 'Flag')
+        Question = apps.get_model('skillsharespace_app', 'Question')
+
+        question_flag = Flag.objects.get(content_type=question_ct.pk, object_id=question.pk)
+        self.assertEqual(question_flag.report_count, 2)
+        self.assertFalse(question_flag.resolved)
+        self.assertEqual(
+            sorted(question_flag.reports.values_list('user__username', flat=True)), ['alice', 'bob'],
+        )
+        # Reporters who no longer exist still count as one report.
+        answer_flag = Flag.objects.get(content_type=answer_ct.pk, object_id=answer.pk)
+        self.assertEqual((answer_flag.report_count, answer_flag.resolved), (1, True))
+        self.assertEqual(answer_flag.reports.count(), 0)
+        self.assertEqual(Question.objects.get(pk=question.pk).open_flag_count, 1)
+
+
+@override_settings(ATOMIC_WRITE_REQUESTS=True)
+class WriteTransactionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass')
+        cls.question = Question.objects.create(title='Title', body='Body', author=cls.author, approved=True)
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def test_failed_post_rolls_back(self):
+        url = reverse('question-update', args=[self.question.pk])
+        with mock.patch('skillsharespace_app.signals.get_backend') as get_backend:
+            get_backend.return_value.index_question.side_effect = RuntimeError
+            with self.assertRaises(RuntimeError):
+                self.client.post(url, {'title': 'New title', 'body': 'New body'})
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.title, 'Title')
+
+    async def test_failed_async_post_rolls_back(self):
+        await self.async_client.aforce_login(self.author)
+        url = reverse('question-update', args=[self.question.pk])
+        with mock.patch('skillsharespace_app.signals.get_backend') as get_backend:
+            get_backend.return_value.index_question.side_effect = RuntimeError
+            with self.assertRaises(RuntimeError):
+                await self.async_client.post(url, {'title': 'New title', 'body': 'New body'})
+        await self.question.arefresh_from_db()
+        self.assertEqual(self.question.title, 'Title')
+
+    @override_settings(ATOMIC_WRITE_REQUESTS=False)
+    def test_disabled(self):
+        url = reverse('question-update', args=[self.question.pk])
+        with mock.patch('skillsharespace_app.signals.get_backend') as get_backend:
+            get_backend.return_value.index_question.side_effect = RuntimeError
+            with self.assertRaises(RuntimeError):
+                self.client.post(url, {'title': 'New title', 'body': 'New body'})
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.title, 'New title')
+
+
+@override_settings(FRAGMENT_CACHE_TIMEOUT=300)
+class ReplicaFragmentTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+        self.addCleanup(routers.use_replica, False)
+
+    def test_replica_reads_are_not_cached(self):
+        routers.use_replica()
+        with mock.patch('skillsharespace_app.routers._distinct_replicas', return_value=['replica1']):
+            fragments.set('fragments:test', 'page')
+        self.assertIsNone(fragments.get('fragments:test'))
+
+    def test_mirrored_replica_reads_are_cached(self):
+        # A TEST MIRROR replica reads through the primary's connection.
+        routers.use_replica()
+        fragments.set('fragments:test', 'page')
+        self.assertEqual(fragments.get('fragments:test'), 'page')
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], FRAGMENT_CACHE_TIMEOUT=0, VIEW_COUNT_FLUSH_INTERVAL=0)
+class ReplicaRouterTests(TransactionTestCase):
+    """
+    Routing against a replica in its own SQLite file, which only sees the
+    primary's rows when ``replicate`` copies them over.
+    """
+    # Not {'default', 'replica1'}: the runner would try to create the
+    # replica's test database before setUpClass adds the alias.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings['replica1'] = {
+            **connections['default'].settings_dict, 'NAME': os.path.join(cls.replica_dir.name, 'replica.sqlite3'),
+        }
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica1'].close()
+        del connections['replica1']
+        del connections.settings['replica1']
+        cls.replica_dir.cleanup()
+
+    def setUp(self):
+        self.author = User.objects.create_user('author', password='pass')
+        self.replicate()
+        self.addCleanup(routers.use_replica, False)
+
+    def replicate(self):
+        connections['replica1'].close()
+        connections['default'].ensure_connection()
+        target = sqlite3.connect(connections['replica1'].settings_dict['NAME'])
+        try:
+            connections['default'].connection.backup(target)
+        finally:
+            target.close()
+
+    def test_router(self):
+        router = routers.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Question))
+        routers.use_replica()
+        self.assertTrue(routers.reading_replica())
+        self.assertEqual(router.db_for_read(Question), 'replica1')
+        # Users and sessions, and every write, stay on the primary.
+        self.assertIsNone(router.db_for_read(User))
+        self.assertEqual(router.db_for_write(Question), 'default')
+        self.assertFalse(router.allow_migrate('replica1', 'skillsharespace_app'))
+
+    def test_public_pages_read_from_the_replica(self):
+        question = Question.objects.create(title='Fresh', body='Body', author=self.author, approved=True)
+        self.assertNotContains(self.client.get(reverse('question-list')), 'Fresh')
+        self.assertEqual(self.client.get(reverse('question-detail', args=[question.pk])).status_code, 404)
+        # The request's replica reads end with it.
+        self.assertFalse(routers.reading_replica())
+        self.replicate()
+        self.assertContains(self.client.get(reverse('question-list')), 'Fresh')
+        self.assertContains(self.client.get(reverse('question-detail', args=[question.pk])), 'Fresh')
+
+    def test_writes_pin_the_session_to_the_primary(self):
+        self.client.force_login(self.author)
+        response = self.client.post(reverse('question-create'), {'title': 'Mine', 'body': 'Body'})
+        self.assertEqual(response.status_code, 302)
+        question = Question.objects.get(title='Mine')
+        self.assertContains(self.client.get(reverse('question-detail', args=[question.pk])), 'Mine')
+        with override_settings(REPLICA_STICKY_SECONDS=0):
+            self.client.post(reverse('question-update', args=[question.pk]), {'title': 'Mine', 'body': 'Edited'})
+        # Once the session's window has passed, reads go back to the replica.
+        self.assertEqual(self.client.get(reverse('question-detail', args=[question.pk])).status_code, 404)
+
+
+class ModerationClaimTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass')
+        cls.first = User.objects.create_user('first', password='pass', is_staff=True)
+        cls.second = User.objects.create_user('second', password='pass', is_staff=True)
+        cls.pending = [
+            Question.objects.create(title=f'Pending {i}', body='Body', author=cls.author) for i in range(5)
+        ]
+        cls.ids = [question.pk for question in cls.pending]
+
+    def lease(self, pk):
+        return Question.objects.values_list('claimed_by', 'claimed_until').get(pk=pk)
+
+    def test_concurrent_claims_are_disjoint(self):
+        first = moderation.claim('questions', self.first, limit=2, seconds=600)
+        second = moderation.claim('questions', self.second, limit=2, seconds=600)
+        self.assertEqual(first, self.ids[:2])
+        self.assertEqual(second, self.ids[2:4])
+        self.assertEqual(moderation.claim('questions', self.second, limit=2, seconds=600), self.ids[4:])
+        self.assertEqual(moderation.claim('questions', self.first, limit=2, seconds=600), [])
+
+    def test_skip_locked_claims_are_disjoint(self):
+        # SQLite ignores FOR UPDATE, so this runs the other branch's logic.
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', True):
+            first = moderation.claim('questions', self.first, limit=2, seconds=600)
+            second = moderation.claim('questions', self.second, limit=2, seconds=600)
+        self.assertEqual(first, self.ids[:2])
+        self.assertEqual(second, self.ids[2:4])
+
+    def test_sqlite_claim_is_one_conditional_update(self):
+        with mock.patch.object(connection.features, 'has_select_for_update_skip_locked', False):
+            with CaptureQueriesContext(connection) as queries:
+                claimed = moderation.claim('questions', self.first, limit=2, seconds=600)
+        self.assertEqual(claimed, self.ids[:2])
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertIn('LIMIT 2', updates[0])
+        self.assertIn('SELECT', updates[0])
+
+    def test_expired_leases_can_be_claimed(self):
+        moderation.claim('questions', self.first, limit=2, seconds=600)
+        Question.objects.filter(pk__in=self.ids[:2]).update(claimed_until=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(moderation.claim('questions', self.second, limit=2, seconds=600), self.ids[:2])
+        self.assertEqual(self.lease(self.ids[0])[0], self.second.pk)
+
+    def test_claim_renews_held_items_without_returning_them(self):
+        moderation.claim('questions', self.first, limit=2, seconds=60)
+        _, until = self.lease(self.ids[0])
+        self.assertEqual(moderation.claim('questions', self.first, limit=2, seconds=600), self.ids[2:4])
+        claimed_by, renewed = self.lease(self.ids[0])
+        self.assertEqual(claimed_by, self.first.pk)
+        self.assertGreater(renewed, until + timedelta(seconds=500))
+        self.assertEqual(list(moderation.claimed('questions', self.first).values_list('pk', flat=True)), self.ids[:4])
+
+    def test_release(self):
+        moderation.claim('questions', self.first, limit=3, seconds=600)
+        self.assertEqual(moderation.release('questions', self.first, ids=[self.ids[0]]), 1)
+        self.assertEqual(self.lease(self.ids[0]), (None, None))
+        self.assertEqual(moderation.release('questions', self.second), 0)
+        self.assertEqual(moderation.release('questions', self.first), 2)
+        self.assertFalse(moderation.claimed('questions', self.first).exists())
+        self.assertEqual(moderation.claim('questions', self.second, limit=1, seconds=600), self.ids[:1])
+
+    def test_saves_keep_leases(self):
+        # Instances loaded before the claim, as by an edit form mid-request.
+        answer = Answer.objects.create(question=self.pending[0], body='Answer', author=self.author)
+        flag = moderation.report_content(answer, self.author)
+        stale = [Question.objects.get(pk=self.ids[0]), Answer.objects.get(pk=answer.pk), Flag.objects.get(pk=flag.pk)]
+        for kind in ('questions', 'answers', 'flags'):
+            moderation.claim(kind, self.first, limit=1, seconds=600)
+        moderation.report_content(answer, self.second)
+        for obj in stale:
+            with self.subTest(model=type(obj).__name__):
+                obj.save()
+                obj.refresh_from_db()
+                self.assertEqual(obj.claimed_by, self.first)
+                self.assertIsNotNone(obj.claimed_until)
+        self.assertEqual(stale[2].report_count, 2)
+
+    @override_settings(
+        MODERATION_CLAIM_BATCH=2, QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_RAISE=True, ATOMIC_WRITE_REQUESTS=True,
+    )
+    def test_queue_view(self):
+        self.client.force_login(self.first)
+        url = reverse('moderation-queue', args=['questions'])
+        self.client.post(url, {'action': 'claim'})
+        self.client.post(url, {'action': 'claim'})
+        response = self.client.get(url)
+        self.assertEqual([item.pk for item in response.context['items']], self.ids[:4])
+
+
+@override_settings(FRAGMENT_CACHE_TIMEOUT=0)
+class SearchTests(TestCase):
+    """Search only narrows what the user may see and follows moderation."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass')
+        cls.member = User.objects.create_user('member', password='pass')
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        cls.public = Question.objects.create(title='Public sourdough', body='Body', author=cls.author, approved=True)
+        cls.pending = Question.objects.create(title='Pending sourdough', body='Body', author=cls.author)
+        cls.answer = Answer.objects.create(question=cls.public, body='Try rye flour', author=cls.member)
+
+    def search(self, user, query):
+        return list(get_search_backend().search(Question.objects.visible_to(user), query))
+
+    def test_visibility(self):
+        for user, expected in ((AnonymousUser(), [self.public]), (self.member, [self.public]),
+                               (self.author, [self.public, self.pending]), (self.staff, [self.public, self.pending])):
+            with self.subTest(user=user):
+                self.assertCountEqual(self.search(user, 'sourdough'), expected)
+
+    def test_list_page(self):
+        response = self.client.get(reverse('question-list'), {'q': 'sourdough'})
+        self.assertContains(response, 'Public sourdough')
+        self.assertNotContains(response, 'Pending sourdough')
+
+    def test_approving_answer_reindexes(self):
+        self.assertEqual(self.search(self.staff, 'rye'), [])
+        moderation.set_approved(self.answer, True)
+        self.assertEqual(self.search(self.staff, 'rye'), [self.public])
+        moderation.set_approved(self.answer, False)
+        self.assertEqual(self.search(self.staff, 'rye'), [])
+
+    def test_odd_input(self):
+        for query in ('"', 'sourdough"', 'NEAR(', 'title:x', '* OR', '-', '^sour', "'; DROP TABLE x", ''):
+            with self.subTest(query=query):
+                self.search(self.staff, query)
+                self.assertEqual(self.client.get(reverse('question-list'), {'q': query}).status_code, 200)
+
+    def test_highlight_escapes(self):
+        snippet = f'<script>x</script> {HIGHLIGHT_START}<b>sour</b>{HIGHLIGHT_END}'
+        self.assertEqual(
+            highlight(snippet), '&lt;script&gt;x&lt;/script&gt; <mark>&lt;b&gt;sour&lt;/b&gt;</mark>',
+        )
+
+    def test_snippet_from_raw_body(self):
+        question = Question.objects.create(
+            title='Markup', body='<img src=x onerror=alert(1)> sourdough', author=self.author, approved=True,
+        )
+        result = next(q for q in self.search(self.staff, 'sourdough') if q.pk == question.pk)
+        html = highlight(result.search_snippet)
+        self.assertNotIn('<img', html)
+        self.assertIn('<mark>sourdough</mark>', html)
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=60)
+class ViewCountBufferTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author', password='pass')
+        cls.first = Question.objects.create(title='First', body='Body', author=author, approved=True, views=10)
+        cls.second = Question.objects.create(title='Second', body='Body', author=author, approved=True)
+
+    def setUp(self):
+        self.buffer = ViewCountBuffer()
+        # No background flusher: the tests flush by hand.
+        patcher = mock.patch.object(self.buffer, '_ensure_flusher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def views(self, question):
+        return Question.objects.values_list('views', flat=True).get(pk=question.pk)
+
+    def test_reads_add_pending(self):
+        self.buffer.record(self.first.pk)
+        self.buffer.record(self.first.pk)
+        self.assertEqual(self.buffer.pending(self.first.pk), 2)
+        self.assertEqual(self.views(self.first), 10)
+        [question] = self.buffer.apply([Question.objects.get(pk=self.first.pk)])
+        self.assertEqual(question.views, 12)
+
+    def test_flush(self):
+        for question in (self.first, self.first, self.second):
+            self.buffer.record(question.pk)
+        self.assertEqual(self.buffer.flush(), 3)
+        self.assertEqual((self.views(self.first), self.views(self.second)), (12, 1))
+        self.assertEqual(self.buffer.pending(self.first.pk), 0)
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_failed_flush_keeps_counts(self):
+        # Two distinct deltas, so two UPDATEs; the second one fails.
+        for question in (self.first, self.first, self.second):
+            self.buffer.record(question.pk)
+        update = QuerySet.update
+        calls = []
+
+        def failing_update(queryset, **kwargs):
+            calls.append(kwargs)
+            if len(calls) == 2:
+                raise DatabaseError
+            return update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', failing_update):
+            with self.assertRaises(DatabaseError):
+                self.buffer.flush()
+        self.assertEqual((self.views(self.first), self.views(self.second)), (10, 0))
+        self.assertEqual(self.buffer.pending(self.first.pk), 2)
+
+        self.buffer.flush()
+        self.assertEqual((self.views(self.first), self.views(self.second)), (12, 1))
+
+
+@override_settings(FRAGMENT_CACHE_TIMEOUT=0, PAGINATION_MAX_LIMIT=5)
+class KeysetPaginationTests(TestCase):
+    ordering = ('-created_at', '-id')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass')
+        start = timezone.now()
+        cls.questions = [
+            # Pairs share a timestamp, so pages also break ties on the id.
+            Question.objects.create(
+                title=f'Question {number}', body='Body', author=cls.author, approved=True,
+                created_at=start - timedelta(minutes=number // 2),
+            )
+            for number in range(7)
+        ]
+        # Newest first.
+        cls.expected = sorted(cls.questions, key=lambda q: (q.created_at, q.pk), reverse=True)
+
+    def page(self, cursor=None, limit=3):
+        return paginate_keyset(Question.objects.all(), self.ordering, limit, cursor)
+
+    def test_forward_and_backward(self):
+        first = self.page()
+        self.assertEqual(first.object_list, self.expected[:3])
+        self.assertFalse(first.has_previous())
+        second = self.page(first.next_cursor)
+        self.assertEqual(second.object_list, self.expected[3:6])
+        third = self.page(second.next_cursor)
+        self.assertEqual(third.object_list, self.expected[6:])
+        self.assertFalse(third.has_next())
+
+        back = self.page(third.previous_cursor)
+        self.assertEqual(back.object_list, self.expected[3:6])
+        self.assertEqual(self.page(back.previous_cursor).object_list, self.expected[:3])
+
+    def test_backward_past_start_serves_first_page(self):
+        second = self.page(self.page(limit=2).next_cursor, limit=2)
+        row_two = self.page(second.previous_cursor, limit=1)
+        self.assertEqual(row_two.object_list, self.expected[1:2])
+        # Only one row comes before it, not a page of two.
+        partial = self.page(row_two.previous_cursor, limit=2)
+        self.assertEqual(partial.object_list, self.expected[:2])
+        self.assertFalse(partial.has_previous())
+
+    def test_limit_cap(self):
+        factory = RequestFactory()
+        for value, limit in (('1000', 5), ('2', 2), ('0', 1), ('abc', 5)):
+            with self.subTest(limit=value):
+                self.assertEqual(get_limit(factory.get('/', {'limit': value})), limit)
+        response = self.client.get(reverse('question-list'), {'limit': 1000})
+        self.assertEqual(len(response.context['fragment'].split('class="card mb-3"')) - 1, 5)
+
+    def test_tampered_cursor(self):
+        forged = signing.dumps(['next', ['not a date', 'x']], salt=CURSOR_SALT, compress=True)
+        tampered = self.page().next_cursor[:-2] + 'xx'
+        for cursor in ('garbage', tampered, forged, signing.dumps(['sideways', []], salt=CURSOR_SALT)):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.page(cursor).object_list, self.expected[:3])
+                response = self.client.get(reverse('question-list'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+
+
+class VisibilityBranchTests(TestCase):
+    """Paging the visibility branches separately matches paging ``visible_to`` as one filter."""
+    ordering = ('-created_at', '-id')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = User.objects.create_user('member', password='pass')
+        cls.other = User.objects.create_user('other', password='pass')
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        start = timezone.now()
+        # Approved, own pending and others' pending rows interleave, and
+        # pairs share a timestamp across branches, so pages end mid-tie.
+        for number in range(11):
+            question = Question.objects.create(
+                title=f'Question {number}', body='Body', author=(cls.member, cls.other)[number % 2],
+                approved=number % 3 == 0, created_at=start - timedelta(minutes=number // 2),
+            )
+            Answer.objects.create(
+                question=question, body='Answer', author=(cls.other, cls.member)[number % 2],
+                approved=number % 4 == 0, created_at=question.created_at,
+            )
+
+    def walk(self, queryset, branches, ordering):
+        pages, cursor = [], None
+        while True:
+            page = paginate_keyset(queryset, ordering, 3, cursor, branches)
+            pages.append(page.object_list)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        backward = [page.object_list]
+        while page.has_previous():
+            page = paginate_keyset(queryset, ordering, 3, page.previous_cursor, branches)
+            backward.insert(0, page.object_list)
+        self.assertEqual(backward, pages)
+        return [obj for page in pages for obj in page]
+
+    def test_questions(self):
+        for user in (AnonymousUser(), self.member, self.staff):
+            with self.subTest(user=user):
+                expected = list(Question.objects.visible_to(user).order_by(*self.ordering))
+                branches = Question.objects.visibility_filters(user)
+                self.assertEqual(self.walk(Question.objects.all(), branches, self.ordering), expected)
+                self.assertGreater(len(expected), 3)
+
+    def test_answers(self):
+        ordering = ('created_at', 'id')
+        for user in (AnonymousUser(), self.member, self.staff):
+            with self.subTest(user=user):
+                expected = list(Answer.objects.visible_to(user).order_by(*ordering))
+                branches = Answer.objects.visibility_filters(user)
+                self.assertEqual(self.walk(Answer.objects.all(), branches, ordering), expected)
+                self.assertEqual(list(Answer.objects.visible_union(user).order_by(*ordering)), expected)
+
+
+@override_settings(FRAGMENT_CACHE_TIMEOUT=300, VIEW_COUNT_FLUSH_INTERVAL=0)
+class FragmentInvalidationTests(TestCase):
+    """Cached pages follow the writes that change them; view counts are never cached."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass')
+        cls.answerer = User.objects.create_user('answerer', password='pass')
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        cls.question = Question.objects.create(title='Title', body='Body', author=cls.author, approved=True)
+        cls.pending = Question.objects.create(title='Pending', body='Body', author=cls.author)
+
+    def setUp(self):
+        caches['default'].clear()
+        self.detail = reverse('question-detail', args=[self.question.pk])
+
+    def test_view_count(self):
+        self.assertContains(self.client.get(self.detail), '1 views')
+        self.assertContains(self.client.get(self.detail), '2 views')
+        self.assertContains(self.client.get(reverse('question-list')), '2 views')
+
+    def test_edit(self):
+        self.client.force_login(self.author)
+        self.client.get(self.detail)
+        self.client.get(reverse('question-list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('question-update', args=[self.question.pk]), {'title': 'Edited', 'body': 'Body'})
+        self.assertContains(self.client.get(self.detail), 'Edited')
+        self.assertContains(self.client.get(reverse('question-list')), 'Edited')
+
+    def test_approve(self):
+        self.assertNotContains(self.client.get(reverse('question-list')), 'Pending')
+        self.client.force_login(self.staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('approve-question', args=[self.pending.pk]))
+        self.client.logout()
+        self.assertContains(self.client.get(reverse('question-list')), 'Pending')
+        self.assertEqual(self.client.get(reverse('question-detail', args=[self.pending.pk])).status_code, 200)
+
+    def test_answer_create(self):
+        self.client.force_login(self.answerer)
+        self.assertNotContains(self.client.get(self.detail), 'My answer')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('answer-create', args=[self.question.pk]), {'body': 'My answer'})
+        self.assertContains(self.client.get(self.detail), 'My answer')
+
+
+class AsyncReadURLs:
+    """The project's URLs with the question pages served by async_views, as under ASGI."""
+    urlpatterns = [
+        path('', async_views.QuestionListView.as_view(), name='question-list'),
+        path('question/<int:pk>/', async_views.QuestionDetailView.as_view(), name='question-detail'),
+        *project_urls.urlpatterns,
+    ]
+
+
+@override_settings(ROOT_URLCONF=AsyncReadURLs, FRAGMENT_CACHE_TIMEOUT=0, VIEW_COUNT_FLUSH_INTERVAL=0)
+class AsyncViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass')
+        cls.member = User.objects.create_user('member', password='pass')
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        cls.public = Question.objects.create(title='Public question', body='Body', author=cls.author, approved=True)
+        cls.pending = Question.objects.create(title='Pending question', body='Body', author=cls.author)
+        Answer.objects.create(question=cls.public, body='Approved answer', author=cls.member, approved=True)
+        Answer.objects.create(question=cls.public, body='Pending answer', author=cls.member)
+
+    async def get(self, user, url):
+        if user is not None:
+            await self.async_client.aforce_login(user)
+        response = await self.async_client.get(url)
+        self.assertTrue(iscoroutinefunction(response.resolver_match.func))
+        return response
+
+    async def test_list(self):
+        for user, sees_pending in ((None, False), (self.member, False), (self.author, True), (self.staff, True)):
+            with self.subTest(user=user):
+                response = await self.get(user, reverse('question-list'))
+                self.assertContains(response, 'Public question')
+                self.assertEqual('Pending question' in response.content.decode(), sees_pending)
+                await self.async_client.alogout()
+
+    async def test_detail(self):
+        url = reverse('question-detail', args=[self.public.pk])
+        for user, sees_pending in ((None, False), (self.member, True), (self.author, False), (self.staff, True)):
+            with self.subTest(user=user):
+                response = await self.get(user, url)
+                self.assertContains(response, 'Approved answer')
+                self.assertEqual('Pending answer' in response.content.decode(), sees_pending)
+                await self.async_client.alogout()
+
+    async def test_unapproved_question(self):
+        url = reverse('question-detail', args=[self.pending.pk])
+        for user, status in ((None, 404), (self.member, 404), (self.author, 200), (self.staff, 200)):
+            with self.subTest(user=user):
+                self.assertEqual((await self.get(user, url)).status_code, status)
+                await self.async_client.alogout()
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=0)
+class ApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass')
+        cls.member = User.objects.create_user('member', password='pass')
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        start = timezone.now()
+        cls.public = [
+            Question.objects.create(
+                title=f'Public {number}', body='Body', author=cls.author, approved=True,
+                created_at=start - timedelta(minutes=number),
+            )
+            for number in range(3)
+        ]
+        cls.pending = Question.objects.create(title='Pending', body='Body', author=cls.author, created_at=start)
+        # The member answered the pending question, so they may open it and
+        # see its approved answers, as on its page.
+        cls.own = Answer.objects.create(question=cls.pending, body='Own', author=cls.member)
+        cls.other = Answer.objects.create(question=cls.pending, body='Other', author=cls.author, approved=True)
+        cls.hidden = Answer.objects.create(question=cls.public[0], body='Hidden', author=cls.author)
+        moderation.report_content(cls.public[0], cls.member)
+
+    def get(self, name, *args, user=None, **params):
+        if user is not None:
+            self.client.force_login(user)
+        return self.client.get(reverse(name, args=args), params)
+
+    def titles(self, response):
+        return [result['title'] for result in response.json()['results']]
+
+    def test_cursors(self):
+        first = self.get('api-v1-question-list', limit=2, fields='title')
+        self.assertEqual(self.titles(first), ['Public 0', 'Public 1'])
+        self.assertIsNone(first.json()['previous'])
+        second = self.client.get(first.json()['next'])
+        self.assertEqual(self.titles(second), ['Public 2'])
+        self.assertIsNone(second.json()['next'])
+        self.assertEqual(self.titles(self.client.get(second.json()['previous'])), ['Public 0', 'Public 1'])
+
+    def test_bad_cursor(self):
+        response = self.get('api-v1-question-list', limit=2, fields='title', cursor='garbage')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.titles(response), ['Public 0', 'Public 1'])
+
+    def test_fields(self):
+        response = self.get('api-v1-question-detail', self.public[0].pk, fields='id, title')
+        self.assertEqual(response.json(), {'id': self.public[0].pk, 'title': 'Public 0'})
+        response = self.get('api-v1-question-list', fields='title,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Unknown field(s): password.'})
+
+    def test_etag(self):
+        response = self.get('api-v1-question-list')
+        self.assertEqual(self.client.get(reverse('api-v1-question-list'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        Question.objects.filter(pk=self.public[0].pk).update(title='Changed')
+        changed = self.client.get(reverse('api-v1-question-list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+
+    def test_visibility(self):
+        for user, pending in ((None, False), (self.member, False), (self.author, True), (self.staff, True)):
+            with self.subTest(user=user):
+                self.assertEqual('Pending' in self.titles(self.get('api-v1-question-list', user=user)), pending)
+                self.client.logout()
+        for user, status in ((None, 404), (self.member, 200), (self.author, 200), (self.staff, 200)):
+            with self.subTest(user=user):
+                self.assertEqual(self.get('api-v1-question-detail', self.pending.pk, user=user).status_code, status)
+                self.client.logout()
+
+    def test_answers(self):
+        response = self.get('api-v1-answer-list', self.pending.pk, user=self.member, fields='body')
+        self.assertCountEqual([result['body'] for result in response.json()['results']], ['Own', 'Other'])
+        self.client.logout()
+        self.assertEqual(self.get('api-v1-answer-list', self.pending.pk).status_code, 404)
+
+    def test_flags_staff_only(self):
+        self.assertEqual(self.get('api-v1-flag-list', user=self.member).status_code, 403)
+        response = self.get('api-v1-flag-list', user=self.staff, fields='target_id,question,report_count')
+        self.assertEqual(response.json()['results'], [
+            {'target_id': self.public[0].pk, 'question': self.public[0].pk, 'report_count': 1},
+        ])
+
+    def export(self, response):
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_export(self):
+        self.assertEqual(len(self.export(self.get('api-v1-question-export', fields='id'))), 3)
+        # The member sees the approved answers on the question they answered,
+        # and their own, as its page shows them.
+        bodies = [row['body'] for row in self.export(self.get('api-v1-answer-export', user=self.member))]
+        self.assertCountEqual(bodies, ['Own', 'Other'])
+        self.client.force_login(self.staff)
+        bodies = [row['body'] for row in self.export(self.get('api-v1-answer-export'))]
+        self.assertCountEqual(bodies, ['Own', 'Other', 'Hidden'])
+
+    @mock.patch('skillsharespace_app.api.EXPORT_CHUNK_SIZE', 2)
+    async def test_export_under_asgi(self):
+        await self.async_client.aforce_login(self.staff)
+        response = await self.async_client.get(reverse('api-v1-question-export'), {'fields': 'title'})
+        # An async iterator, which the ASGI handler consumes as it goes.
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        rows = [json.loads(line) for line in b''.join(chunks).splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Pending', 'Public 0', 'Public 1', 'Public 2'])
+
+
+@override_settings(FRAGMENT_CACHE_TIMEOUT=0, VIEW_COUNT_FLUSH_INTERVAL=0)
+class ProfilingMiddlewareTests(TestCase):
+    """The middleware stack is built on a client's first request, so each test overrides first."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author', password='pass')
+        Question.objects.create(title='Question', body='Body', author=author, approved=True)
+
+    def setUp(self):
+        profile_stats.reset()
+        self.addCleanup(profile_stats.reset)
+
+    @override_settings(PROFILING_ENABLED=True)
+    def test_server_timing(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('question-list'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+, sql;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+$')
+        self.assertIn(f'"{len(queries)} queries"', timing)
+        self.assertEqual(profile_stats.snapshot()['views']['question-list']['requests'], 1)
+
+    @override_settings(PROFILING_ENABLED=True)
+    async def test_server_timing_under_asgi(self):
+        response = await self.async_client.get(reverse('question-list'))
+        self.assertIn('sql;dur=', response['Server-Timing'])
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get(reverse('question-list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(profile_stats.snapshot(), {'views': {}})
+
+
+@override_settings(VIEW_COUNT_FLUSH_INTERVAL=0)
+class ModeratorDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', password='pass', is_staff=True)
+        cls.reporters = [User.objects.create_user(f'reporter{i}', password='pass') for i in range(3)]
+        start = timezone.now() - timedelta(hours=1)
+        cls.pending = [
+            Question.objects.create(
+                title=f'Pending {i}', body='Body', author=cls.staff, created_at=start + timedelta(minutes=i),
+            )
+            for i in range(3)
+        ]
+        cls.approved = Question.objects.create(title='Approved', body='Body', author=cls.staff, approved=True)
+        # Flags queue by report count: pending 0 has one report, 1 two, 2 three.
+        cls.flags = [
+            [moderation.report_content(question, reporter) for reporter in cls.reporters[:i + 1]][-1]
+            for i, question in enumerate(cls.pending)
+        ]
+        Question.objects.update(updated_at=start)
+        Flag.objects.update(created_at=start)
+        cls.since = start + timedelta(minutes=30)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def dashboard(self, **params):
+        response = self.client.get(reverse('mod-dashboard'), {'limit': 2, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def titles(self, page):
+        return [question.title for question in page]
+
+    def test_queues_page_independently(self):
+        first = self.dashboard()
+        self.assertEqual(self.titles(first['unapproved_questions']), ['Pending 2', 'Pending 1'])
+        self.assertEqual([flag.pk for flag in first['unresolved_flags']], [self.flags[2].pk, self.flags[1].pk])
+        second = self.client.get(reverse('mod-dashboard') + first['unapproved_questions'].next_url).context
+        self.assertEqual(self.titles(second['unapproved_questions']), ['Pending 0'])
+        # The other queues stay on their first page.
+        self.assertEqual([flag.pk for flag in second['unresolved_flags']], [self.flags[2].pk, self.flags[1].pk])
+        flags = self.client.get(reverse('mod-dashboard') + second['unresolved_flags'].next_url).context
+        self.assertEqual([flag.pk for flag in flags['unresolved_flags']], [self.flags[0].pk])
+        self.assertEqual(self.titles(flags['unapproved_questions']), ['Pending 0'])
+        back = self.client.get(reverse('mod-dashboard') + second['unapproved_questions'].previous_url).context
+        self.assertEqual(self.titles(back['unapproved_questions']), ['Pending 2', 'Pending 1'])
+        self.assertEqual(first['counts']['pending_questions'], 3)
+
+    def test_nothing_changed(self):
+        changes = moderation.changes_since(self.since)
+        self.assertEqual(changes['questions'], {'pending': [], 'removed': []})
+        self.assertEqual(changes['flags'], {'open': [], 'resolved': []})
+        self.assertFalse(changes['truncated'])
+
+    def test_changes_since(self):
+        moderation.set_approved(self.pending[0], True)
+        new = Question.objects.create(title='New', body='Body', author=self.staff)
+        moderation.resolve_flag(self.flags[1])
+        opened = moderation.report_content(self.approved, self.reporters[0])
+        changes = moderation.changes_since(self.since)
+        self.assertEqual(changes['questions']['pending'], [new])
+        self.assertEqual(changes['questions']['removed'], [self.pending[0].pk])
+        self.assertEqual(changes['flags'], {'open': [opened], 'resolved': [self.flags[1].pk]})
+        self.assertFalse(changes['truncated'])
+        self.assertLessEqual(changes['cursor'], timezone.now() - moderation.POLL_OVERLAP)
+
+    def test_truncated(self):
+        for question in self.pending:
+            Question.objects.filter(pk=question.pk).update(updated_at=timezone.now())
+        changes = moderation.changes_since(self.since, limit=2)
+        self.assertEqual(len(changes['questions']['pending']), 2)
+        self.assertTrue(changes['truncated'])
+
+    def test_updates_view(self):
+        moderation.set_approved(self.pending[0], True)
+        response = self.client.get(reverse('moderation-updates'), {'since': self.since.isoformat()})
+        data = response.json()
+        self.assertEqual(data['questions']['removed'], [self.pending[0].pk])
+        self.assertEqual(data['counts']['pending_questions'], 2)
+        self.assertEqual(self.client.get(reverse('moderation-updates'), {'since': 'yesterday'}).status_code, 400)
+
+
+class CascadeCounterTests(TestCase):
+    """Deletes keep every counter equal to what ``counters.recount()`` rebuilds."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', password='pass')
+        cls.spammer = User.objects.create_user('spammer', password='pass')
+        cls.reporter = User.objects.create_user('reporter', password='pass')
+        cls.questions = []
+        for number in range(3):
+            question = Question.objects.create(
+                title=f'Question {number}', body='Body', author=cls.author, approved=number != 1,
+            )
+            moderation.report_content(question, cls.reporter)
+            for approved in (True, False):
+                for author in (cls.author, cls.spammer):
+                    answer = Answer.objects.create(question=question, body='Answer', author=author, approved=approved)
+                    flag = moderation.report_content(answer, cls.reporter)
+                    if author == cls.spammer and approved:
+                        moderation.resolve_flag(flag)
+            cls.questions.append(question)
+        spam = Question.objects.create(title='Spam', body='Body', author=cls.spammer)
+        Answer.objects.create(question=spam, body='Answer', author=cls.author, approved=True)
+        moderation.report_content(spam, cls.reporter)
+
+    def counters(self):
+        return (
+            list(Question.objects.order_by('pk').values_list(
+                'pk', 'answer_count', 'pending_answer_count', 'open_flag_count',
+            )),
+            counters.moderation_counts(),
+        )
+
+    def assertCountersMatchRecount(self):
+        kept = self.counters()
+        counters.recount()
+        self.assertEqual(kept, self.counters())
+
+    def test_fixture_counters(self):
+        self.assertCountersMatchRecount()
+        self.assertEqual(counters.moderation_counts(), {'pending_questions': 2, 'pending_answers': 6, 'open_flags': 13})
+
+    def test_delete_question(self):
+        self.questions[0].delete()
+        self.assertCountersMatchRecount()
+
+    def test_delete_answers_across_questions(self):
+        Answer.objects.filter(author=self.spammer).delete()
+        self.assertCountersMatchRecount()
+
+    def test_delete_user(self):
+        # Cascades to their question, with other users' answers on it, and to
+        # their answers on everyone else's questions.
+        self.spammer.delete()
+        self.assertCountersMatchRecount()
+        self.assertEqual(counters.moderation_counts(), {'pending_questions': 1, 'pending_answers': 3, 'open_flags': 9})
+
+    def test_purge_content(self):
+        call_command('purge_content', author=['spammer'], stdout=StringIO())
+        self.assertCountersMatchRecount()
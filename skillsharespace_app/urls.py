@@ -1,9 +1,23 @@
-from django.urls import path
-from . import views
+from django.conf import settings
+from django.urls import include, path
+from . import api, views, async_views
+
+# Read-only views have async versions for ASGI deployments.
+read_views = async_views if settings.ASYNC_READ_VIEWS else views
+
+api_v1_patterns = [
+    path('', api.api_root, name='api-v1-root'),
+    path('questions/', api.QuestionListApiView.as_view(), name='api-v1-question-list'),
+    path('questions/export/', api.QuestionExportApiView.as_view(), name='api-v1-question-export'),
+    path('questions/<int:pk>/', api.QuestionDetailApiView.as_view(), name='api-v1-question-detail'),
+    path('questions/<int:pk>/answers/', api.AnswerListApiView.as_view(), name='api-v1-answer-list'),
+    path('answers/export/', api.AnswerExportApiView.as_view(), name='api-v1-answer-export'),
+    path('flags/', api.FlagListApiView.as_view(), name='api-v1-flag-list'),
+]
 
 urlpatterns = [
-    path('', views.QuestionListView.as_view(), name='question-list'),
-    path('question/<int:pk>/', views.QuestionDetailView.as_view(), name='question-detail'),
+    path('', read_views.QuestionListView.as_view(), name='question-list'),
+    path('question/<int:pk>/', read_views.QuestionDetailView.as_view(), name='question-detail'),
     path('question/create/', views.QuestionCreateView.as_view(), name='question-create'),
     path('question/<int:pk>/update/', views.QuestionUpdateView.as_view(), name='question-update'),  
     path('question/<int:pk>/delete/', views.QuestionDeleteView.as_view(), name='question-delete'),
@@ -13,10 +27,13 @@ urlpatterns = [
     path('answer/<int:pk>/delete/', views.AnswerDeleteView.as_view(), name='answer-delete'),
 
     path('moderator/', views.ModeratorDashboardView.as_view(), name='mod-dashboard'),
-    path('moderator/unapproved-questions/', views.UnapprovedQuestionListView.as_view(), name='moderator-unapproved-questions'),
-    path('moderator/unapproved-answers/', views.UnapprovedAnswerListView.as_view(), name='moderator-unapproved-answers'),
+    path('moderator/updates/', views.moderation_updates, name='moderation-updates'),
+    path('moderator/queue/<str:kind>/', views.ModerationQueueView.as_view(), name='moderation-queue'),
+    path('moderator/unapproved-questions/', read_views.UnapprovedQuestionListView.as_view(), name='moderator-unapproved-questions'),
+    path('moderator/unapproved-answers/', read_views.UnapprovedAnswerListView.as_view(), name='moderator-unapproved-answers'),
 
     path('moderator/approve/<str:content_type>/<int:object_id>/', views.approve_content, name='approve-content'),
+    path('moderator/bulk/', views.bulk_moderate, name='moderator-bulk'),
     path('moderator/dismiss/<int:flag_id>/', views.dismiss_flag, name='dismiss-flag'),
 
     path('moderator/question/<int:pk>/approve/', views.ApproveQuestionView.as_view(), name='approve-question'),
@@ -31,9 +48,12 @@ urlpatterns = [
 
     path('flag/<str:content_type>/<int:object_id>/', views.FlagCreateView.as_view(), name='flag'),
 
-    path('moderator/flags/', views.ModeratorFlagListView.as_view(), name='moderator-flag-list'),
+    path('moderator/flags/', read_views.ModeratorFlagListView.as_view(), name='moderator-flag-list'),
     path('moderator/flags/<int:flag_id>/resolve/', views.resolve_flag, name='resolve-flag'),
     path('moderator/flags/<int:flag_id>/dismiss/', views.dismiss_flag, name='dismiss-flag'),
+    path('moderator/profile/', views.profile_stats_view, name='profile-stats'),
 
     path('accounts/signup/', views.SignUpView.as_view(), name='signup'),
+
+    path('api/v1/', include(api_v1_patterns)),
 ]
@@ -0,0 +1,117 @@
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.crypto import constant_time_compare
+
+# Logged-in users are cached under their id together with the session auth
+# hash they were verified with (which changes with the password) and their
+# auth backend. A session only gets the cached user if it carries the same
+# hash, so cached users never skip Django's session verification.
+#
+# Only the fields requests check are cached, never the password hash; the
+# user is rebuilt from them with every other field deferred, so anything
+# else (e.g. the password form) loads from the database on first access.
+
+_SESSION_KEYS = (SESSION_KEY, BACKEND_SESSION_KEY, HASH_SESSION_KEY)
+
+_USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def _cache():
+    return caches[getattr(settings, 'USER_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'USER_CACHE_TIMEOUT', 300)
+
+
+def _key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def _credentials(user_id, backend_path, session_hash):
+    """``(key, backend path, session hash)`` of a logged-in session, else ``None``."""
+    if not user_id or not session_hash or backend_path not in settings.AUTHENTICATION_BACKENDS:
+        return None
+    return _key(user_id), backend_path, session_hash
+
+
+def _match(cached, backend_path, session_hash):
+    if cached is None:
+        return None
+    cached_backend, cached_hash, fields = cached
+    if cached_backend == backend_path and constant_time_compare(cached_hash, session_hash):
+        return _user(fields)
+    return None
+
+
+def _entry(user, backend_path):
+    return (backend_path, user.get_session_auth_hash(), {field: getattr(user, field) for field in _USER_FIELDS})
+
+
+def _user(fields):
+    model = get_user_model()
+    # from_db takes the loaded values in the model's field order.
+    names = [field.attname for field in model._meta.concrete_fields if field.attname in fields]
+    return model.from_db(DEFAULT_DB_ALIAS, names, [fields[name] for name in names])
+
+
+def get_user(request):
+    """
+    ``django.contrib.auth.get_user`` from the cache. Misses, and sessions
+    whose hash does not match the cached one, go through Django's lookup,
+    which verifies (or flushes) the session; the user it finds is cached.
+    """
+    if not _timeout():
+        return auth.get_user(request)
+    credentials = _credentials(*(request.session.get(key) for key in _SESSION_KEYS))
+    if credentials is None:
+        return auth.get_user(request)
+    key, backend_path, session_hash = credentials
+    user = _match(_cache().get(key), backend_path, session_hash)
+    if user is None:
+        user = auth.get_user(request)
+        if user.is_authenticated:
+            _cache().set(key, _entry(user, backend_path), _timeout())
+    return user
+
+
+async def aget_user(request):
+    if not _timeout():
+        return await auth.aget_user(request)
+    credentials = _credentials(*[await request.session.aget(key) for key in _SESSION_KEYS])
+    if credentials is None:
+        return await auth.aget_user(request)
+    key, backend_path, session_hash = credentials
+    user = _match(await _cache().aget(key), backend_path, session_hash)
+    if user is None:
+        user = await auth.aget_user(request)
+        if user.is_authenticated:
+            await _cache().aset(key, _entry(user, backend_path), _timeout())
+    return user
+
+
+def remember(user, backend_path):
+    """
+    Cache a user who has just logged in, so their first page is a hit too.
+    Set again after commit, since logging in saves the user (``last_login``)
+    and so schedules an ``invalidate``.
+    """
+    if not _timeout():
+        return
+    key, entry = _key(user.pk), _entry(user, backend_path)
+    _cache().set(key, entry, _timeout())
+    transaction.on_commit(lambda: _cache().set(key, entry, _timeout()))
+
+
+def invalidate(user_id):
+    """
+    Drop a user's cached copy: now, for the rest of this transaction, and
+    again after commit, in case a concurrent request re-cached the old row
+    in between.
+    """
+    key = _key(user_id)
+    _cache().delete(key)
+    transaction.on_commit(lambda: _cache().delete(key))
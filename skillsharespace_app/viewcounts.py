@@ -0,0 +1,102 @@
+import atexit
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+from .models import Question
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCountBuffer:
+    """
+    Write-behind buffer for question view counts.
+
+    Hits are counted in memory and periodically written back as one
+    ``UPDATE ... SET views = views + n`` per distinct delta, so the detail
+    page never takes the database write lock. Counts are per process: a read
+    shows the persisted value plus whatever this process has not flushed yet.
+
+    With ``VIEW_COUNT_FLUSH_INTERVAL = 0`` every hit is written through
+    immediately, which is what the tests and single-user setups want.
+    """
+
+    def __init__(self):
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def interval(self):
+        return getattr(settings, 'VIEW_COUNT_FLUSH_INTERVAL', 10)
+
+    def record(self, question_id):
+        if not self.interval:
+            Question.objects.filter(pk=question_id).update(views=F('views') + 1)
+            return
+        with self._lock:
+            self._pending[question_id] += 1
+        self._ensure_flusher()
+
+    async def arecord(self, question_id):
+        if not self.interval:
+            await Question.objects.filter(pk=question_id).aupdate(views=F('views') + 1)
+            return
+        self.record(question_id)
+
+    def pending(self, question_id):
+        return self._pending.get(question_id, 0)
+
+    def apply(self, questions):
+        """Add the unflushed delta to the ``views`` of already loaded questions."""
+        for question in questions:
+            question.views += self.pending(question.pk)
+        return questions
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending:
+            return 0
+
+        by_delta = defaultdict(list)
+        for question_id, delta in pending.items():
+            by_delta[delta].append(question_id)
+        try:
+            # All or nothing, so putting every count back cannot repeat one.
+            with transaction.atomic():
+                for delta, question_ids in by_delta.items():
+                    Question.objects.filter(pk__in=question_ids).update(views=F('views') + delta)
+        except Exception:
+            # Put the counts back so the next flush retries them.
+            with self._lock:
+                self._pending.update(pending)
+            raise
+        return sum(pending.values())
+
+    def _ensure_flusher(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='view-count-flusher', daemon=True)
+            self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        stop = threading.Event()
+        while not stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Flushing view counts failed')
+            finally:
+                close_old_connections()
+
+
+view_counts = ViewCountBuffer()
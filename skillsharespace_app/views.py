@@ -1,3 +1,5 @@
+from functools import partial
+
 from django.views.generic import (
     ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView, View,FormView
 )
@@ -6,79 +8,159 @@ from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
 from django.contrib.auth.decorators import user_passes_test, login_required
 from django.contrib.auth.forms import UserCreationForm
-from django.db.models import Q
-from django.http import Http404
+from django.http import Http404, JsonResponse
+from django.utils.dateparse import parse_datetime
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
+from django.template.response import TemplateResponse
 from django.contrib import messages
-from django.contrib.contenttypes.models import ContentType
+from django.conf import settings
+from django.utils import timezone
+from django.utils.text import Truncator
 
+from . import conditional, counters, fragments, moderation, routers
+from .middleware import query_budget
+from .profiling import profile_stats
 from .models import Question, Answer, Flag
 from .forms import QuestionForm, AnswerForm, FlagForm
+from .pagination import KeysetPaginationMixin, get_limit, paginate_keyset
+from .search import get_backend as get_search_backend
+from .viewcounts import view_counts
+
+
+class ObjectMemoMixin:
+    """
+    Load a single-object view's object once per request. ``test_func``,
+    ``get``/``post`` and ``get_success_url`` all call ``get_object()``;
+    after the first call they share its instance.
+    """
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if '_object' not in self.__dict__:
+            self._object = super().get_object()
+        return self._object
 
 
-class QuestionListView(ListView):
+class QuestionListView(KeysetPaginationMixin, ListView):
     model = Question
     context_object_name = 'questions'
     template_name = 'qa/question_list.html'
+    fragment_template_name = 'qa/_question_list.html'
+    query_budget = 5
+    replica_reads = True
 
     def get_queryset(self):
         query = self.request.GET.get('q')
         user = self.request.user
 
-        if user.is_authenticated:
-            if user.is_staff:
-                qs = Question.objects.all()
-            else:
-                qs = Question.objects.filter(Q(approved=True) | Q(author=user))
-        else:
-            qs = Question.objects.filter(approved=True)
+        # The list never shows bodies; load only what the rows render.
+        qs = (
+            Question.objects.visible_to(user)
+            .select_related('author')
+            .only('title', 'created_at', 'views', 'answer_count', 'author__username')
+        )
 
         if query:
-            qs = qs.filter(Q(title__icontains=query) | Q(body__icontains=query))
+            return get_search_backend().search(qs, query)
 
         return qs.order_by('-created_at')
 
+    def get_keyset_ordering(self):
+        # Search results are ordered by relevance, so they page by number.
+        if self.request.GET.get('q'):
+            return None
+        return super().get_keyset_ordering()
+
+    def get_keyset_branches(self):
+        return Question.objects.visibility_filters(self.request.user)
 
-class QuestionDetailView(DetailView):
+    def get(self, request, *args, **kwargs):
+        key = fragments.list_key(request)
+        # The key changes whenever the list could, so it doubles as the ETag.
+        etag = conditional.make_etag(key)
+        not_modified = conditional.not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+
+        fragment = fragments.get(key)
+        questions, from_replica = None, False
+        if fragment is None:
+            self.object_list = self.get_queryset()
+            context = self.get_context_data()
+            fragment = fragments.render(self.fragment_template_name, context, request)
+            fragments.set(key, fragment)
+            questions = context['object_list']
+            # Nor can a page read from a replica claim the key's version.
+            from_replica = routers.reading_replica()
+        response = TemplateResponse(request, self.template_name, {
+            'fragment': fragments.finish(fragment, request, questions),
+        })
+        if from_replica:
+            return response
+        return conditional.patch_response(response, request, etag)
+
+
+class QuestionDetailView(ObjectMemoMixin, DetailView):
     model = Question
     context_object_name = 'question'
     template_name = 'qa/question_detail.html'
+    fragment_template_name = 'qa/_question_detail.html'
+    queryset = Question.objects.select_related('author')
+    query_budget = 7
+    replica_reads = True
 
     def get_object(self, queryset=None):
         obj = super().get_object(queryset)
-        user = self.request.user
-
-        if user.is_authenticated and user.is_staff:
-            return obj
-
-        if obj.approved or (user.is_authenticated and obj.author == user):
-            return obj
-
-        if user.is_authenticated:
-            if Answer.objects.filter(question=obj, author=user).exists():
-                return obj
-
-        raise Http404("This question is not approved.")
+        if not obj.is_visible_to(self.request.user):
+            raise Http404("This question is not approved.")
+        return obj
+
+    def get_answer_queryset(self):
+        return (
+            self.object.answers.select_related('author')
+            .visible_union(self.request.user).order_by('created_at')
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        question = self.object
-        user = self.request.user
-
-        if user.is_authenticated and user.is_staff:
-            answers = question.answers.all()
-        elif user.is_authenticated:
-            answers = question.answers.filter(Q(approved=True) | Q(author=user))
-        else:
-            answers = question.answers.filter(approved=True)
-
-        context['answers'] = answers.order_by('created_at')
+        context['answers'] = self.get_answer_queryset()
         return context
 
     def get(self, request, *args, **kwargs):
-        obj = self.get_object()
-        obj.views += 1
-        obj.save()
-        return super().get(request, *args, **kwargs)
+        key = fragments.question_key(request, kwargs['pk'])
+        cached = fragments.get(key)
+        # The fragment's version changes with everything the validator
+        # covers, so a cached page brings its validator and costs no query.
+        validator = (
+            conditional.question_validator(kwargs['pk'], request.user) if cached is None else cached['validator']
+        )
+        if validator is not None:
+            # A revalidated visit is still a visit.
+            view_counts.record(kwargs['pk'])
+            not_modified = conditional.not_modified(request, *validator)
+            if not_modified is not None:
+                return not_modified
+
+        questions = None
+        if cached is None:
+            self.object = self.get_object()
+            if validator is None:
+                view_counts.record(self.object.pk)
+            questions = [self.object]
+            html = fragments.render(self.fragment_template_name, self.get_context_data(object=self.object), request)
+            cached = {'title': self.object.title, 'html': html, 'validator': validator}
+            fragments.set(key, cached)
+        elif validator is None:
+            view_counts.record(kwargs['pk'])
+        response = TemplateResponse(request, self.template_name, {
+            'title': cached['title'],
+            'fragment': fragments.finish(cached['html'], request, questions),
+        })
+        if validator is not None:
+            conditional.patch_response(response, request, *validator)
+        return response
 
 
 class QuestionCreateView(LoginRequiredMixin, CreateView):
@@ -97,22 +179,22 @@ class QuestionCreateView(LoginRequiredMixin, CreateView):
         return context
 
 
-class QuestionUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class QuestionUpdateView(ObjectMemoMixin, LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     model = Question
     form_class = QuestionForm
     template_name = 'qa/question_form.html'
 
     def test_func(self):
-        return self.get_object().author == self.request.user
+        return self.get_object().author_id == self.request.user.pk
 
 
-class QuestionDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class QuestionDeleteView(ObjectMemoMixin, LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     model = Question
     success_url = reverse_lazy('question-list')
     template_name = 'qa/question_confirm_delete.html'
 
     def test_func(self):
-        return self.get_object().author == self.request.user
+        return self.get_object().author_id == self.request.user.pk
 
 
 class AnswerCreateView(LoginRequiredMixin, CreateView):
@@ -135,34 +217,36 @@ class AnswerCreateView(LoginRequiredMixin, CreateView):
         return reverse_lazy('question-detail', kwargs={'pk': self.kwargs['pk']})
 
 
-class AnswerUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
+class AnswerUpdateView(ObjectMemoMixin, LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     model = Answer
+    queryset = Answer.objects.select_related('question')
     form_class = AnswerForm
     template_name = 'qa/answer_form.html'
 
     def test_func(self):
         answer = self.get_object()
         user = self.request.user
-        return user.is_staff or answer.author == user
+        return user.is_staff or answer.author_id == user.pk
 
     def get_success_url(self):
         question = self.get_object().question
         user = self.request.user
 
-        if question.approved or (user.is_authenticated and (user.is_staff or question.author == user)):
+        if question.approved or (user.is_authenticated and (user.is_staff or question.author_id == user.pk)):
             return reverse_lazy('question-detail', kwargs={'pk': question.pk})
         else:
             return reverse_lazy('question-list')
 
 
-class AnswerDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
+class AnswerDeleteView(ObjectMemoMixin, LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     model = Answer
+    queryset = Answer.objects.select_related('question')
     template_name = 'qa/answer_confirm_delete.html'
     success_url = reverse_lazy('question-list')
 
     def test_func(self):
         answer = self.get_object()
-        return self.request.user == answer.author or self.request.user.is_staff
+        return answer.author_id == self.request.user.pk or self.request.user.is_staff
 
     def handle_no_permission(self):
         raise Http404("You are not allowed to delete this answer.")
@@ -170,45 +254,152 @@ class AnswerDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
 
 # Moderator dashboard view with flags and unapproved content
 class ModeratorDashboardView(LoginRequiredMixin, UserPassesTestMixin, TemplateView):
+    """
+    Queue sizes from the moderation counters and one cursor page of each
+    queue; each queue pages with its own ``?<queue>_cursor=``. Open
+    dashboards then poll ``moderation_updates`` for what changed.
+    """
     template_name = 'moderator/dashboard.html'
+    query_budget = 8
 
     def test_func(self):
         return self.request.user.is_staff
 
+    def get_queues(self):
+        return {
+            'unapproved_questions': (
+                Question.objects.filter(approved=False)
+                .select_related('author')
+                .only('title', 'created_at', 'pending_answer_count', 'open_flag_count', 'author__username'),
+                ('-created_at', '-id'),
+            ),
+            'unapproved_answers': (
+                Answer.objects.filter(approved=False)
+                .select_related('author', 'question')
+                .only('body', 'created_at', 'author__username', 'question__title'),
+                ('-created_at', '-id'),
+            ),
+            'unresolved_flags': (
+                Flag.objects.filter(resolved=False).with_targets(),
+                ('-report_count', '-created_at', '-id'),
+            ),
+        }
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['unapproved_questions'] = Question.objects.filter(approved=False)
-        context['unapproved_answers'] = Answer.objects.filter(approved=False)
-        context['unresolved_flags'] = Flag.objects.filter(resolved=False)
+        limit = get_limit(self.request)
+        for name, (queryset, ordering) in self.get_queues().items():
+            param = f'{name}_cursor'
+            page = paginate_keyset(queryset, ordering, limit, self.request.GET.get(param))
+            if page.has_next():
+                page.next_url = self._page_url(param, page.next_cursor)
+            if page.has_previous():
+                page.previous_url = self._page_url(param, page.previous_cursor)
+            context[name] = page
+        context['counts'] = counters.moderation_counts()
+        context['poll_cursor'] = (timezone.now() - moderation.POLL_OVERLAP).isoformat()
+        context['poll_interval'] = getattr(settings, 'MODERATION_POLL_INTERVAL', 15)
         return context
 
+    def _page_url(self, param, cursor):
+        query = self.request.GET.copy()
+        query[param] = cursor
+        return f'?{query.urlencode()}'
 
-class UnapprovedQuestionListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+
+class UnapprovedQuestionListView(LoginRequiredMixin, UserPassesTestMixin, KeysetPaginationMixin, ListView):
     model = Question
     template_name = 'moderator/unapproved_questions.html'
     context_object_name = 'questions'
+    query_budget = 4
 
     def test_func(self):
         return self.request.user.is_staff
 
     def get_queryset(self):
-        return Question.objects.filter(approved=False).order_by('-created_at')
+        return (
+            Question.objects.filter(approved=False)
+            .claimable_by(self.request.user)
+            .select_related('author')
+            .only('title', 'created_at', 'author__username')
+            .order_by('-created_at')
+        )
 
 
-class UnapprovedAnswerListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+class UnapprovedAnswerListView(LoginRequiredMixin, UserPassesTestMixin, KeysetPaginationMixin, ListView):
     model = Answer
     template_name = 'moderator/unapproved_answers.html'
     context_object_name = 'answers'
+    query_budget = 4
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get_queryset(self):
+        return (
+            Answer.objects.filter(approved=False)
+            .claimable_by(self.request.user)
+            .select_related('author', 'question')
+            .only('body', 'created_at', 'author__username', 'question__title')
+            .order_by('-created_at')
+        )
+
+
+class ModerationQueueView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+    """
+    A moderator's own batch from a claimable queue (``questions``,
+    ``answers`` or ``flags``). POST ``action=claim`` leases the next
+    ``MODERATION_CLAIM_BATCH`` items nobody else holds for
+    ``MODERATION_CLAIM_SECONDS``; ``action=release`` hands them back.
+    """
+    template_name = 'moderator/queue.html'
+    context_object_name = 'items'
+    # A claim runs inside two (save)points on top of the UPDATE, re-read and renewal.
+    query_budget = 8
 
     def test_func(self):
         return self.request.user.is_staff
 
+    def dispatch(self, request, *args, **kwargs):
+        if kwargs['kind'] not in moderation.CLAIM_QUEUES:
+            raise Http404
+        return super().dispatch(request, *args, **kwargs)
+
     def get_queryset(self):
-        return Answer.objects.filter(approved=False).order_by('-created_at')
+        kind = self.kwargs['kind']
+        items = moderation.claimed(kind, self.request.user)
+        if kind == 'questions':
+            return items.select_related('author')
+        if kind == 'answers':
+            return items.select_related('author', 'question')
+        return items.with_targets()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['kind'] = self.kwargs['kind']
+        context['target'] = {'questions': 'question', 'answers': 'answer', 'flags': 'flag'}[self.kwargs['kind']]
+        return context
+
+    def post(self, request, kind):
+        if request.POST.get('action') == 'release':
+            released = moderation.release(kind, request.user)
+            messages.info(request, f'Released {released} item{"s" if released != 1 else ""}.')
+        else:
+            claimed = moderation.claim(
+                kind, request.user,
+                limit=getattr(settings, 'MODERATION_CLAIM_BATCH', 10),
+                seconds=getattr(settings, 'MODERATION_CLAIM_SECONDS', 600),
+            )
+            if not claimed:
+                messages.info(request, 'Nothing left to claim in this queue.')
+        return redirect('moderation-queue', kind=kind)
 
 
 # Flagging views
 class FlagCreateView(LoginRequiredMixin, View):
+    # The first report on an object, inside a write transaction's savepoints.
+    query_budget = 15
+
     def post(self, request, *args, **kwargs):
         content_type_str = self.kwargs.get('content_type')
         object_id = self.kwargs.get('object_id')
@@ -222,62 +413,190 @@ class FlagCreateView(LoginRequiredMixin, View):
 
         obj = get_object_or_404(model, pk=object_id)
 
-        # Create a new flag every time, no get_or_create
-        Flag.objects.create(
-            content_type=ContentType.objects.get_for_model(model),
-            object_id=obj.id,
-            reason=f'Flagged by {request.user.username}'
-        )
+        moderation.report_content(obj, request.user, reason=f'Flagged by {request.user.username}')
 
         if content_type_str == 'question':
             return redirect('question-detail', pk=obj.pk)
         else:
-            return redirect('question-detail', pk=obj.question.pk)
+            return redirect('question-detail', pk=obj.question_id)
 
-class ModeratorFlagListView(LoginRequiredMixin, UserPassesTestMixin, ListView):
+class ModeratorFlagListView(LoginRequiredMixin, UserPassesTestMixin, KeysetPaginationMixin, ListView):
     model = Flag
     template_name = 'qa/moderator_flags.html'
     context_object_name = 'flags'
+    keyset_ordering = ('-report_count', '-created_at', '-id')
+    query_budget = 6
 
     def test_func(self):
         return self.request.user.is_staff
 
     def get_queryset(self):
-        return Flag.objects.filter(resolved=False).order_by('-created_at')
+        return (
+            Flag.objects.filter(resolved=False)
+            .claimable_by(self.request.user)
+            .with_targets()
+            .order_by(*self.keyset_ordering)
+        )
 
 
 @login_required
 @user_passes_test(lambda u: u.is_staff)
+@query_budget(9)
 def resolve_flag(request, flag_id):
-    flag = get_object_or_404(Flag, id=flag_id)
-    flag.resolved = True
-    flag.save()
+    flag = get_object_or_404(Flag.objects.select_related('content_type'), id=flag_id)
+    moderation.resolve_flag(flag)
     return redirect('moderator-flag-list')
 
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 def dismiss_flag(request, flag_id):
-    flag = get_object_or_404(Flag, id=flag_id)
-    flag.resolved = True  
-    flag.save()
+    flag = get_object_or_404(Flag.objects.select_related('content_type'), id=flag_id)
+    moderation.resolve_flag(flag)
     return redirect('moderator-flag-list')
 
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+@require_POST
+def bulk_moderate(request):
+    """
+    Approve/unapprove questions or answers, or resolve flags, in bulk.
+
+    Takes ``target`` (question, answer or flag), ``action`` (approve,
+    unapprove or resolve) and either ``ids`` or ``all=1`` for the whole
+    queue, optionally narrowed by ``author`` (username) and ``before``
+    (ISO datetime). Returns per-item results as JSON, or redirects to
+    ``next`` with a summary message when submitted from the dashboard.
+    """
+    target = request.POST.get('target')
+    action = request.POST.get('action')
+
+    if target in ('question', 'answer') and action in ('approve', 'unapprove'):
+        model = Question if target == 'question' else Answer
+        approved = action == 'approve'
+        queue = model.objects.filter(approved=not approved)
+        apply = partial(moderation.bulk_set_approved, model, approved=approved)
+    elif target == 'flag' and action == 'resolve':
+        queue = Flag.objects.filter(resolved=False)
+        apply = moderation.bulk_resolve_flags
+    else:
+        return JsonResponse({'error': 'Unsupported target/action.'}, status=400)
+
+    if request.POST.get('all'):
+        if request.POST.get('author') and target != 'flag':
+            queue = queue.filter(author__username=request.POST['author'])
+        if request.POST.get('before'):
+            before = parse_datetime(request.POST['before'])
+            if before is None:
+                return JsonResponse({'error': 'Invalid before datetime.'}, status=400)
+            queue = queue.filter(created_at__lt=before)
+        ids = list(queue.values_list('pk', flat=True))
+    else:
+        try:
+            ids = [int(pk) for value in request.POST.getlist('ids') for pk in value.split(',') if pk.strip()]
+        except ValueError:
+            return JsonResponse({'error': 'ids must be integers.'}, status=400)
+
+    results = apply(ids)
+    changed = sum(1 for result in results.values() if result == moderation.CHANGED)
+
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        messages.success(request, f'{changed} of {len(results)} {target}s updated.')
+        return redirect(next_url)
+    return JsonResponse({
+        'target': target,
+        'action': action,
+        'changed': changed,
+        'results': {str(pk): result for pk, result in results.items()},
+    })
+
+
+def _question_item(question):
+    return {
+        'id': question.pk,
+        'title': question.title,
+        'author': question.author.username,
+        'created_at': question.created_at,
+        'url': question.get_absolute_url(),
+    }
+
+
+def _answer_item(answer):
+    return {
+        'id': answer.pk,
+        'question': answer.question_id,
+        'question_title': answer.question.title,
+        'excerpt': Truncator(answer.body).words(15),
+        'author': answer.author.username,
+        'created_at': answer.created_at,
+        'url': reverse('question-detail', args=[answer.question_id]),
+    }
+
+
+def _flag_item(flag):
+    target = flag.content_object
+    if target is None:
+        question_id = None
+    else:
+        question_id = target.pk if isinstance(target, Question) else target.question_id
+    return {
+        'id': flag.pk,
+        'target': str(target) if target is not None else None,
+        'reason': flag.reason,
+        'report_count': flag.report_count,
+        'created_at': flag.created_at,
+        'url': reverse('question-detail', args=[question_id]) if question_id else None,
+    }
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+@query_budget(10)
+def moderation_updates(request):
+    """
+    Poll for the moderator dashboard: the queue counters plus whatever
+    entered or left the queues after ``?since=`` (the ``cursor`` of the
+    previous poll). ``reload`` means too much changed to send piecemeal.
+    """
+    since = parse_datetime(request.GET.get('since', ''))
+    if since is None:
+        return JsonResponse({'error': 'since must be an ISO datetime.'}, status=400)
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    changes = moderation.changes_since(since, limit=get_limit(request))
+    return JsonResponse({
+        'cursor': changes['cursor'].isoformat(),
+        'counts': counters.moderation_counts(),
+        'reload': changes['truncated'],
+        'questions': {
+            'pending': [_question_item(question) for question in changes['questions']['pending']],
+            'removed': changes['questions']['removed'],
+        },
+        'answers': {
+            'pending': [_answer_item(answer) for answer in changes['answers']['pending']],
+            'removed': changes['answers']['removed'],
+        },
+        'flags': {
+            'open': [_flag_item(flag) for flag in changes['flags']['open']],
+            'resolved': changes['flags']['resolved'],
+        },
+    })
+
+
 def approve_content(request, content_type, object_id):
     if not request.user.is_staff:
         return redirect('question-list')
     model = Question if content_type == 'question' else Answer
     obj = get_object_or_404(model, id=object_id)
-    obj.approved = True
-    obj.save()
+    moderation.set_approved(obj, True)
     return redirect('mod-dashboard')
 
 
 def dismiss_flag(request, flag_id):
     if not request.user.is_staff:
         return redirect('question-list')
-    flag = get_object_or_404(Flag, id=flag_id)
-    flag.resolved = True
-    flag.save()
+    flag = get_object_or_404(Flag.objects.select_related('content_type'), id=flag_id)
+    moderation.resolve_flag(flag)
     return redirect('mod-dashboard')
 
 
@@ -297,9 +616,9 @@ class ApproveQuestionView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return self.request.user.is_staff
 
     def form_valid(self, form):
-        form.instance.approved = True
+        moderation.set_approved(form.instance, True)
         messages.success(self.request, "Question approved successfully.")
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
     def get_success_url(self):
         return reverse_lazy('moderator-unapproved-questions')
@@ -314,9 +633,9 @@ class ApproveAnswerView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return self.request.user.is_staff
 
     def form_valid(self, form):
-        form.instance.approved = True
+        moderation.set_approved(form.instance, True)
         messages.success(self.request, "Answer approved successfully.")
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
     def get_success_url(self):
         return reverse_lazy('moderator-unapproved-answers')
@@ -331,9 +650,9 @@ class UnapproveQuestionView(LoginRequiredMixin, UserPassesTestMixin, UpdateView)
         return self.request.user.is_staff
 
     def form_valid(self, form):
-        form.instance.approved = False
+        moderation.set_approved(form.instance, False)
         messages.success(self.request, "Question marked as unapproved.")
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
     def get_success_url(self):
         return reverse_lazy('mod-dashboard')
@@ -348,9 +667,19 @@ class UnapproveAnswerView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         return self.request.user.is_staff
 
     def form_valid(self, form):
-        form.instance.approved = False
+        moderation.set_approved(form.instance, False)
         messages.success(self.request, "Answer marked as unapproved.")
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
 
     def get_success_url(self):
         return reverse_lazy('mod-dashboard')
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def profile_stats_view(request):
+    """Per-URL-name request profiles from ProfilingMiddleware, as JSON; POST clears them."""
+    if request.method == 'POST':
+        profile_stats.reset()
+    return JsonResponse(profile_stats.snapshot())
+